@@ -0,0 +1,31 @@
+"""
+ASGI config for edudream project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+from decouple import config
+from django.core.asgi import get_asgi_application
+
+if config('env', '') == 'prod' or os.getenv('env', 'dev') == 'prod':
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edudream.settings.prod')
+else:
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edudream.settings.dev')
+
+# Set up Django before importing code that imports models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from edudream.modules.realtime import JWTAuthMiddleware  # noqa: E402
+from home.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    "http": django_asgi_app,
+    "websocket": AllowedHostsOriginValidator(JWTAuthMiddleware(URLRouter(websocket_urlpatterns))),
+})
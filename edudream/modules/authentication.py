@@ -0,0 +1,131 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from home.models import TokenVersion
+
+# Role relations loaded with the user, so permissions and views read them without further queries
+USER_ROLE_RELATIONS = ("profile", "student__parent", "tutordetail")
+
+# Claims RoleAccessToken embeds, trusted while the token's role_version matches the user's TokenVersion
+ROLE_CLAIMS = ("account_type", "profile_id", "student_id", "tutor_id", "email_verified")
+ROLE_VERSION_CLAIM = "role_version"
+
+
+class RoleAccessToken(AccessToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        # Version first, a role change committed while the claims are read leaves the token behind the new version
+        token[ROLE_VERSION_CLAIM] = get_token_version(user.id)
+        for claim, value in get_role_claims(user).items():
+            token[claim] = value
+        return token
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        """
+        Same checks as JWTAuthentication.get_user. Tokens with current role claims load the user alone and the
+        claims are used for the role checks, older tokens load the user with the role relations joined in.
+        """
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        lookup = {api_settings.USER_ID_FIELD: user_id}
+        user = None
+        try:
+            if ROLE_VERSION_CLAIM in validated_token:
+                version = TokenVersion.objects.filter(user_id=OuterRef("pk")).values("version")
+                user = self.user_model.objects.annotate(
+                    role_version=Coalesce(Subquery(version), Value(0))
+                ).get(**lookup)
+                if user.role_version == validated_token[ROLE_VERSION_CLAIM]:
+                    user.role_claims = {claim: validated_token.get(claim) for claim in ROLE_CLAIMS}
+                else:
+                    # The roles changed after the token was issued
+                    user = None
+            if user is None:
+                user = self.user_model.objects.select_related(*USER_ROLE_RELATIONS).get(**lookup)
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def get_related(user, name):
+    # Reverse one-to-one lookups that were not found by select_related raise instead of querying again
+    if not getattr(user, "is_authenticated", False):
+        return None
+    try:
+        return getattr(user, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+def get_profile(user):
+    return get_related(user, "profile")
+
+
+def get_student(user):
+    return get_related(user, "student")
+
+
+def get_tutor_detail(user):
+    return get_related(user, "tutordetail")
+
+
+def get_role_claims(user):
+    # "student", "parent" or "tutor", students have no profile of their own and are verified through their parent
+    student, profile, tutor_detail = get_student(user), get_profile(user), get_tutor_detail(user)
+    if student:
+        account_type, email_verified = "student", student.parent.email_verified
+    else:
+        account_type = profile.account_type if profile else None
+        email_verified = profile.email_verified if profile else False
+    return {
+        "account_type": account_type, "profile_id": profile.id if profile else None,
+        "student_id": student.id if student else None, "tutor_id": tutor_detail.id if tutor_detail else None,
+        "email_verified": email_verified
+    }
+
+
+def get_role(user):
+    # The token's role claims when RoleJWTAuthentication trusted them, otherwise read from the loaded relations
+    claims = getattr(user, "role_claims", None)
+    return claims if claims is not None else get_role_claims(user)
+
+
+def get_account_type(user):
+    return get_role(user)["account_type"]
+
+
+def get_token_version(user_id):
+    return TokenVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+
+
+def bump_token_version(user_ids):
+    # Role claims in tokens already issued to these users stop being trusted
+    user_ids = set(user_ids)
+    # Only users that still exist get a row, a bump can follow the deletion of its user
+    TokenVersion.objects.bulk_create(
+        [TokenVersion(user_id=user_id) for user_id in User.objects.filter(id__in=user_ids).values_list("id", flat=True)],
+        ignore_conflicts=True
+    )
+    TokenVersion.objects.filter(user_id__in=user_ids).update(version=F("version") + 1)
@@ -0,0 +1,64 @@
+from django.db.models import F, Q, Count, Subquery, OuterRef
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from home.models import Conversation, ChatMessage
+
+# Classrooms in these statuses let their tutor, student and parent chat
+CHAT_CLASS_STATUSES = ("accepted", "completed", "cancelled")
+
+
+def get_classroom_contacts(classrooms):
+    # (user_id, counterpart_id) pairs the chat list shows for (tutor_id, student_user_id, parent_user_id) triples
+    pairs = set()
+    for tutor_id, student_user_id, parent_user_id in classrooms:
+        for user_id, counterpart_id in (
+                (student_user_id, tutor_id), (parent_user_id, tutor_id), (tutor_id, student_user_id)):
+            if user_id and counterpart_id:
+                pairs.add((user_id, counterpart_id))
+    return pairs
+
+
+def add_conversations(pairs):
+    Conversation.objects.bulk_create(
+        [Conversation(user_id=user_id, counterpart_id=counterpart_id) for user_id, counterpart_id in pairs],
+        ignore_conflicts=True
+    )
+
+
+def record_message(message):
+    """
+    Point both participants' conversations at a new message and count it as unread for the receiver. A message
+    older than the one already recorded, from a concurrent request, only adds to the unread count.
+    """
+    sender_id, receiver_id = message.sender_id, message.receiver_id
+    now = timezone.now()
+    add_conversations([(sender_id, receiver_id), (receiver_id, sender_id)])
+    Conversation.objects.filter(user_id=receiver_id, counterpart_id=sender_id).update(
+        unread_count=F("unread_count") + 1, updated_on=now
+    )
+    Conversation.objects.filter(
+        Q(user_id=sender_id, counterpart_id=receiver_id) | Q(user_id=receiver_id, counterpart_id=sender_id),
+        Q(last_message_on__isnull=True) | Q(last_message_on__lte=message.created_on)
+    ).update(last_message=message, last_message_on=message.created_on, updated_on=now)
+
+
+def mark_conversation_read(user_id, counterpart_id, message_id):
+    """
+    Move the user's watermark up to message_id, reading an older page writes nothing. The unread count is
+    recounted in the same UPDATE, messages received above the watermark stay unread.
+    """
+    unread = ChatMessage.objects.filter(
+        sender_id=OuterRef("counterpart_id"), receiver_id=OuterRef("user_id"), id__gt=message_id
+    ).values("receiver_id").annotate(count=Count("id")).values("count")
+    Conversation.objects.filter(user_id=user_id, counterpart_id=counterpart_id, last_read_id__lt=message_id).update(
+        last_read_id=message_id, unread_count=Coalesce(Subquery(unread), 0), updated_on=timezone.now()
+    )
+
+
+def get_read_watermarks(user_id, counterpart_id):
+    # {user_id: last_read_id} of both participants, for read receipts
+    return dict(
+        Conversation.objects.filter(user_id__in=[user_id, counterpart_id], counterpart_id__in=[user_id, counterpart_id])
+        .values_list("user_id", "last_read_id")
+    )
@@ -32,6 +32,15 @@ CLASS_STATUS_CHOICES = (
     ("cancelled", "Cancelled")
 )
 
+CLASS_REMINDER_CHOICES = (
+    ("start_60", "60 Minutes To Start"), ("start_15", "15 Minutes To Start"), ("start_0", "Starting"),
+    ("ended", "Ended"), ("unattended", "Unattended")
+)
+
+JOB_RUN_STATUS_CHOICES = (
+    ("queued", "Queued"), ("running", "Running"), ("success", "Success"), ("failed", "Failed"), ("skipped", "Skipped")
+)
+
 CLASS_TYPE_CHOICES = (
     ("normal", "Normal"), ("custom", "Custom")
 )
@@ -51,7 +60,7 @@ PROFICIENCY_TYPE_CHOICES = (
 )
 
 PAYOUT_STATUS_CHOICES = (
-    ("pending", "Pending"), ("processed", "Processed")
+    ("pending", "Pending"), ("processing", "Processing"), ("processed", "Processed"), ("failed", "Failed")
 )
 
 GRADE_CHOICES = (
@@ -81,3 +90,12 @@ TUTOR_STATUS_CHOICES = (
 ADD_SUBTRACT_ACTION_CHOICES = (
     ("add", "Addition"), ("subtract", "Subtraction")
 )
+
+EMAIL_STATUS_CHOICES = (
+    ("pending", "Pending"), ("sending", "Sending"), ("sent", "Sent"), ("failed", "Failed")
+)
+
+LEDGER_ACCOUNT_CHOICES = (
+    ("balance", "Wallet Balance"), ("pending", "Wallet Pending Balance"), ("escrow", "Escrow"),
+    ("external", "External"), ("bonus", "Bonus")
+)
@@ -1,156 +1,193 @@
-from threading import Thread
-
-import requests
 from django.conf import settings
-from django.db.models import Q
+from django.db import transaction as db_transaction
+from django.db.models import Q, Min
 from django.utils import timezone
 from requests.auth import HTTPBasicAuth
 
 from edudream.modules.email_template import send_class_reminder_email, send_fund_pending_balance_email, \
     send_fund_main_balance_email, send_class_ended_reminder_email, student_class_declined_email, \
     auto_classroom_complete_email
-from edudream.modules.stripe_api import StripeAPI
-from edudream.modules.utils import log_request, get_site_details
-from tutor.models import PayoutRequest, Classroom, TutorCalendar
+from edudream.modules import wallet
+from edudream.modules.http_client import http_request
+from edudream.modules.payouts import process_payouts
+from edudream.modules.search import refresh_tutor_documents, rebuild_tutor_documents
+from edudream.modules.stats import new_deltas, add_classroom_change, apply_stats_deltas, get_participants
+from edudream.modules.translator import prune_translation_cache
+from edudream.modules.utils import log_request, materialize_escrow_balance, bulk_adjust_escrow_balance, \
+    get_site_details, encrypt_text, clear_site_details_cache
+from home.models import EscrowEntry, JobWatermark, SiteSetting, JobRun
+from tutor.models import Classroom, TutorCalendar
 
 zoom_auth_url = settings.ZOOM_AUTH_URL
 zoom_client_id = settings.ZOOM_CLIENT_ID
 zoom_client_secret = settings.ZOOM_CLIENT_SECRET
 
+# Classrooms settled per transaction
+SETTLEMENT_CHUNK_SIZE = 200
+# Classroom reminders claimed per transaction
+REMINDER_CHUNK_SIZE = 200
+
 
 def zoom_login_refresh():
     url = zoom_auth_url
-    response = requests.request("POST", url=url, auth=HTTPBasicAuth(str(zoom_client_id), str(zoom_client_secret)))
+    response = http_request("zoom_auth", "POST", url, auth=HTTPBasicAuth(str(zoom_client_id), str(zoom_client_secret)))
     return response.json()
 
 
+def zoom_token_refresh_job():
+    # This cron to run every 50 minutes, Zoom tokens expire after an hour
+    response = zoom_login_refresh()
+    SiteSetting.objects.filter(id=get_site_details().id).update(zoom_token=encrypt_text(response["access_token"]))
+    clear_site_details_cache()
+    return 1
+
+
 def payout_cron_job():
     # This cron to run every 60 minute
-    payouts = PayoutRequest.objects.filter(status="pending")
-    try:
-        for instance in payouts:
-            stripe_connect_account_id = instance.user.profile.stripe_connect_account_id
-            stripe_external_account_id = instance.bank_account.stripe_external_account_id
-            amount = float(instance.amount)
-            # Check stripe balance
-            payout_response = StripeAPI.payout_to_external_account(
-                amount=amount, acct=stripe_external_account_id, stripe_acct=stripe_connect_account_id
-            )
-            if payout_response.get("failure_message") is None and payout_response.get("id"):
-                instance.status = "processed"
-                instance.reference = str(payout_response.get("id"))
-                instance.transaction.status = "completed"
-                # Send payout email
-                # Update transaction/payout status
-                instance.save()
-                instance.transaction.save()
-                Thread(target=send_class_reminder_email, args=[instance.user, amount, "fr"]).start()
-    except Exception as err:
-        log_request(f"Error processing payouts: {err}")
+    return process_payouts()
+
+
+def send_classroom_reminder(class_room, reminder):
+    if reminder in ("start_60", "start_15", "start_0"):
+        minutes = {"start_60": 60, "start_15": 15, "start_0": 0}[reminder]
+        send_class_reminder_email(class_room.student.user, class_room, minutes, "fr")
+    elif reminder == "ended":
+        student_email = class_room.student.user.email
+        parent_email = class_room.student.parent.user.email
+        tutor_email = class_room.tutor.email
+        send_class_ended_reminder_email([student_email, tutor_email, parent_email], class_room, "fr")
+    elif reminder == "unattended":
+        student_class_declined_email(class_room, "fr")
 
-    return True
+
+def release_classroom_calendar(classrooms):
+    # Remove classrooms from all schedules
+    calendars = TutorCalendar.objects.filter(classroom__in=classrooms)
+    calendar_ids = list(calendars.values_list("id", flat=True).distinct())
+    TutorCalendar.objects.filter(id__in=calendar_ids).update(status="available")
+    TutorCalendar.classroom.through.objects.filter(tutorcalendar_id__in=calendar_ids).delete()
+    # The bulk update skips the calendar signals, the tutors' availability is refreshed here
+    refresh_tutor_documents(TutorCalendar.objects.filter(id__in=calendar_ids).values_list("user_id", flat=True))
+
+
+def release_ended_classes_calendar(now):
+    # Only classrooms that ended since the last run are released, the watermark row also keeps overlapping runs out
+    if not JobWatermark.objects.filter(name="ended_classes_calendar").exists():
+        # The first run starts just before the oldest ended classroom still holding a calendar, so none is left behind
+        oldest = TutorCalendar.classroom.through.objects.filter(classroom__end_date__lte=now).aggregate(
+            oldest=Min("classroom__end_date")
+        )["oldest"]
+        default = oldest - timezone.timedelta(seconds=1) if oldest else now
+        JobWatermark.objects.get_or_create(name="ended_classes_calendar", defaults={"position": default})
+    with db_transaction.atomic():
+        watermark = JobWatermark.objects.select_for_update(skip_locked=True).filter(
+            name="ended_classes_calendar"
+        ).first()
+        if watermark is None or watermark.position >= now:
+            return 0
+        classroom_ids = list(
+            Classroom.objects.filter(end_date__gt=watermark.position, end_date__lte=now).values_list("id", flat=True)
+        )
+        release_classroom_calendar(classroom_ids)
+        watermark.position = now
+        watermark.save(update_fields=["position", "updated_on"])
+    return len(classroom_ids)
 
 
 def class_reminder_job():
     # This cron to run every minute
+    # Claims classrooms whose next reminder is due with an indexed range query, so a late or skipped run
+    # catches up instead of losing reminders, and a claimed reminder is never sent twice
     now = timezone.now()
-    notification_60min_time = now + timezone.timedelta(minutes=60)
-    notification_15min_time = now + timezone.timedelta(minutes=15)
-    notification_0min_time = now
-
-    classrooms_60min = Classroom.objects.filter(status="accepted", start_date=notification_60min_time)
-    classrooms_15min = Classroom.objects.filter(status="accepted", start_date=notification_15min_time)
-    classrooms_0min = Classroom.objects.filter(status="accepted", start_date=notification_0min_time)
-
-    # Just ended classes
-    ended_classes = Classroom.objects.filter(status="accepted", end_date__minute=now.minute, end_date__hour=now.hour)
-    # Unattended classes
-    unattended_classes = Classroom.objects.filter(status="new", start_date__minute=now.minute, start_date__hour=now.hour)
-    # All Ended Classes
-    all_ended_classes = Classroom.objects.filter(end_date__lte=now)
-
-    if classrooms_60min:
-        # Send 60 minute reminder
-        for class_room in classrooms_60min:
-            student_user = class_room.student.user
-            Thread(target=send_class_reminder_email, args=[student_user, class_room, 60, "fr"]).start()
-    if classrooms_15min:
-        # Send 15 minute reminder
-        for class_room in classrooms_15min:
-            student_user = class_room.student.user
-            Thread(target=send_class_reminder_email, args=[student_user, class_room, 15, "fr"]).start()
-    if classrooms_0min:
-        # Send 0 minute reminder
-        for class_room in classrooms_0min:
-            student_user = class_room.student.user
-            Thread(target=send_class_reminder_email, args=[student_user, class_room, 0, "fr"]).start()
-
-    if ended_classes:
-        # Send ended class reminder
-        for class_room in ended_classes:
-            # Remove classroom from all schedules
-            class_room.tutorcalendar_set.all().update(status="available")
-            for tutor_calendar in class_room.tutorcalendar_set.all():
-                tutor_calendar.classroom.clear()
-
-            student_email = class_room.student.user.email
-            parent_email = class_room.student.parent.user.email
-            tutor_email = class_room.tutor.email
-            Thread(target=send_class_ended_reminder_email, args=[student_email, class_room, "fr"]).start()
-            Thread(target=send_class_ended_reminder_email, args=[tutor_email, class_room, "fr"]).start()
-            Thread(target=send_class_ended_reminder_email, args=[parent_email, class_room, "fr"]).start()
-
-    if unattended_classes:
-        for class_room in unattended_classes:
-            # Set classroom status as declined
-            class_room.status = "declined"
-            class_room.save()
-            if TutorCalendar.objects.filter(classroom=class_room).exists():
-                t_calendar = TutorCalendar.objects.filter(classroom=class_room).last()
-                t_calendar.classroom.clear()
-                t_calendar.status = "available"
-                t_calendar.save()
-            Thread(target=student_class_declined_email, args=[class_room, "fr"]).start()
-
-    if all_ended_classes:
-        # Remove ended classroom from calendar
-        for class_room in all_ended_classes:
-            if TutorCalendar.objects.filter(classroom=class_room).exists():
-                t_calendar = TutorCalendar.objects.filter(classroom=class_room).last()
-                t_calendar.classroom.clear()
-                t_calendar.status = "available"
-                t_calendar.save()
-
-    return True
+    sent = 0
+    while True:
+        with db_transaction.atomic():
+            classrooms = list(
+                Classroom.objects.select_for_update(skip_locked=True, of=("self",))
+                .filter(next_reminder_at__lte=now).select_related("tutor", "student__user", "student__parent__user")
+                .order_by("next_reminder_at")[:REMINDER_CHUNK_SIZE]
+            )
+            if not classrooms:
+                break
+            reminders = [(class_room, class_room.pop_due_reminder(now)) for class_room in classrooms]
+            ended = [class_room for class_room, reminder in reminders if reminder == "ended"]
+            unattended = [class_room for class_room, reminder in reminders if reminder == "unattended"]
+            for class_room in unattended:
+                # Set classroom status as declined
+                class_room.status = "declined"
+                class_room.schedule_reminder()
+            release_classroom_calendar(ended + unattended)
+            Classroom.objects.bulk_update(classrooms, ["status", "last_reminder", "next_reminder_at"])
+            due = [(class_room, reminder) for class_room, reminder in reminders if reminder]
+            db_transaction.on_commit(lambda due=due: [send_classroom_reminder(*item) for item in due])
+        sent += len(due)
+    if sent:
+        log_request(f"Classroom reminders sent: {sent}")
+
+    # Remove ended classroom from calendar
+    release_ended_classes_calendar(now)
+    return sent
+
+
+def settle_classrooms_in_chunks(queryset, settle_chunk):
+    # Lock a chunk of eligible classrooms, skipping rows another run holds, and settle it in its own transaction.
+    # Settled rows no longer match the queryset, so overlapping runs cannot pay the same classroom twice.
+    settled = 0
+    failed_ids = list()
+    while True:
+        chunk = list()
+        try:
+            with db_transaction.atomic():
+                chunk = list(
+                    queryset.exclude(id__in=failed_ids).select_for_update(skip_locked=True, of=("self",))
+                    .select_related("tutor").order_by("id")[:SETTLEMENT_CHUNK_SIZE]
+                )
+                if not chunk:
+                    break
+                settle_chunk(chunk)
+            settled += len(chunk)
+        except Exception as err:
+            # Only this chunk is rolled back, leave it for the next run
+            log_request(f"Error settling classrooms {[classroom.id for classroom in chunk]}: {err}")
+            if not chunk:
+                break
+            failed_ids += [classroom.id for classroom in chunk]
+    return settled
 
 
 def class_fee_to_tutor_pending_balance_job():
     # This cron to run every 60 minute
     classrooms = Classroom.objects.filter(status="completed", pending_balance_paid=False)
-    # Update tutor wallet with class coin/amount
-    try:
-        now = timezone.now()
-        next_5_days = now + timezone.timedelta(days=5)
-        d_site = get_site_details()
-        for classroom in classrooms:
+    next_5_days = timezone.now() + timezone.timedelta(days=5)
+
+    def settle_chunk(chunk):
+        # Subtract from escrow balance and add to tutor's pending balance, one statement per table
+        bulk_adjust_escrow_balance([
+            EscrowEntry(amount=-classroom.amount, narration="Class fee to tutor pending balance", classroom=classroom)
+            for classroom in chunk
+        ])
+        wallet.bulk_post([
+            wallet.Posting(classroom.tutor_id, classroom.amount, "escrow", "pending", None, f"Class fee: {classroom.name}")
+            for classroom in chunk
+        ])
+        updated = Classroom.objects.filter(id__in=[classroom.id for classroom in chunk], pending_balance_paid=False).update(
+            pending_balance_paid=True, tutor_payment_expected=next_5_days, updated_on=timezone.now()
+        )
+        if updated != len(chunk):
+            raise ValueError("Classroom settled by another run")
+        deltas = new_deltas()
+        for classroom in chunk:
             amount = classroom.amount
-            user_wallet = classroom.tutor.wallet
-            esrow_balance = d_site.escrow_balance
-            # Subtract from escrow balance
-            esrow_balance -= amount
-            user_wallet.refresh_from_db()
-            # Add to tutor's pending balance
-            user_wallet.pending += amount
-            user_wallet.save()
-            classroom.pending_balance_paid = True
-            classroom.tutor_payment_expected = next_5_days
-            classroom.save()
-            # Send fund on the way email to tutor
-            Thread(target=send_fund_pending_balance_email, args=[classroom.tutor, classroom, "fr"]).start()
-    except Exception as err:
-        log_request(f"Error processining pending fund {err}")
-
-    return True
+            add_classroom_change(deltas, classroom.tutor_id, (), ("completed", amount, False), ("completed", amount, True))
+        apply_stats_deltas(deltas)
+        # Send fund on the way email to tutor
+        db_transaction.on_commit(lambda: [
+            send_fund_pending_balance_email(classroom.tutor, classroom, "fr") for classroom in chunk
+        ])
+
+    settled = settle_classrooms_in_chunks(classrooms, settle_chunk)
+    log_request(f"Classroom fees moved to tutor pending balance: {settled}")
+    return settled
 
 
 def process_pending_balance_to_main_job():
@@ -159,23 +196,44 @@ def process_pending_balance_to_main_job():
     classrooms = Classroom.objects.filter(
         status="completed", pending_balance_paid=True, tutor_payment_expected__lte=now, tutor_paid=False
     )
-    try:
-        for classroom in classrooms:
-            amount = classroom.amount
-            user_wallet = classroom.tutor.wallet
-            user_wallet.refresh_from_db()
-            # Subtract amount from pending balance
-            user_wallet.pending -= amount
-            # Add amount to main balance
-            user_wallet.balance += amount
-            user_wallet.save()
-            classroom.tutor_paid = True
-            classroom.save()
-            # Send classroom payment email to tutor
-            Thread(target=send_fund_main_balance_email, args=[classroom.tutor, classroom, "fr"]).start()
-    except Exception as err:
-        log_request(f"Error occurred while processing pending balance to main: {err}")
-    return True
+
+    def settle_chunk(chunk):
+        # Move amount from pending to main balance
+        wallet.bulk_post([
+            wallet.Posting(classroom.tutor_id, classroom.amount, "pending", "balance", None, f"Class fee: {classroom.name}")
+            for classroom in chunk
+        ])
+        updated = Classroom.objects.filter(id__in=[classroom.id for classroom in chunk], tutor_paid=False).update(
+            tutor_paid=True, updated_on=timezone.now()
+        )
+        if updated != len(chunk):
+            raise ValueError("Classroom settled by another run")
+        # Send classroom payment email to tutor
+        db_transaction.on_commit(lambda: [
+            send_fund_main_balance_email(classroom.tutor, classroom, "fr") for classroom in chunk
+        ])
+
+    settled = settle_classrooms_in_chunks(classrooms, settle_chunk)
+    log_request(f"Classroom fees moved to tutor main balance: {settled}")
+    return settled
+
+
+def complete_classrooms(classrooms):
+    # Mark accepted classrooms completed with one UPDATE and move their dashboard counters
+    rows = list(classrooms.values_list("id", "tutor_id", "student_id", "amount", "pending_balance_paid"))
+    with db_transaction.atomic():
+        completed = Classroom.objects.filter(id__in=[row[0] for row in rows], status="accepted").update(
+            status="completed", updated_on=timezone.now()
+        )
+        participants = get_participants([row[2] for row in rows if row[2]])
+        deltas = new_deltas()
+        for _, tutor_id, student_id, amount, pending_balance_paid in rows:
+            add_classroom_change(
+                deltas, tutor_id, participants.get(student_id, ()), ("accepted", amount, pending_balance_paid),
+                ("completed", amount, pending_balance_paid)
+            )
+        apply_stats_deltas(deltas)
+    return completed
 
 
 def update_ended_classroom_jobs():
@@ -183,24 +241,50 @@ def update_ended_classroom_jobs():
     query = Q(tutor_complete_check=True) | Q(student_complete_check=True)
     now = timezone.now()
     ended_classrooms = Classroom.objects.filter(query, status="accepted", end_date__lte=now)
+    completed = 0
     # Mark classes as completed
     if ended_classrooms:
-        ended_classrooms.update(status="completed")
+        completed += complete_classrooms(ended_classrooms)
         # Send email and notification
         for classroom in ended_classrooms:
-            Thread(target=auto_classroom_complete_email, args=[classroom.tutor, classroom, "fr"]).start()
+            auto_classroom_complete_email(classroom.tutor, classroom, "fr")
 
     # Check for all past classes
     last_24hrs = now - timezone.timedelta(hours=24)
     past_classes = Classroom.objects.filter(status="accepted", end_date__lte=last_24hrs)
     if past_classes:
-        past_classes.update(status="completed")
+        completed += complete_classrooms(past_classes)
         # Send email and notification
         for classroom in ended_classrooms:
-            Thread(target=auto_classroom_complete_email, args=[classroom.tutor, classroom, "fr"]).start()
+            auto_classroom_complete_email(classroom.tutor, classroom, "fr")
+
+    return completed
+
+
+def translation_cache_cleanup_job():
+    # This cron to run every 24 hrs
+    deleted = prune_translation_cache()
+    log_request(f"Translation cache entries removed: {deleted}")
+    return deleted
+
 
-    return True
+def job_run_cleanup_job():
+    # This cron to run every 24 hrs
+    retention_start = timezone.now() - timezone.timedelta(days=settings.JOB_RUN_RETENTION_DAYS)
+    deleted, _ = JobRun.objects.filter(started_on__lt=retention_start).delete()
+    log_request(f"Job runs removed: {deleted}")
+    return deleted
 
 
+def escrow_balance_job():
+    # This cron to run every 15 minutes
+    entries = materialize_escrow_balance()
+    log_request(f"Escrow ledger entries materialized: {entries}")
+    return entries
 
 
+def tutor_search_index_job():
+    # This cron to run every 24 hrs, rebuilds documents that drifted through bulk updates
+    written = rebuild_tutor_documents()
+    log_request(f"Tutor search documents rebuilt: {written}")
+    return written
@@ -1,5 +1,25 @@
 from django.shortcuts import render
-from edudream.modules.utils import send_email, translate_email, decrypt_text, get_site_details
+from edudream.modules.outbox import queue_email, queue_bulk_email
+from edudream.modules.utils import translate_email_template, decrypt_text, get_site_details
+
+
+# Messages and subjects are str.format templates. The static text is translated once per language and cached,
+# per-recipient values are filled in after translation. Emails are queued and sent by the process_email_outbox worker.
+def send_template_email(email, subject, message, lang, **values):
+    translated_content = translate_email_template(message, lang, **values)
+    translated_subject = translate_email_template(subject, lang, **values)
+    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
+    queue_email(contents, email, translated_subject)
+    return True
+
+
+def send_bulk_template_email(emails, subject, message, lang, **values):
+    # For emails whose content does not depend on the recipient
+    translated_content = translate_email_template(message, lang, **values)
+    translated_subject = translate_email_template(subject, lang, **values)
+    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
+    queue_bulk_email(contents, emails, translated_subject)
+    return True
 
 
 def parent_class_creation_email(classroom, lang):
@@ -12,14 +32,13 @@ def parent_class_creation_email(classroom, lang):
     if not first_name:
         first_name = "EduDream Parent"
 
-    message = f"Dear {first_name}, <br><br>Your child/ward: <strong>{student_name}</strong> just created a classroom " \
-              f"with a tutor <br>Tutor Name: <strong>{tutor_name}</strong><br>Subject: <strong>{subject}</strong>" \
-              f"<br>Amount: <strong>{amount}</strong>"
-    subject = "New Class Room Request"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Your child/ward: <strong>{student_name}</strong> just created a classroom " \
+              "with a tutor <br>Tutor Name: <strong>{tutor_name}</strong><br>Subject: <strong>{subject}</strong>" \
+              "<br>Amount: <strong>{amount}</strong>"
+    send_template_email(
+        email, "New Class Room Request", message, lang, first_name=first_name, student_name=student_name,
+        tutor_name=tutor_name, subject=subject, amount=amount
+    )
     return True
 
 
@@ -30,13 +49,11 @@ def tutor_class_creation_email(classroom, lang):
     if not tutor_name:
         tutor_name = "EduDream Tutor"
 
-    message = f"Dear {tutor_name}, <br><br>You have a new classroom request from <strong>{student_name}</strong>" \
-              f"<br>Kindly login to your dashboard to accept or decline the request."
-    subject = "New Class Room Request"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {tutor_name}, <br><br>You have a new classroom request from <strong>{student_name}</strong>" \
+              "<br>Kindly login to your dashboard to accept or decline the request."
+    send_template_email(
+        email, "New Class Room Request", message, lang, tutor_name=tutor_name, student_name=student_name
+    )
     return True
 
 
@@ -50,14 +67,13 @@ def tutor_class_approved_email(classroom, lang):
     if not tutor_name:
         tutor_name = "EduDream Tutor"
 
-    message = f"Dear {tutor_name}, <br><br>Classroom request accepted with " \
-              f"<strong>{student_name}</strong><br>Class Name: <strong>{class_name}</strong><br>Class Link: " \
-              f"<strong>{link}</strong><br>Class Fee: <strong>{amount}</strong>"
-    subject = "Classroom Request Approved"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {tutor_name}, <br><br>Classroom request accepted with " \
+              "<strong>{student_name}</strong><br>Class Name: <strong>{class_name}</strong><br>Class Link: " \
+              "<strong>{link}</strong><br>Class Fee: <strong>{amount}</strong>"
+    send_template_email(
+        email, "Classroom Request Approved", message, lang, tutor_name=tutor_name, student_name=student_name,
+        class_name=class_name, link=link, amount=amount
+    )
     return True
 
 
@@ -70,14 +86,13 @@ def student_class_approved_email(classroom, lang):
     if not student_name:
         student_name = "EduDream Student"
 
-    message = f"Dear {student_name}, <br><br>Your request to start the following class was approved." \
-              f"<br>Class Name: <strong>{class_name}</strong><br>Class Link: " \
-              f"<strong>{link}</strong><br>Tutor Name: <strong>{tutor_name}</strong>"
-    subject = "Classroom Request Approved"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {student_name}, <br><br>Your request to start the following class was approved." \
+              "<br>Class Name: <strong>{class_name}</strong><br>Class Link: " \
+              "<strong>{link}</strong><br>Tutor Name: <strong>{tutor_name}</strong>"
+    send_template_email(
+        email, "Classroom Request Approved", message, lang, student_name=student_name, class_name=class_name,
+        link=link, tutor_name=tutor_name
+    )
     return True
 
 
@@ -89,15 +104,14 @@ def student_class_declined_email(classroom, lang):
     if not student_name:
         student_name = "EduDream Student"
 
-    message = f"Dear {student_name}, <br><br>Your request to start the following class was declined" \
-              f"<br>Class Name: <strong>{class_name}</strong>" \
-              f"<br>Status: <strong>DECLINED</strong>" \
-              f"<br>Decline Reason: <strong>{reason}</strong>"
-    subject = "Classroom Request Declined!"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {student_name}, <br><br>Your request to start the following class was declined" \
+              "<br>Class Name: <strong>{class_name}</strong>" \
+              "<br>Status: <strong>DECLINED</strong>" \
+              "<br>Decline Reason: <strong>{reason}</strong>"
+    send_template_email(
+        email, "Classroom Request Declined!", message, lang, student_name=student_name, class_name=class_name,
+        reason=reason
+    )
     return True
 
 
@@ -107,13 +121,9 @@ def tutor_register_email(user, lang):
     if not name:
         name = "EduDream Tutor"
 
-    message = f"Dear {name}, <br><br>You have successfully registered on Edudream as a Tutor" \
-              f"<br>Your account is under review, and will be active shortly."
-    subject = "Signup Successful"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>You have successfully registered on Edudream as a Tutor" \
+              "<br>Your account is under review, and will be active shortly."
+    send_template_email(email, "Signup Successful", message, lang, name=name)
     return True
 
 
@@ -123,13 +133,9 @@ def tutor_status_email(user):
     if not name:
         name = "EduDream Tutor"
 
-    message = f"Dear {name}, <br><br>Your Tutor profile on EduDream is now active" \
-              f"<br>Please login to your dashboard to complete or update your profile"
-    subject = "Account Activated"
-    translated_content = translate_email(message, "fr")
-    translated_subject = translate_email(subject, "fr")
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>Your Tutor profile on EduDream is now active" \
+              "<br>Please login to your dashboard to complete or update your profile"
+    send_template_email(email, "Account Activated", message, "fr", name=name)
     return True
 
 
@@ -139,13 +145,9 @@ def parent_register_email(user, lang):
     if not name:
         name = "EduDream Parent"
 
-    message = f"Dear {name}, <br><br>You have successfully registered on Edudream as a Parent" \
-              f"<br>Please login to your dashboard to add your child/ward"
-    subject = "Signup Successful"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>You have successfully registered on Edudream as a Parent" \
+              "<br>Please login to your dashboard to add your child/ward"
+    send_template_email(email, "Signup Successful", message, lang, name=name)
     return True
 
 
@@ -155,13 +157,9 @@ def parent_class_cancel_email(user, amount, lang):
     if not name:
         name = "EduDream Parent"
 
-    message = f"Dear {name}, <br><br>A classroom was cancelled and {amount} coins have been refunded to your wallet" \
-              f"<br>Please login to your dashboard to confirm"
-    subject = "Cancelled Class"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>A classroom was cancelled and {amount} coins have been refunded to your wallet" \
+              "<br>Please login to your dashboard to confirm"
+    send_template_email(email, "Cancelled Class", message, lang, name=name, amount=amount)
     return True
 
 
@@ -171,14 +169,13 @@ def student_class_cancel_email(user, classroom, lang):
     if not name:
         name = "EduDream Student"
 
-    message = f"Dear {name}, <br><br>A classroom was cancelled by your tutor" \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-              f"<br>Tutor Name: <strong>{classroom.tutor.get_full_name()}</strong>"
-    subject = "Cancelled Class"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>A classroom was cancelled by your tutor" \
+              "<br>Class Name: <strong>{class_name}</strong>" \
+              "<br>Tutor Name: <strong>{tutor_name}</strong>"
+    send_template_email(
+        email, "Cancelled Class", message, lang, name=name, class_name=classroom.name,
+        tutor_name=classroom.tutor.get_full_name()
+    )
     return True
 
 
@@ -188,14 +185,10 @@ def parent_low_threshold_email(user, amount, lang):
     if not name:
         name = "EduDream Parent"
 
-    message = f"Dear {name}, <br><br>This is to notify you that your wallet balance is low on coin" \
-              f"<br>New wallet balance: <strong>{amount} coins</strong>"\
-              f"<br>Please login to your dashboard and fund your wallet"
-    subject = "Low Balance"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>This is to notify you that your wallet balance is low on coin" \
+              "<br>New wallet balance: <strong>{amount} coins</strong>"\
+              "<br>Please login to your dashboard and fund your wallet"
+    send_template_email(email, "Low Balance", message, lang, name=name, amount=amount)
     return True
 
 
@@ -205,13 +198,9 @@ def payout_request_email(user, lang):
     if not name:
         name = "EduDream Tutor"
 
-    message = f"Dear {name}, <br><br>Your payout request has been created and will be proccessed in seven (7) days" \
-              f"<br>The fund will reflect in select account."
-    subject = "Payout Request"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>Your payout request has been created and will be proccessed in seven (7) days" \
+              "<br>The fund will reflect in select account."
+    send_template_email(email, "Payout Request", message, lang, name=name)
     return True
 
 
@@ -221,15 +210,14 @@ def parent_intro_call_email(user, tutor_name, start_date, end_date, link, lang):
     if not name:
         name = "EduDream Parent"
 
-    message = f"Dear {name}, <br><br>Your Virtual Intro Call with tutor {tutor_name} on EduDream has been scheduled." \
-              f"<br>Start: <strong>{start_date}</strong>" \
-              f"<br>End: <strong>{end_date}</strong>" \
-              f"<br>Meeting Link: <strong>{link}</strong>"
-    subject = f"EduDream: Intro Call with {tutor_name}"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>Your Virtual Intro Call with tutor {tutor_name} on EduDream has been scheduled." \
+              "<br>Start: <strong>{start_date}</strong>" \
+              "<br>End: <strong>{end_date}</strong>" \
+              "<br>Meeting Link: <strong>{link}</strong>"
+    send_template_email(
+        email, "EduDream: Intro Call with {tutor_name}", message, lang, name=name, tutor_name=tutor_name,
+        start_date=start_date, end_date=end_date, link=link
+    )
     return True
 
 
@@ -239,53 +227,45 @@ def tutor_intro_call_email(user, u_name, start_date, end_date, link, lang):
     if not name:
         name = "EduDream Tutor"
 
-    message = f"Dear {name}, <br><br>You have a Virtual Intro Call request from {u_name} on EduDream." \
-              f"<br>Start: <strong>{start_date}</strong>" \
-              f"<br>End: <strong>{end_date}</strong>" \
-              f"<br>Meeting Link: <strong>{link}</strong>"
-    subject = f"EduDream: Intro Call with {u_name}"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>You have a Virtual Intro Call request from {u_name} on EduDream." \
+              "<br>Start: <strong>{start_date}</strong>" \
+              "<br>End: <strong>{end_date}</strong>" \
+              "<br>Meeting Link: <strong>{link}</strong>"
+    send_template_email(
+        email, "EduDream: Intro Call with {u_name}", message, lang, name=name, u_name=u_name,
+        start_date=start_date, end_date=end_date, link=link
+    )
     return True
 
 
 def feedback_email(email, f_name, f_email, msg, lang):
     name = "EduDream Admin"
-    message = f"Dear {name}, <br><br>You have received a new feedback from {f_name} on EduDream." \
-              f"<br>Email: <strong>{f_email}</strong>" \
-              f"<br>Message: <strong>{msg}</strong>"
-    subject = f"EduDream: New Feedback"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>You have received a new feedback from {f_name} on EduDream." \
+              "<br>Email: <strong>{f_email}</strong>" \
+              "<br>Message: <strong>{msg}</strong>"
+    send_template_email(
+        email, "EduDream: New Feedback", message, lang, name=name, f_name=f_name, f_email=f_email, msg=msg
+    )
     return True
 
 
 def consultation_email(email, f_name, f_email, acct_type, lang):
     name = "EduDream Admin"
-    message = f"Dear {name}, <br><br>You have received a new consultation request from {f_name} on EduDream." \
-              f"<br>Email: <strong>{f_email}</strong>" \
-              f"<br>Account Type: <strong>{acct_type}</strong>"
-    subject = f"EduDream: New Consultation Request"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {name}, <br><br>You have received a new consultation request from {f_name} on EduDream." \
+              "<br>Email: <strong>{f_email}</strong>" \
+              "<br>Account Type: <strong>{acct_type}</strong>"
+    send_template_email(
+        email, "EduDream: New Consultation Request", message, lang, name=name, f_name=f_name, f_email=f_email,
+        acct_type=acct_type
+    )
     return True
 
 
 def send_otp_token_to_email(user_profile, otp, lang):
     email = user_profile.user.email
-    message = f"Hello, <br><br>Kindly use the below One Time Token, to complete your action<br><br>" \
-              f"OTP: <strong>{otp}</strong>"
-    subject = "EduDream: One-Time-Passcode"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Hello, <br><br>Kindly use the below One Time Token, to complete your action<br><br>" \
+              "OTP: <strong>{otp}</strong>"
+    send_template_email(email, "EduDream: One-Time-Passcode", message, lang, otp=otp)
     return True
 
 
@@ -296,13 +276,11 @@ def send_token_to_email(user_profile):
     email = user_profile.user.email
     decrypted_token = decrypt_text(user_profile.otp)
 
-    message = f"Dear {first_name}, <br><br>Kindly use the below One Time Token, to complete your action<br><br>" \
-              f"OTP: <strong>{decrypted_token}</strong>"
-    subject = "EduDream Verification"
-    translated_content = translate_email(message, "fr")
-    translated_subject = translate_email(subject, "fr")
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Kindly use the below One Time Token, to complete your action<br><br>" \
+              "OTP: <strong>{decrypted_token}</strong>"
+    send_template_email(
+        email, "EduDream Verification", message, "fr", first_name=first_name, decrypted_token=decrypted_token
+    )
     return True
 
 
@@ -315,12 +293,11 @@ def send_verification_email(user_profile, lang):
         first_name = "EduDream User"
     email = user_profile.user.email
 
-    message = f"Dear {first_name}, <br><br>Kindly click <a href='{frontend_base_url}/#/auth/sign-in?token={user_profile.email_verified_code}' target='_blank'>here</a> to verify your email. "
-    subject = f"EduDream Email Verification"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Kindly click <a href='{frontend_base_url}/#/auth/sign-in?token={token}' target='_blank'>here</a> to verify your email. "
+    send_template_email(
+        email, "EduDream Email Verification", message, lang, first_name=first_name,
+        frontend_base_url=frontend_base_url, token=user_profile.email_verified_code
+    )
     return True
 
 
@@ -330,16 +307,11 @@ def send_welcome_email(user_profile, lang):
         first_name = "EduDream User"
     email = user_profile.user.email
 
-    message = f'<p class="letter-heading">Hello <span>{first_name}!</span> <br><br><br><br></p>' \
-              f'<div class="letter-body"><p>Welcome to EduDream.<br>' \
-              f'<br>Our mission is to revolutionize online education by providing personalized, accessible, and ' \
-              f'affordable tutoring to foster academic excellence and personal growth in every student.<br><br>'
-
-    subject = f"Welcome to EduDream"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = '<p class="letter-heading">Hello <span>{first_name}!</span> <br><br><br><br></p>' \
+              '<div class="letter-body"><p>Welcome to EduDream.<br>' \
+              '<br>Our mission is to revolutionize online education by providing personalized, accessible, and ' \
+              'affordable tutoring to foster academic excellence and personal growth in every student.<br><br>'
+    send_template_email(email, "Welcome to EduDream", message, lang, first_name=first_name)
     return True
 
 
@@ -349,32 +321,30 @@ def send_class_reminder_email(user, classroom, minu, lang):
         first_name = "EduDream User"
     email = user.email
 
-    message = f"Dear {first_name}, <br><br>A classroom will start in the next {minu} minute(s)" \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-              f"<br>Tutor Name: <strong>{classroom.tutor.get_full_name()}</strong>"
+    message = "Dear {first_name}, <br><br>A classroom will start in the next {minu} minute(s)" \
+              "<br>Class Name: <strong>{class_name}</strong>" \
+              "<br>Tutor Name: <strong>{tutor_name}</strong>"
     if minu == 0:
-        message = f"Dear {first_name}, <br><br>A classroom {classroom.name} with {classroom.tutor.get_full_name()} " \
-                  f"is starting now." \
+        message = "Dear {first_name}, <br><br>A classroom {class_name} with {tutor_name} " \
+                  "is starting now."
 
-    subject = f"Class Reminder"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    send_template_email(
+        email, "Class Reminder", message, lang, first_name=first_name, minu=minu, class_name=classroom.name,
+        tutor_name=classroom.tutor.get_full_name()
+    )
     return True
 
 
-def send_class_ended_reminder_email(email, classroom, lang):
-    message = f"Hello!, <br><br>A classroom has just ended. Please login to your dashboard to mark it as completed " \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-              f"<br>Tutor Name: <strong>{classroom.tutor.get_full_name()}</strong>" \
-              f"<br>Kindly ignore this email, you have already marked this class as completed"
-
-    subject = f"Class Ended"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+def send_class_ended_reminder_email(emails, classroom, lang):
+    if isinstance(emails, str):
+        emails = [emails]
+    message = "Hello!, <br><br>A classroom has just ended. Please login to your dashboard to mark it as completed " \
+              "<br>Class Name: <strong>{class_name}</strong>" \
+              "<br>Tutor Name: <strong>{tutor_name}</strong>" \
+              "<br>Kindly ignore this email, you have already marked this class as completed"
+    send_bulk_template_email(
+        emails, "Class Ended", message, lang, class_name=classroom.name, tutor_name=classroom.tutor.get_full_name()
+    )
     return True
 
 
@@ -384,15 +354,10 @@ def send_fund_pending_balance_email(user, classroom, lang):
         first_name = "EduDream Tutor"
     email = user.email
 
-    message = f"Dear {first_name}, <br><br>Congratulations! Your fund for completed class is now pending, " \
-              f"and will reflect in your main balance after 7 days" \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-
-    subject = f"Fund on the way"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Congratulations! Your fund for completed class is now pending, " \
+              "and will reflect in your main balance after 7 days" \
+              "<br>Class Name: <strong>{class_name}</strong>"
+    send_template_email(email, "Fund on the way", message, lang, first_name=first_name, class_name=classroom.name)
     return True
 
 
@@ -402,15 +367,10 @@ def send_fund_main_balance_email(user, classroom, lang):
         first_name = "EduDream Tutor"
     email = user.email
 
-    message = f"Dear {first_name}, <br><br>Congratulations! Your fund for completed class is now moved to " \
-              f"your main balance, " \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-
-    subject = f"Payment to wallet"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Congratulations! Your fund for completed class is now moved to " \
+              "your main balance, " \
+              "<br>Class Name: <strong>{class_name}</strong>"
+    send_template_email(email, "Payment to wallet", message, lang, first_name=first_name, class_name=classroom.name)
     return True
 
 
@@ -420,15 +380,10 @@ def auto_classroom_complete_email(user, classroom, lang="en"):
         first_name = "EduDream Tutor"
     email = user.email
 
-    message = f"Dear {first_name}, <br><br>A recent class you taught is now marked as <strong>COMPLETED</strong>. " \
-              f"Your payment will reflect in your wallet balance shortly." \
-              f"<br>Class Name: <strong>{classroom.name}</strong>" \
-
-    subject = f"Class Completed"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>A recent class you taught is now marked as <strong>COMPLETED</strong>. " \
+              "Your payment will reflect in your wallet balance shortly." \
+              "<br>Class Name: <strong>{class_name}</strong>"
+    send_template_email(email, "Class Completed", message, lang, first_name=first_name, class_name=classroom.name)
     return True
 
 
@@ -438,15 +393,8 @@ def send_payout_processed_email(user, amount, lang):
         first_name = "EduDream Tutor"
     email = user.email
 
-    message = f"Dear {first_name}, <br><br>Your payout request is processed, and fund will be credited to your " \
-              f"shortly. " \
-              f"<br>Payout Amount: <strong>{amount}</strong>" \
-
-    subject = f"Payout Processed"
-    translated_content = translate_email(message, lang)
-    translated_subject = translate_email(subject, lang)
-    contents = render(None, 'default_template.html', context={'message': translated_content}).content.decode('utf-8')
-    send_email(contents, email, translated_subject)
+    message = "Dear {first_name}, <br><br>Your payout request is processed, and fund will be credited to your " \
+              "shortly. " \
+              "<br>Payout Amount: <strong>{amount}</strong>"
+    send_template_email(email, "Payout Processed", message, lang, first_name=first_name, amount=amount)
     return True
-
-
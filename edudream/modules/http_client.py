@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+sessions = dict()
+sessions_lock = threading.Lock()
+metrics = dict()
+metrics_lock = threading.Lock()
+
+
+class JitterRetry(Retry):
+    # Spread retries from concurrent workers instead of hitting the provider in lockstep
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if not backoff:
+            return 0
+        return random.uniform(backoff / 2, backoff * 1.5)
+
+
+def get_session(url):
+    parsed = urlparse(str(url))
+    host = f"{parsed.scheme}://{parsed.netloc}"
+    with sessions_lock:
+        session = sessions.get(host)
+        if session is None:
+            # Connection errors are retried for every method, read errors and 5xx only for idempotent ones
+            retry = JitterRetry(
+                total=settings.HTTP_MAX_RETRIES, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.HTTP_POOL_MAXSIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount(f"{parsed.scheme}://", adapter)
+            sessions[host] = session
+        return session
+
+
+def record_latency(integration, elapsed, failed):
+    elapsed_ms = elapsed * 1000
+    with metrics_lock:
+        item = metrics.setdefault(integration, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        item["count"] += 1
+        item["errors"] += int(failed)
+        item["total_ms"] += elapsed_ms
+        item["max_ms"] = max(item["max_ms"], elapsed_ms)
+    if elapsed_ms >= settings.HTTP_SLOW_REQUEST_MS:
+        from edudream.modules.utils import log_request
+        log_request(f"Slow {integration} request: {int(elapsed_ms)}ms")
+
+
+def http_request(integration, method, url, **kwargs):
+    """
+    Drop-in for requests.request that reuses a pooled keep-alive session per host, applies default
+    timeouts and retries, and records latency under the integration name e.g. "email", "deepl", "zoom".
+    """
+    kwargs.setdefault("timeout", (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT))
+    start = time.monotonic()
+    failed = True
+    try:
+        response = get_session(url).request(method, url, **kwargs)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        record_latency(integration, time.monotonic() - start, failed)
+
+
+def get_http_metrics():
+    with metrics_lock:
+        return {
+            integration: {
+                "count": item["count"], "errors": item["errors"], "max_ms": round(item["max_ms"], 2),
+                "avg_ms": round(item["total_ms"] / item["count"], 2) if item["count"] else 0
+            }
+            for integration, item in metrics.items()
+        }
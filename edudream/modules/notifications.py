@@ -0,0 +1,59 @@
+from django.db.models import Q, Exists, OuterRef, Count
+from django.utils import timezone
+
+from edudream.modules.authentication import get_account_type
+from home.models import Notification, NotificationRead, NotificationRecipient, UserStats
+
+
+def get_audiences(user):
+    account_type = get_account_type(user)
+    return ["all", account_type] if account_type else ["all"]
+
+
+def get_broadcast_query(user):
+    # Broadcasts are merged at read time instead of being copied to every user, users see those sent after they joined
+    return Q(audience__in=get_audiences(user), created_on__gte=user.date_joined)
+
+
+def get_user_notifications(user):
+    # Notifications sent to the user directly, plus broadcasts to the user's audiences
+    direct = NotificationRecipient.objects.filter(user_id=user.id).values("notification_id")
+    return Notification.objects.filter(Q(id__in=direct) | get_broadcast_query(user))
+
+
+def with_read_state(queryset, user):
+    read = NotificationRead.objects.filter(notification_id=OuterRef("pk"), user_id=user.id)
+    return queryset.annotate(user_read=Exists(read))
+
+
+def count_unread_notifications(user_ids):
+    # {user_id: unread direct notifications}
+    read = NotificationRead.objects.filter(notification_id=OuterRef("notification_id"), user_id=OuterRef("user_id"))
+    return dict(
+        NotificationRecipient.objects.filter(user_id__in=user_ids).exclude(Exists(read)).values_list("user_id")
+        .annotate(Count("id"))
+    )
+
+
+def refresh_unread_notifications(user_ids):
+    unread = count_unread_notifications(user_ids)
+    now = timezone.now()
+    for user_id in set(user_ids):
+        UserStats.objects.filter(user_id=user_id).update(unread_notifications=unread.get(user_id, 0), updated_on=now)
+
+
+def mark_notifications_read(user, queryset):
+    # The one mark-read path for direct notifications and broadcasts
+    unread = queryset.exclude(reads__user_id=user.id).values_list("id", flat=True)
+    created = NotificationRead.objects.bulk_create(
+        [NotificationRead(notification_id=notification_id, user_id=user.id) for notification_id in unread],
+        ignore_conflicts=True
+    )
+    if created:
+        # Recounted rather than decremented, so concurrent mark-read calls cannot push the counter below zero
+        refresh_unread_notifications([user.id])
+
+
+def get_unread_count(user, stats):
+    unread_broadcasts = Notification.objects.filter(get_broadcast_query(user)).exclude(reads__user_id=user.id).count()
+    return stats.unread_notifications + unread_broadcasts
@@ -0,0 +1,155 @@
+import hashlib
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from edudream.modules.utils import deliver_bulk_email, log_request, EMAIL_PERSONALIZATION_LIMIT
+from home.models import OutboundEmail
+
+# Rows stuck in "sending" longer than this were claimed by a worker that died
+STALE_LOCK_MINUTES = 10
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+
+provider_semaphores = dict()
+provider_semaphores_lock = threading.Lock()
+
+
+def get_email_provider():
+    return urlparse(str(settings.EMAIL_URL)).netloc or "default"
+
+
+def get_email_hash(content, subject):
+    return hashlib.sha256(f"{subject}\n{content}".encode("utf-8")).hexdigest()
+
+
+def queue_email(content, email, subject):
+    return OutboundEmail.objects.create(
+        content=content, email=email, subject=subject, provider=get_email_provider(),
+        content_hash=get_email_hash(content, subject)
+    )
+
+
+def queue_bulk_email(content, emails, subject):
+    # Same rendered email for many recipients, the worker sends these as one request per 1,000 recipients
+    provider = get_email_provider()
+    content_hash = get_email_hash(content, subject)
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(content=content, email=email, subject=subject, provider=provider, content_hash=content_hash)
+        for email in dict.fromkeys(emails)
+    ])
+
+
+def get_provider_semaphore(provider):
+    with provider_semaphores_lock:
+        if provider not in provider_semaphores:
+            limits = settings.EMAIL_OUTBOX_PROVIDER_CONCURRENCY
+            provider_semaphores[provider] = threading.BoundedSemaphore(limits.get(provider, limits.get("default", 4)))
+        return provider_semaphores[provider]
+
+
+def claim_emails(batch_size):
+    now = timezone.now()
+    stale_lock = now - timezone.timedelta(minutes=STALE_LOCK_MINUTES)
+    query = Q(status="pending", next_attempt_on__lte=now) | Q(status="sending", locked_on__lte=stale_lock)
+    with transaction.atomic():
+        ids = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True).filter(query)
+            .order_by("next_attempt_on").values_list("id", flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(id__in=ids).update(status="sending", locked_on=now, updated_on=now)
+    return list(OutboundEmail.objects.filter(id__in=ids))
+
+
+def group_emails(emails):
+    # Rows with identical rendered content share one request with a personalization per recipient
+    groups = defaultdict(list)
+    for outbound in emails:
+        groups[(outbound.provider, outbound.content_hash or outbound.id)].append(outbound)
+    result = list()
+    for group in groups.values():
+        for index in range(0, len(group), EMAIL_PERSONALIZATION_LIMIT):
+            result.append(group[index:index + EMAIL_PERSONALIZATION_LIMIT])
+    return result
+
+
+def send_email_group(group):
+    outbound = group[0]
+    with get_provider_semaphore(outbound.provider or "default"):
+        try:
+            response = deliver_bulk_email(outbound.content, [item.email for item in group], outbound.subject)[0]
+        except requests.RequestException as err:
+            return group, False, True, str(err)
+    if 200 <= response.status_code < 300:
+        return group, True, False, None
+    # Rate limits and provider errors are worth retrying, other client errors are not
+    retry = response.status_code == 429 or response.status_code >= 500
+    return group, False, retry, f"{response.status_code}: {response.text[:1000]}"
+
+
+def send_outbound_emails(group):
+    """
+    Runs in a worker thread: HTTP only, the database is updated by the caller. A group the provider rejects with
+    a client error is split in halves and sent again, so one bad address only fails its own row.
+    Returns a list of (group, sent, retry, error).
+    """
+    group, sent, retry, error = send_email_group(group)
+    if sent or retry or len(group) == 1:
+        return [(group, sent, retry, error)]
+    middle = len(group) // 2
+    return send_outbound_emails(group[:middle]) + send_outbound_emails(group[middle:])
+
+
+def record_results(group, sent, retry, error):
+    now = timezone.now()
+    by_attempts = defaultdict(list)
+    for outbound in group:
+        by_attempts[outbound.attempts + 1].append(outbound.id)
+    for attempts, ids in by_attempts.items():
+        fields = {"attempts": attempts, "locked_on": None, "last_error": error, "updated_on": now}
+        if sent:
+            fields.update(status="sent", sent_on=now)
+        elif retry and attempts < settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            delay = min(RETRY_BASE_SECONDS * (2 ** (attempts - 1)), RETRY_MAX_SECONDS)
+            fields.update(status="pending", next_attempt_on=now + timezone.timedelta(seconds=delay))
+        else:
+            fields.update(status="failed")
+            log_request(f"{len(ids)} email(s) failed after {attempts} attempt(s): {error}")
+        OutboundEmail.objects.filter(id__in=ids).update(**fields)
+
+
+def process_outbox(batch_size=None, workers=None):
+    """
+    Send one batch of queued emails with a bounded pool. Returns the number of emails claimed.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    workers = workers or settings.EMAIL_OUTBOX_WORKERS
+    emails = claim_emails(batch_size)
+    if not emails:
+        return 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(send_outbound_emails, group_emails(emails)):
+            for group, sent, retry, error in results:
+                record_results(group, sent, retry, error)
+    return len(emails)
+
+
+def outbox_depth():
+    now = timezone.now()
+    result = OutboundEmail.objects.aggregate(
+        pending=Count("id", filter=Q(status="pending")),
+        due=Count("id", filter=Q(status="pending", next_attempt_on__lte=now)),
+        sending=Count("id", filter=Q(status="sending")),
+        failed=Count("id", filter=Q(status="failed")),
+        oldest_pending=Min("created_on", filter=Q(status="pending")),
+    )
+    oldest_pending = result.pop("oldest_pending")
+    result["oldest_pending_seconds"] = int((now - oldest_pending).total_seconds()) if oldest_pending else 0
+    return result
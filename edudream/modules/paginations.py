@@ -10,3 +10,16 @@ class AdminPagination(pagination.PageNumberPagination):
     page_size = 10
     max_page_size = 15
 
+
+class ChatCursorPagination(pagination.CursorPagination):
+    page_size = 30
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_on", "-id")
+
+
+class NotificationCursorPagination(pagination.CursorPagination):
+    page_size = 30
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = "-id"
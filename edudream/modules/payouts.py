@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from edudream.modules.email_template import send_payout_processed_email
+from edudream.modules.stats import new_deltas, apply_stats_deltas
+from edudream.modules.stripe_api import StripeAPI
+from edudream.modules.utils import log_request
+from home.models import Transaction
+from tutor.models import PayoutRequest
+
+# Rows stuck in "processing" longer than this were claimed by a run that died, the idempotency key makes
+# sending them again safe
+STALE_LOCK_MINUTES = 15
+
+
+def get_idempotency_key(payout):
+    return f"payout-{payout.id}"
+
+
+def claim_payouts(batch_size, exclude_ids=()):
+    now = timezone.now()
+    stale_lock = now - timezone.timedelta(minutes=STALE_LOCK_MINUTES)
+    query = Q(status="pending") | Q(status="processing", locked_on__lte=stale_lock)
+    with transaction.atomic():
+        ids = list(
+            PayoutRequest.objects.select_for_update(skip_locked=True).filter(query).exclude(id__in=exclude_ids)
+            .order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        PayoutRequest.objects.filter(id__in=ids).update(status="processing", locked_on=now, updated_on=now)
+    return list(
+        PayoutRequest.objects.filter(id__in=ids).select_related("user__profile", "bank_account", "transaction")
+    )
+
+
+def send_payout(payout):
+    # Runs in a worker thread: Stripe only, the database is updated by the caller
+    try:
+        response = StripeAPI.payout_to_external_account(
+            amount=float(payout.amount), acct=payout.bank_account.stripe_external_account_id,
+            stripe_acct=payout.user.profile.stripe_connect_account_id, idempotency_key=get_idempotency_key(payout)
+        )
+    except stripe.error.StripeError as err:
+        # Network errors and rate limits are worth retrying with the same idempotency key. Stripe replays a cached
+        # server error for that key and its outcome is unknown, so those are failed like declines and reviewed
+        retry = isinstance(err, (stripe.error.APIConnectionError, stripe.error.RateLimitError))
+        return payout, None, retry, str(err)
+    except Exception as err:
+        return payout, None, True, str(err)
+    if response.get("failure_message") is None and response.get("id"):
+        return payout, response, False, None
+    return payout, response, False, str(response.get("failure_message"))
+
+
+def record_payout_result(payout, response, retry, error):
+    now = timezone.now()
+    attempts = payout.attempts + 1
+    fields = {"attempts": attempts, "locked_on": None, "last_error": error, "updated_on": now}
+    if response is not None and error is None:
+        fields.update(status="processed", reference=str(response.get("id")))
+    elif retry and attempts < settings.PAYOUT_MAX_ATTEMPTS:
+        fields.update(status="pending")
+    else:
+        # The amount already sits in the tutor's connected account, the coins are not credited back. Failed payouts
+        # and their still pending transactions are settled by hand from the admin payout list.
+        fields.update(status="failed")
+        log_request(f"Payout {payout.id} failed after {attempts} attempt(s), needs manual review: {error}")
+    with transaction.atomic():
+        # Only the run holding the claim records the outcome
+        if not PayoutRequest.objects.filter(id=payout.id, status="processing").update(**fields):
+            return False
+        if fields["status"] == "processed":
+            if payout.transaction_id:
+                Transaction.objects.filter(id=payout.transaction_id).update(status="completed")
+            deltas = new_deltas()
+            deltas[payout.user_id].update(withdrawal_amount=payout.amount, withdrawal_count=1)
+            apply_stats_deltas(deltas)
+    if fields["status"] == "processed":
+        send_payout_processed_email(payout.user, float(payout.amount), "fr")
+    return fields["status"] == "processed"
+
+
+def process_payouts(batch_size=None, workers=None):
+    """
+    Claim pending payouts in batches and send them to Stripe with a bounded pool until the queue is drained.
+    Each payout is tried at most once per call. Returns the number of payouts processed.
+    """
+    batch_size = batch_size or settings.PAYOUT_BATCH_SIZE
+    workers = workers or settings.PAYOUT_WORKERS
+    attempted = list()
+    processed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            payouts = claim_payouts(batch_size, attempted)
+            if not payouts:
+                break
+            attempted += [payout.id for payout in payouts]
+            for result in executor.map(send_payout, payouts):
+                processed += int(record_payout_result(*result))
+    return processed
@@ -1,41 +1,32 @@
+import hmac
+
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
-from home.models import Profile
-from student.models import Student
-from tutor.models import TutorDetail
+from edudream.modules.authentication import get_role
 
 
 class IsParent(BasePermission):
+    # Roles come from the token's claims or the relations RoleJWTAuthentication loads with the user
     def has_permission(self, request, view):
-        try:
-            parent = Profile.objects.get(user=request.user)
-        except Profile.DoesNotExist:
-            return False
-        if parent.account_type == "parent":
-            return True
-        else:
-            return False
+        return get_role(request.user)["account_type"] == "parent"
 
 
 class IsTutor(BasePermission):
     def has_permission(self, request, view):
-        try:
-            TutorDetail.objects.get(user=request.user)
-            return True
-        except TutorDetail.DoesNotExist:
-            return False
+        return get_role(request.user)["tutor_id"] is not None
 
 
 class IsStudent(BasePermission):
     def has_permission(self, request, view):
-        try:
-            student = Student.objects.get(user=request.user)
-        except Student.DoesNotExist:
-            return False
-        if student.parent.email_verified:
-            return True
-        else:
-            return False
-
+        role = get_role(request.user)
+        return role["student_id"] is not None and role["email_verified"]
 
 
+class HasCronSecret(BasePermission):
+    # The caller sends CRON_SECRET in the X-Cron-Secret header, nobody gets in while it is not configured
+    def has_permission(self, request, view):
+        secret = getattr(settings, "CRON_SECRET", None)
+        if not secret:
+            return False
+        return hmac.compare_digest(str(request.headers.get("X-Cron-Secret", "")), str(secret))
@@ -0,0 +1,71 @@
+from urllib.parse import parse_qs
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from edudream.modules.authentication import RoleJWTAuthentication
+from edudream.modules.utils import log_request
+
+
+def get_user_group(user_id):
+    return f"user-{user_id}"
+
+
+def get_audience_group(audience):
+    # Broadcast notifications go to everyone connected in the audience
+    return f"audience-{audience}"
+
+
+def send_to_groups(groups, event, data):
+    # Runs after commit, a channel layer outage must not fail the request that created the rows
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for group in set(groups):
+        try:
+            async_to_sync(channel_layer.group_send)(group, {"type": "push.event", "event": event, "data": data})
+        except Exception as err:
+            log_request(f"Error pushing {event} to {group}: {err}")
+
+
+def push_to_groups(groups, event, data):
+    # Connected recipients get the event once the current transaction commits
+    transaction.on_commit(lambda groups=list(groups): send_to_groups(groups, event, data))
+
+
+def push_to_users(user_ids, event, data):
+    push_to_groups([get_user_group(user_id) for user_id in user_ids], event, data)
+
+
+def get_message_payload(message):
+    return {
+        "id": message.id, "sender": message.sender_id, "receiver": message.receiver_id, "message": message.message,
+        "attachment": message.attachment.url if message.attachment else None,
+        "created_on": message.created_on.isoformat()
+    }
+
+
+def get_notification_payload(notification):
+    return {"id": notification.id, "message": notification.message, "created_on": notification.created_on.isoformat()}
+
+
+@database_sync_to_async
+def get_token_user(token):
+    authentication = RoleJWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(token))
+    except (InvalidToken, AuthenticationFailed):
+        return AnonymousUser()
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    # Browsers cannot set headers on websocket requests, the access token comes in the "token" query parameter
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get("query_string", b"").decode("utf-8")).get("token")
+        scope["user"] = await get_token_user(token[0]) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -0,0 +1,145 @@
+import hashlib
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from edudream.modules import cron
+from edudream.modules.utils import log_request
+from home.models import JobLock, JobRun
+
+# dry_run_safe: the job only writes to the database or queues emails on commit, so it can run in a
+# rolled-back transaction. Jobs that call Stripe, Zoom or DeepL directly cannot.
+Job = namedtuple("Job", ["name", "func", "interval", "dry_run_safe"])
+
+JOBS = {job.name: job for job in (
+    Job("zoom-refresh", cron.zoom_token_refresh_job, 50 * 60, False),
+    Job("payout", cron.payout_cron_job, 60 * 60, False),
+    Job("reminder", cron.class_reminder_job, 60, True),
+    Job("pending-balance", cron.class_fee_to_tutor_pending_balance_job, 60 * 60, True),
+    Job("main-balance", cron.process_pending_balance_to_main_job, 4 * 60 * 60, True),
+    Job("ended-classroom", cron.update_ended_classroom_jobs, 60 * 60, False),
+    Job("escrow-balance", cron.escrow_balance_job, 15 * 60, True),
+    Job("translation-cache", cron.translation_cache_cleanup_job, 24 * 60 * 60, True),
+    Job("job-run-cleanup", cron.job_run_cleanup_job, 24 * 60 * 60, True),
+    Job("tutor-search-index", cron.tutor_search_index_job, 24 * 60 * 60, True),
+)}
+
+
+@contextmanager
+def job_lock(name):
+    """
+    Non-blocking lock per job, yields whether it was acquired. Uses advisory locks on PostgreSQL and MySQL
+    and a lease row elsewhere, the lease expires after JOB_LOCK_LEASE_SECONDS if the holder dies.
+    """
+    if connection.vendor == "postgresql":
+        key = int(hashlib.sha256(f"job:{name}".encode("utf-8")).hexdigest()[:15], 16)
+        acquire, release, params = "SELECT pg_try_advisory_lock(%s)", "SELECT pg_advisory_unlock(%s)", [key]
+    elif connection.vendor == "mysql":
+        acquire, release, params = "SELECT GET_LOCK(%s, 0)", "SELECT RELEASE_LOCK(%s)", [f"job:{name}"]
+    else:
+        acquire = None
+
+    if acquire:
+        with connection.cursor() as cursor:
+            cursor.execute(acquire, params)
+            acquired = bool(cursor.fetchone()[0])
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute(release, params)
+        return
+
+    now = timezone.now()
+    JobLock.objects.get_or_create(name=name, defaults={"locked_until": now})
+    locked_until = now + timezone.timedelta(seconds=settings.JOB_LOCK_LEASE_SECONDS)
+    acquired = bool(JobLock.objects.filter(name=name, locked_until__lte=now).update(locked_until=locked_until))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            JobLock.objects.filter(name=name, locked_until=locked_until).update(locked_until=timezone.now())
+
+
+def run_job(name, dry_run=False):
+    """
+    Run a registered job under its lock and record it in JobRun. A run that finds the lock taken is recorded
+    as skipped. With dry_run the job's database writes are rolled back.
+    """
+    job = JOBS[name]
+    if dry_run and not job.dry_run_safe:
+        raise ValueError(f"{name} calls external services and cannot be dry-run")
+
+    with job_lock(name) as acquired:
+        if not acquired:
+            now = timezone.now()
+            return JobRun.objects.create(
+                job=name, status="skipped", dry_run=dry_run, duration_ms=0, started_on=now, finished_on=now
+            )
+        if not dry_run:
+            # This run serves the requests queued so far, one queued during the run gets a run of its own
+            JobRun.objects.filter(job=name, status="queued").delete()
+        run = JobRun.objects.create(job=name, dry_run=dry_run)
+        start = time.monotonic()
+        try:
+            if dry_run:
+                with transaction.atomic():
+                    result = job.func()
+                    transaction.set_rollback(True)
+            else:
+                result = job.func()
+            run.status = "success"
+            # Jobs return the number of rows they processed
+            if isinstance(result, int) and not isinstance(result, bool):
+                run.rows_processed = result
+        except Exception as err:
+            run.status = "failed"
+            run.error = str(err)
+            log_request(f"Job {name} failed: {err}")
+        run.duration_ms = int((time.monotonic() - start) * 1000)
+        run.finished_on = timezone.now()
+        run.save()
+    return run
+
+
+def queue_job(name):
+    """
+    Ask the "run_jobs --loop" process to run a job on its next check. Used by the cron views, so jobs never run
+    in a web worker. A job that is already queued is not queued again.
+    """
+    if not JobRun.objects.filter(job=name, status="queued").exists():
+        JobRun.objects.create(job=name, status="queued")
+
+
+def get_due_jobs(now=None):
+    # Jobs whose interval has passed since their last run, and jobs queued by the cron views
+    now = now or timezone.now()
+    queued = set(JobRun.objects.filter(status="queued").values_list("job", flat=True))
+    runs = JobRun.objects.exclude(status__in=["skipped", "queued"]).filter(dry_run=False)
+    last_runs = dict(runs.values_list("job").annotate(last_run=Max("started_on")))
+    return [
+        name for name, job in JOBS.items()
+        if name in queued or name not in last_runs
+        or last_runs[name] + timezone.timedelta(seconds=job.interval) <= now
+    ]
+
+
+def get_job_stats():
+    stats = dict()
+    for name in JOBS:
+        runs = JobRun.objects.filter(job=name).exclude(status__in=["skipped", "queued"])
+        run = runs.order_by("-started_on").first()
+        stats[name] = {
+            "status": run.status if run else None, "started_on": run.started_on if run else None,
+            "duration_ms": run.duration_ms if run else None, "rows_processed": run.rows_processed if run else None,
+            "failures_24h": JobRun.objects.filter(
+                job=name, status="failed", started_on__gte=timezone.now() - timezone.timedelta(hours=24)
+            ).count()
+        }
+    return stats
@@ -0,0 +1,239 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from edudream.modules.authentication import get_tutor_detail
+from home.models import Profile, TutorSearchDocument, UserLanguage, ClassReview
+from tutor.models import TutorSubject, TutorCalendar
+
+DOCUMENT_FIELDS = (
+    "active", "name", "search_text", "subject_ids", "grades", "language_ids", "country", "university_name",
+    "diploma_type", "review_count", "available_slots"
+)
+# Columns facets are counted on, the listing serializer loads the page's profiles
+FACET_COLUMNS = ("subject_ids", "grades", "language_ids", "country_id", "diploma_type")
+INDEX_COLUMNS = ("profile_id", "search_text") + FACET_COLUMNS
+
+
+def normalize_text(text):
+    # Lowercase and drop accents, so "Mathématiques" is found by "mathematiques"
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def refresh_tutor_documents(user_ids):
+    """
+    Rebuild the search documents of user_ids from the source tables, users that are no longer tutors lose theirs.
+    Returns the number of documents written.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return 0
+    profiles = list(
+        Profile.objects.filter(user_id__in=user_ids, account_type="tutor").select_related("user", "user__tutordetail")
+    )
+    TutorSearchDocument.objects.filter(user_id__in=user_ids).exclude(profile__in=profiles).delete()
+
+    subjects, languages = defaultdict(list), defaultdict(list)
+    for user_id, subject_id, name, grade in TutorSubject.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", "subject_id", "subject__name", "subject__grade"):
+        subjects[user_id].append((subject_id, name, grade))
+    for user_id, language_id, name in UserLanguage.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", "language_id", "language__name"):
+        languages[user_id].append((language_id, name))
+    reviews = dict(
+        ClassReview.objects.filter(classroom__tutor_id__in=user_ids).values_list("classroom__tutor_id")
+        .annotate(Count("id"))
+    )
+    slots = dict(
+        TutorCalendar.objects.filter(user_id__in=user_ids, status="available").values_list("user_id")
+        .annotate(Count("id"))
+    )
+
+    documents = list()
+    for profile in profiles:
+        user = profile.user
+        detail = get_tutor_detail(user)
+        university_name = (detail.university_name or "") if detail else ""
+        diploma_type = (detail.diploma_type or "") if detail else ""
+        tutor_subjects, tutor_languages = subjects[user.id], languages[user.id]
+        words = [user.first_name, user.last_name, university_name, diploma_type]
+        words += [name for _, name, _ in tutor_subjects] + [name for _, name in tutor_languages]
+        documents.append(TutorSearchDocument(
+            user=user, profile=profile, active=profile.active, name=user.get_full_name(),
+            search_text=normalize_text(" ".join(words)),
+            subject_ids=sorted({subject_id for subject_id, _, _ in tutor_subjects}),
+            grades=sorted({grade for _, _, grade in tutor_subjects}),
+            language_ids=sorted({language_id for language_id, _ in tutor_languages}), country_id=profile.country_id,
+            university_name=university_name, diploma_type=diploma_type, review_count=reviews.get(user.id, 0),
+            available_slots=slots.get(user.id, 0)
+        ))
+    TutorSearchDocument.objects.bulk_create(
+        documents, update_conflicts=True, unique_fields=["user"], update_fields=list(DOCUMENT_FIELDS) + ["profile"]
+    )
+    return len(documents)
+
+
+def rebuild_tutor_documents(batch_size=500):
+    # All tutors in batches, also removes documents of users that are no longer tutors
+    user_ids = set(Profile.objects.filter(account_type="tutor").values_list("user_id", flat=True))
+    user_ids |= set(TutorSearchDocument.objects.values_list("user_id", flat=True))
+    user_ids = sorted(user_ids)
+    written = 0
+    for index in range(0, len(user_ids), batch_size):
+        written += refresh_tutor_documents(user_ids[index:index + batch_size])
+    return written
+
+
+def get_facets(rows):
+    # Counts per filter value over all matching tutors, not just the current page
+    facets = {"subject": Counter(), "grade": Counter(), "language": Counter(), "country": Counter(),
+              "diploma_type": Counter()}
+    for row in rows:
+        facets["subject"].update(row["subject_ids"])
+        facets["grade"].update(row["grades"])
+        facets["language"].update(row["language_ids"])
+        if row["country_id"]:
+            facets["country"][row["country_id"]] += 1
+        if row["diploma_type"]:
+            facets["diploma_type"][row["diploma_type"]] += 1
+    return {name: dict(counter) for name, counter in facets.items()}
+
+
+def matches_filters(row, filters):
+    # Filters on the JSON lists are applied in Python where the database has no JSON containment lookup
+    subject, grade = filters.get("subject"), filters.get("grade")
+    if subject and int(subject) not in row["subject_ids"]:
+        return False
+    if grade and grade.lower() not in [item.lower() for item in row["grades"]]:
+        return False
+    return True
+
+
+class PythonSearchBackend:
+    """
+    Ranks with an in-memory inverted index over the matching documents. Query words match document words by
+    prefix. Meant for tests and small databases, a listing without search words or list filters is still ordered
+    and paged in SQL and facets are left out above TUTOR_SEARCH_FACET_ROWS matches.
+    """
+
+    def get_queryset(self, filters):
+        queryset = TutorSearchDocument.objects.filter(active=True)
+        if filters.get("country"):
+            queryset = queryset.filter(country_id=filters["country"])
+        if filters.get("diploma_type"):
+            queryset = queryset.filter(diploma_type__iexact=filters["diploma_type"])
+        if filters.get("university_name"):
+            queryset = queryset.filter(university_name__icontains=filters["university_name"])
+        return queryset
+
+    def search(self, text, filters):
+        """
+        Returns the profile ids of the matches, best first, as a list or an ordered queryset for the paginator,
+        and the facet counts of all matches.
+        """
+        queryset = self.get_queryset(filters)
+        terms = normalize_text(text).split()
+        if not terms and not (filters.get("subject") or filters.get("grade")):
+            facets = dict()
+            if queryset.count() <= settings.TUTOR_SEARCH_FACET_ROWS:
+                facets = get_facets(queryset.values(*FACET_COLUMNS))
+            return queryset.order_by("-profile_id").values_list("profile_id", flat=True), facets
+
+        rows = [row for row in queryset.values(*INDEX_COLUMNS) if matches_filters(row, filters)]
+        if terms:
+            index = defaultdict(set)
+            for position, row in enumerate(rows):
+                for word in row["search_text"].split():
+                    index[word].add(position)
+            scores, candidates = Counter(), set(range(len(rows)))
+            for term in terms:
+                # Every word of the query has to match, whole words rank above prefixes
+                term_scores = dict()
+                for word, positions in index.items():
+                    if word.startswith(term):
+                        for position in positions:
+                            term_scores[position] = max(term_scores.get(position, 0), 2 if word == term else 1)
+                candidates &= set(term_scores)
+                scores.update(term_scores)
+            ranked = sorted(candidates, key=lambda position: (-scores[position], -rows[position]["profile_id"]))
+            rows = [rows[position] for position in ranked]
+        else:
+            rows.sort(key=lambda row: -row["profile_id"])
+        return [row["profile_id"] for row in rows], get_facets(rows)
+
+
+class PostgresSearchBackend(PythonSearchBackend):
+    """
+    Ranks with full-text search on search_text in the database. Query words match by prefix, like the Python
+    backend, through a prefix tsquery that the GIN index created by the TutorSearchDocument migration serves.
+    Filters on the JSON lists use containment. Ordering and paging happen in SQL and facets are grouped
+    aggregates, no request reads every matching document.
+    """
+
+    def get_queryset(self, filters):
+        queryset = super().get_queryset(filters)
+        if filters.get("subject"):
+            queryset = queryset.filter(subject_ids__contains=[int(filters["subject"])])
+        if filters.get("grade"):
+            queryset = queryset.filter(grades__contains=[filters["grade"]])
+        return queryset
+
+    def count_list_values(self, documents, column, cast=str):
+        # {value: documents} for the values of a JSON list column, unnested and grouped in the database
+        sql, params = documents.values(column).query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT element.value, COUNT(*) FROM ({sql}) document "
+                f"CROSS JOIN LATERAL jsonb_array_elements_text(document.{connection.ops.quote_name(column)}) "
+                f"AS element(value) GROUP BY element.value", params
+            )
+            return {cast(value): count for value, count in cursor.fetchall()}
+
+    def count_values(self, documents, column):
+        return dict(documents.values_list(column).annotate(count=Count("id")).order_by())
+
+    def get_facets(self, queryset):
+        documents = TutorSearchDocument.objects.filter(id__in=queryset.order_by().values("id"))
+        return {
+            "subject": self.count_list_values(documents, "subject_ids", int),
+            "grade": self.count_list_values(documents, "grades"),
+            "language": self.count_list_values(documents, "language_ids", int),
+            "country": self.count_values(documents.filter(country_id__isnull=False), "country_id"),
+            "diploma_type": self.count_values(documents.exclude(diploma_type=""), "diploma_type"),
+        }
+
+    def search(self, text, filters):
+        # Imported here, the PostgreSQL driver is only installed where this backend is used
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        queryset = self.get_queryset(filters)
+        terms = normalize_text(text).split()
+        if terms:
+            # normalize_text leaves only word characters, so the terms cannot inject tsquery operators
+            query = SearchQuery(" & ".join(f"{term}:*" for term in terms), config="simple", search_type="raw")
+            vector = SearchVector("search_text", config="simple")
+            queryset = queryset.annotate(vector=vector, rank=SearchRank(vector, query)).filter(vector=query).order_by(
+                "-rank", "-profile_id"
+            )
+        else:
+            queryset = queryset.order_by("-profile_id")
+        return queryset.values_list("profile_id", flat=True), self.get_facets(queryset)
+
+
+def get_search_backend():
+    if settings.TUTOR_SEARCH_BACKEND:
+        return import_string(settings.TUTOR_SEARCH_BACKEND)()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return PythonSearchBackend()
+
+
+def search_tutors(text, filters):
+    # Profile ids of matching tutors, best match first, for the paginator, and the facet counts of all matches
+    return get_search_backend().search(text, filters)
@@ -0,0 +1,199 @@
+import decimal
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Sum, Q, F
+from django.utils import timezone
+
+from edudream.modules.notifications import count_unread_notifications
+from home.models import UserStats
+from student.models import Student
+from tutor.models import Classroom, PayoutRequest
+
+COUNTER_FIELDS = (
+    "active_classes", "completed_classes", "cancelled_classes", "total_tutor", "total_subject", "total_student",
+    "withdrawal_count", "unread_notifications"
+)
+AMOUNT_FIELDS = ("active_class_amount", "uncleared_amount", "withdrawal_amount")
+STAT_FIELDS = COUNTER_FIELDS + AMOUNT_FIELDS
+
+# Classroom status to the counter it is shown under
+CLASS_STATUS_COUNTERS = {
+    "accepted": "active_classes", "completed": "completed_classes", "cancelled": "cancelled_classes"
+}
+
+
+def get_classroom_state(classroom):
+    # Read from __dict__ so deferred fields are never loaded just to snapshot them
+    values = classroom.__dict__
+    return (
+        values.get("status"), values.get("amount"), values.get("pending_balance_paid"), values.get("tutor_id"),
+        values.get("student_id"), values.get("subjects_id")
+    )
+
+
+def get_classroom_counters(status, amount, pending_balance_paid, is_tutor):
+    counters = dict()
+    amount = decimal.Decimal(str(amount or 0))
+    if status in CLASS_STATUS_COUNTERS:
+        counters[CLASS_STATUS_COUNTERS[status]] = 1
+    if is_tutor and status == "accepted":
+        counters["active_class_amount"] = amount
+    if is_tutor and status == "completed" and not pending_balance_paid:
+        counters["uncleared_amount"] = amount
+    return counters
+
+
+def get_participants(student_ids):
+    # Student id to the student's and the parent's user ids
+    return {
+        student_id: (user_id, parent_user_id) for student_id, user_id, parent_user_id in
+        Student.objects.filter(id__in=student_ids).values_list("id", "user_id", "parent__user_id")
+    }
+
+
+def add_classroom_change(deltas, tutor_id, participants, old_state, new_state):
+    """
+    Add the counter changes of one classroom moving from old_state to new_state, both (status, amount,
+    pending_balance_paid), for its tutor and the student's and parent's users.
+    """
+    for user_id, is_tutor in [(tutor_id, True)] + [(user_id, False) for user_id in participants]:
+        if user_id is None:
+            continue
+        for field, value in get_classroom_counters(*old_state, is_tutor).items():
+            deltas[user_id][field] -= value
+        for field, value in get_classroom_counters(*new_state, is_tutor).items():
+            deltas[user_id][field] += value
+
+
+def get_member_queries(tutor_id, student_id, participants):
+    # (user_id, classrooms query, counts tutors) for the tutor and the student's and parent's users of a classroom
+    student_user_id, parent_user_id = participants or (None, None)
+    return [
+        (user_id, query, counts_tutor) for user_id, query, counts_tutor in (
+            (tutor_id, Q(tutor_id=tutor_id), False), (student_user_id, Q(student__user_id=student_user_id), True),
+            (parent_user_id, Q(student__parent__user_id=parent_user_id), True)
+        ) if user_id is not None
+    ]
+
+
+def add_classroom_members(deltas, classroom_id, tutor_id, student_id, participants, subject_id):
+    """
+    Count a new classroom's subject, and its tutor for the student and parent, for the users who had no other
+    classroom with them. Keeps the distinct total_subject and total_tutor counters without a recount.
+    """
+    others = Classroom.objects.exclude(id=classroom_id)
+    for user_id, query, counts_tutor in get_member_queries(tutor_id, student_id, participants):
+        if subject_id and not others.filter(query, subjects_id=subject_id).exists():
+            deltas[user_id]["total_subject"] += 1
+        if counts_tutor and tutor_id and not others.filter(query, tutor_id=tutor_id).exists():
+            deltas[user_id]["total_tutor"] += 1
+
+
+def refresh_member_stats(user_ids):
+    # Recount only total_tutor and total_subject, after a classroom moved to another tutor, student or subject
+    user_ids = set(user_ids)
+    result = {user_id: {"total_tutor": 0, "total_subject": 0} for user_id in user_ids}
+    tutor_counts = dict(total_subject=Count("subjects", distinct=True))
+    member_counts = dict(total_subject=Count("subjects", distinct=True), total_tutor=Count("tutor", distinct=True))
+    for field, counts in (("tutor_id", tutor_counts), ("student__user_id", member_counts),
+                          ("student__parent__user_id", member_counts)):
+        for row in Classroom.objects.filter(**{f"{field}__in": user_ids}).values(field).annotate(**counts):
+            user_id = row.pop(field)
+            for key, value in row.items():
+                result[user_id][key] += value or 0
+    now = timezone.now()
+    for user_id, values in result.items():
+        UserStats.objects.filter(user_id=user_id).update(updated_on=now, **values)
+
+
+def new_deltas():
+    return defaultdict(lambda: defaultdict(int))
+
+
+def apply_stats_deltas(deltas):
+    """
+    Apply {user_id: {field: delta}} with one UPDATE per user. Users without a stats row are skipped, their row is
+    computed from the source tables when it is first read.
+    """
+    now = timezone.now()
+    for user_id, fields in deltas.items():
+        updates = {field: F(field) + value for field, value in fields.items() if value}
+        if updates:
+            UserStats.objects.filter(user_id=user_id).update(updated_on=now, **updates)
+
+
+def compute_user_stats(user_ids):
+    user_ids = set(user_ids)
+    result = {user_id: {field: 0 for field in STAT_FIELDS} for user_id in user_ids}
+    counts = dict(
+        active_classes=Count("id", filter=Q(status="accepted")),
+        completed_classes=Count("id", filter=Q(status="completed")),
+        cancelled_classes=Count("id", filter=Q(status="cancelled")),
+        total_subject=Count("subjects", distinct=True),
+    )
+    tutor_counts = dict(
+        active_class_amount=Sum("amount", filter=Q(status="accepted")),
+        uncleared_amount=Sum("amount", filter=Q(status="completed", pending_balance_paid=False)),
+    )
+    member_counts = dict(total_tutor=Count("tutor", distinct=True))
+    for field, extra in (("tutor_id", tutor_counts), ("student__user_id", member_counts),
+                         ("student__parent__user_id", member_counts)):
+        rows = Classroom.objects.filter(**{f"{field}__in": user_ids}).values(field).annotate(**counts, **extra)
+        for row in rows:
+            user_id = row.pop(field)
+            for key, value in row.items():
+                result[user_id][key] += value or 0
+    for user_id, total_student in Student.objects.filter(parent__user_id__in=user_ids).values_list(
+            "parent__user_id").annotate(Count("id")):
+        result[user_id]["total_student"] = total_student
+    payouts = PayoutRequest.objects.filter(user_id__in=user_ids, status="processed").values("user_id").annotate(
+        withdrawal_amount=Sum("amount"), withdrawal_count=Count("id")
+    )
+    for row in payouts:
+        result[row.pop("user_id")].update(row)
+    for user_id, unread in count_unread_notifications(user_ids).items():
+        result[user_id]["unread_notifications"] = unread
+    return result
+
+
+def refresh_user_stats(user_ids):
+    """
+    Recompute the stats rows of user_ids from the source tables. Used for bulk paths and for changes that
+    affect distinct counts. Returns {user_id: UserStats}.
+    """
+    user_ids = set(user_ids)
+    if not user_ids:
+        return dict()
+    with transaction.atomic():
+        UserStats.objects.bulk_create([UserStats(user_id=user_id) for user_id in user_ids], ignore_conflicts=True)
+        # Lock the rows so a concurrent delta waits instead of being overwritten
+        rows = {row.user_id: row for row in UserStats.objects.select_for_update().filter(user_id__in=user_ids)}
+        now = timezone.now()
+        for user_id, values in compute_user_stats(user_ids).items():
+            for field, value in values.items():
+                setattr(rows[user_id], field, value)
+            rows[user_id].updated_on = now
+        UserStats.objects.bulk_update(rows.values(), list(STAT_FIELDS) + ["updated_on"])
+    return rows
+
+
+def verify_user_stats(user_ids):
+    # (user_id, field, stored, actual) for every counter that drifted from the source tables
+    stored = {row.user_id: row for row in UserStats.objects.filter(user_id__in=user_ids)}
+    drift = list()
+    for user_id, values in compute_user_stats(user_ids).items():
+        row = stored.get(user_id)
+        if row is None:
+            continue
+        for field, value in values.items():
+            if decimal.Decimal(getattr(row, field)) != decimal.Decimal(value):
+                drift.append((user_id, field, getattr(row, field), value))
+    return drift
+
+
+def get_user_stats(user_id):
+    row = UserStats.objects.filter(user_id=user_id).first()
+    if row is None:
+        row = refresh_user_stats([user_id])[user_id]
+    return row
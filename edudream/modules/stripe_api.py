@@ -240,10 +240,11 @@ class StripeAPI:
         return result
 
     @classmethod
-    def payout_to_external_account(cls, amount, acct, stripe_acct):
+    def payout_to_external_account(cls, amount, acct, stripe_acct, idempotency_key=None):
         from edudream.modules.utils import log_request
         result = stripe.Payout.create(
-            amount=int(amount * 100), currency="eur", destination=acct, stripe_account=stripe_acct
+            amount=int(amount * 100), currency="eur", destination=acct, stripe_account=stripe_acct,
+            idempotency_key=idempotency_key
         )
         log_request(f'Payout to external account response: {result}')
         return result
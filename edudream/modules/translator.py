@@ -1,7 +1,13 @@
+import hashlib
 import json
+import threading
+from collections import Counter
 
 import requests
 from django.conf import settings
+from django.utils import timezone
+
+from edudream.modules.http_client import http_request
 
 
 base_url = settings.TRANSLATOR_URL
@@ -10,6 +16,12 @@ deep_api_key = settings.DEEP_API_KEY
 api_key = settings.RAPID_API_KEY
 api_host = settings.RAPID_API_HOST
 
+# DeepL accepts at most 50 texts per request
+DEEPL_BATCH_SIZE = 50
+
+# Distinct missing (msgid, language) pairs kept in memory for reporting
+MAX_TRACKED_MISSES = 1000
+
 
 class Translate:
     @classmethod
@@ -20,7 +32,7 @@ class Translate:
             "X-RapidAPI-Key": api_key,
             "X-RapidAPI-Host": api_host
         }
-        response = requests.request("GET", url, headers=header)
+        response = http_request("rapid_translate", "GET", url, headers=header)
         log_request(f"Translation Response: {response.text}")
         text_to_return = content
         if response.status_code == 200:
@@ -30,16 +42,175 @@ class Translate:
 
     @classmethod
     def perform_translate_deepl(cls, to_lang, content):
+        translations = cls.request_deepl_translation(to_lang, [str(content)])
+        return translations[0] if translations is not None else content
+
+    @classmethod
+    def request_deepl_translation(cls, to_lang, texts, tag_handling=None):
         from edudream.modules.utils import log_request
         url = f"{deep_base_url}"
         header = {"Content-Type": "application/json", "Authorization": f"DeepL-Auth-Key {deep_api_key}"}
-        payload = json.dumps({"text": [str(content)], "target_lang": str(to_lang).upper()})
-        response = requests.request("POST", url, headers=header, data=payload)
+        data = {"text": texts, "target_lang": str(to_lang).upper()}
+        if tag_handling:
+            data["tag_handling"] = tag_handling
+        payload = json.dumps(data)
+        try:
+            response = http_request("deepl", "POST", url, headers=header, data=payload)
+        except requests.RequestException as err:
+            log_request(f"Translation Error: {err}")
+            return None
         log_request(f"Translation Response: {response.text}")
-        text_to_return = content
-        if response.status_code == 200:
-            result = response.json()
-            text_to_return = result["translations"][0]["text"]
-        return text_to_return
+        if response.status_code != 200:
+            return None
+        translations = [item["text"] for item in response.json()["translations"]]
+        if len(translations) != len(texts):
+            return None
+        return translations
+
+    @classmethod
+    def translate_deepl_cached(cls, to_lang, contents, tag_handling=None):
+        """
+        Translate a list of texts, serving repeats from the TranslationCache table and sending
+        only the misses to DeepL in as few requests as possible.
+        """
+        from home.models import TranslationCache
+        to_lang = str(to_lang).lower()
+        contents = [str(content) for content in contents]
+        # Markup-aware translations are cached separately from plain text ones
+        hashes = [get_content_hash(f"{tag_handling}:{content}" if tag_handling else content) for content in contents]
+
+        now = timezone.now()
+        ttl_start = now - timezone.timedelta(days=settings.TRANSLATION_CACHE_TTL_DAYS)
+        cached = TranslationCache.objects.filter(
+            content_hash__in=set(hashes), target_language=to_lang, created_on__gte=ttl_start
+        ).values_list("id", "content_hash", "translation", "last_used_on")
+        found = dict()
+        stale_ids = list()
+        for cache_id, content_hash, translation, last_used_on in cached:
+            found[content_hash] = translation
+            # Avoid a write per lookup, recency only needs day precision for eviction
+            if last_used_on < now - timezone.timedelta(days=1):
+                stale_ids.append(cache_id)
+        if stale_ids:
+            TranslationCache.objects.filter(id__in=stale_ids).update(last_used_on=now)
+
+        missing = dict()
+        for content_hash, content in zip(hashes, contents):
+            if content_hash not in found:
+                missing[content_hash] = content
+        if missing:
+            to_translate = list(missing.items())
+            new_entries = list()
+            for index in range(0, len(to_translate), DEEPL_BATCH_SIZE):
+                chunk = to_translate[index:index + DEEPL_BATCH_SIZE]
+                translations = cls.request_deepl_translation(to_lang, [content for _, content in chunk], tag_handling)
+                if translations is None:
+                    # Do not cache failures, the original text is used for this call only
+                    continue
+                for (content_hash, content), translation in zip(chunk, translations):
+                    found[content_hash] = translation
+                    new_entries.append(TranslationCache(
+                        content_hash=content_hash, target_language=to_lang, content=content, translation=translation
+                    ))
+            if new_entries:
+                # Expired rows with the same key are replaced
+                TranslationCache.objects.filter(
+                    content_hash__in=[entry.content_hash for entry in new_entries], target_language=to_lang,
+                    created_on__lt=ttl_start
+                ).delete()
+                TranslationCache.objects.bulk_create(new_entries, ignore_conflicts=True)
+
+        return [found.get(content_hash, content) for content_hash, content in zip(hashes, contents)]
+
+
+def get_content_hash(content):
+    return hashlib.sha256(str(content).encode("utf-8")).hexdigest()
+
+
+def prune_translation_cache():
+    # Drop expired entries, then the least recently used ones above the size limit
+    from home.models import TranslationCache
+    ttl_start = timezone.now() - timezone.timedelta(days=settings.TRANSLATION_CACHE_TTL_DAYS)
+    deleted, _ = TranslationCache.objects.filter(created_on__lt=ttl_start).delete()
+    cut_off = TranslationCache.objects.order_by("-last_used_on", "-id").values_list(
+        "last_used_on", "id")[settings.TRANSLATION_CACHE_MAX_ENTRIES:settings.TRANSLATION_CACHE_MAX_ENTRIES + 1]
+    if cut_off:
+        last_used_on, cache_id = cut_off[0]
+        evicted, _ = TranslationCache.objects.filter(last_used_on__lt=last_used_on).delete()
+        deleted += evicted
+        evicted, _ = TranslationCache.objects.filter(last_used_on=last_used_on, id__lte=cache_id).delete()
+        deleted += evicted
+    return deleted
+
+
+class TranslationCatalog:
+    """
+    Compiled lookup table for the static strings in location.translation,
+    keyed by (msgid, language).
+    """
+
+    def __init__(self, entries, source_language="en"):
+        self.source_language = source_language
+        self.messages = dict()
+        self.languages = set()
+        self.misses = Counter()
+        for entry in entries:
+            msgid = entry.get("msgid")
+            if msgid is None:
+                continue
+            for language, text in entry.items():
+                if language == "msgid":
+                    continue
+                # Later entries win, as they did with the old linear scan
+                self.messages[(msgid, language)] = text
+                self.languages.add(language)
+
+    def fallback_chain(self, language):
+        # e.g. "fr-CA" -> ["fr-ca", "fr"]
+        language = str(language or self.source_language).lower().replace("_", "-")
+        chain = [language]
+        base_language = language.split("-")[0]
+        if base_language != language:
+            chain.append(base_language)
+        return chain
+
+    def get(self, msgid, language):
+        chain = self.fallback_chain(language)
+        if self.source_language in chain:
+            return msgid
+        for lang in chain:
+            text = self.messages.get((msgid, lang))
+            if text is not None:
+                return text
+        if chain[-1] in self.languages:
+            # Only strings missing from a language we ship are worth reporting
+            self.report_miss(msgid, chain[-1])
+        return msgid
+
+    def report_miss(self, msgid, language):
+        key = (msgid, language)
+        if key in self.misses:
+            self.misses[key] += 1
+            return
+        if len(self.misses) >= MAX_TRACKED_MISSES:
+            return
+        self.misses[key] = 1
+        from edudream.modules.utils import log_request
+        log_request(f"Missing translation for '{language}': {msgid}")
+
+    def missing(self, limit=None):
+        return self.misses.most_common(limit)
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
 
 
+def get_translation_catalog():
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                from location.translation import translate
+                _catalog = TranslationCatalog(translate)
+    return _catalog
@@ -1,15 +1,18 @@
 import base64
 import calendar
+import copy
 import datetime
 import json
 import re
 import secrets
+import time
 from threading import Thread
 
 import pytz
 from django.contrib.sites.models import Site
+from django.db import transaction as db_transaction
+from django.db.models import F, Sum, Max, Min, Count
 from django.utils import timezone
-import requests
 from cryptography.fernet import Fernet
 from django.conf import settings
 from django.utils.crypto import get_random_string
@@ -17,14 +20,24 @@ from dateutil.relativedelta import relativedelta
 from sentry_sdk import capture_message
 from timezonefinder import TimezoneFinder
 
-from home.models import SiteSetting, Transaction, Notification
+from home.models import SiteSetting, Transaction, Notification, EscrowEntry
 from location.models import City, State, Country
-from edudream.modules.translator import Translate
+from edudream.modules.http_client import http_request
+from edudream.modules.translator import Translate, get_translation_catalog
 from edudream.modules.stripe_api import StripeAPI
+from edudream.modules import wallet
 
 email_from = settings.EMAIL_FROM
 email_url = settings.EMAIL_URL
 email_api_key = settings.EMAIL_API_KEY
+# Maximum personalizations (recipients) the provider accepts per request
+EMAIL_PERSONALIZATION_LIMIT = 1000
+
+site_settings_cache = dict()
+
+# Translated email templates, keyed by (template, language)
+email_template_translations = dict()
+email_placeholder_pattern = re.compile(r"\{(\w+)\}")
 
 
 def log_request(*args):
@@ -134,18 +147,38 @@ def get_next_month_date(date, delta):
 
 
 def send_email(content, email, subject):
-    payload = json.dumps({
-        "personalizations": [{"to": [{"email": email}]}], "from": {"email": email_from, "name": "EduDream"},
-        "subject": subject, "content": [{"type": "text/html", "value": content}]
-    })
-    response = requests.request(
-        "POST", email_url, headers={"Content-Type": "application/json", "Authorization": f"Bearer {email_api_key}"},
-        data=payload
-    )
-    log_request(f"Sending email to: {email}\nResponse: {response.text}")
+    response = deliver_email(content, email, subject)
     return response.text
 
 
+def deliver_email(content, email, subject):
+    return deliver_bulk_email(content, [email], subject)[0]
+
+
+def send_bulk_email(content, emails, subject):
+    # One API call per 1,000 recipients of the same rendered email, each recipient gets a separate personalization
+    return [response.text for response in deliver_bulk_email(content, emails, subject)]
+
+
+def deliver_bulk_email(content, emails, subject):
+    recipients = list(dict.fromkeys(emails))
+    responses = list()
+    for index in range(0, len(recipients), EMAIL_PERSONALIZATION_LIMIT):
+        chunk = recipients[index:index + EMAIL_PERSONALIZATION_LIMIT]
+        payload = json.dumps({
+            "personalizations": [{"to": [{"email": email}]} for email in chunk],
+            "from": {"email": email_from, "name": "EduDream"},
+            "subject": subject, "content": [{"type": "text/html", "value": content}]
+        })
+        response = http_request(
+            "email", "POST", email_url,
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {email_api_key}"}, data=payload
+        )
+        log_request(f"Sending email to: {', '.join(chunk)}\nResponse: {response.text}")
+        responses.append(response)
+    return responses
+
+
 def incoming_request_checks(request, require_data_field: bool = True) -> tuple:
     try:
         x_api_key = request.headers.get('X-Api-Key', None) or request.META.get("HTTP_X_API_KEY", None)
@@ -304,7 +337,7 @@ def create_state(state, new_country):
 
 def create_country_state_city():
     url = "https://raw.githubusercontent.com/slojar/countries-states-cities-database/master/countries%2Bstates%2Bcities.json"
-    response = requests.request("GET", url).json()
+    response = http_request("countries", "GET", url).json()
     for country in response:
         new_country = create_country(country)
         states = country["states"]
@@ -321,7 +354,19 @@ def create_country_state_city():
     return True
 
 
-def get_site_details():
+def get_site_details(refresh=False):
+    # Served from a process-local copy, reloaded after SITE_SETTINGS_CACHE_SECONDS or when SiteSetting is saved.
+    # Callers get their own copy, so escrow_balance and zoom_token on it may be stale: use adjust_escrow_balance
+    # and refresh=True for those.
+    cached = site_settings_cache.get("instance")
+    expired = time.monotonic() - site_settings_cache.get("loaded_on", 0) > settings.SITE_SETTINGS_CACHE_SECONDS
+    if refresh or cached is None or expired:
+        cached = load_site_details()
+        site_settings_cache.update(instance=cached, loaded_on=time.monotonic())
+    return copy.copy(cached)
+
+
+def load_site_details():
     try:
         site, created = SiteSetting.objects.get_or_create(site=Site.objects.get_current())
     except Exception as ex:
@@ -330,6 +375,45 @@ def get_site_details():
     return site
 
 
+def clear_site_details_cache(**kwargs):
+    site_settings_cache.clear()
+
+
+def adjust_escrow_balance(amount, narration=None, classroom=None, transaction=None):
+    # Append to the escrow ledger, SiteSetting.escrow_balance is brought up to date by materialize_escrow_balance
+    return EscrowEntry.objects.create(amount=amount, narration=narration, classroom=classroom, transaction=transaction)
+
+
+def bulk_adjust_escrow_balance(entries):
+    return EscrowEntry.objects.bulk_create(entries)
+
+
+def get_escrow_balance():
+    site = get_site_details(refresh=True)
+    pending = EscrowEntry.objects.filter(id__gt=site.escrow_ledger_position).aggregate(total=Sum("amount"))["total"]
+    return site.escrow_balance + (pending or 0)
+
+
+def materialize_escrow_balance():
+    # Entries younger than ESCROW_SETTLE_SECONDS are left for the next run, an id allocated by a transaction that
+    # has not committed yet must not end up below the stored position. created_on is set before the id, so the
+    # cutoff is the first id still inside the window and everything below it is settled.
+    settle_before = timezone.now() - timezone.timedelta(seconds=settings.ESCROW_SETTLE_SECONDS)
+    with db_transaction.atomic():
+        site = SiteSetting.objects.select_for_update().get(id=get_site_details().id)
+        entries = EscrowEntry.objects.filter(id__gt=site.escrow_ledger_position)
+        cutoff = entries.filter(created_on__gt=settle_before).aggregate(cutoff=Min("id"))["cutoff"]
+        if cutoff is not None:
+            entries = entries.filter(id__lt=cutoff)
+        result = entries.aggregate(total=Sum("amount"), position=Max("id"), count=Count("id"))
+        if not result["count"]:
+            return 0
+        SiteSetting.objects.filter(id=site.id).update(
+            escrow_balance=F("escrow_balance") + result["total"], escrow_ledger_position=result["position"]
+        )
+    return result["count"]
+
+
 def complete_payment(ref_number):
     try:
         trans = Transaction.objects.get(reference=ref_number, status="pending")
@@ -353,31 +437,42 @@ def complete_payment(ref_number):
         result = StripeAPI.retrieve_checkout_session(session_id=reference)
 
     if result.get('status') and str(result.get('status')).lower() in ['succeeded', 'success', 'successful']:
-        trans.status = "completed"
-        trans.save()
-
-        if trans.transaction_type == "fund_wallet":
-            # Add coin equivalent of Payment Plan to Wallet balance
-            customer_wallet = trans.user.wallet
-            customer_wallet.refresh_from_db()
-            customer_wallet.balance += trans.plan.coin
-            customer_wallet.save()
-            # Confirm if this is customer's first deposit, and credit referrer
-            first_fund_wallet = Transaction.objects.filter(transaction_type="fund_wallet", status="completed").first()
-            referrer = trans.user.profile.referred_by
-            if first_fund_wallet == trans and referrer is not None:
-                referral_point = get_site_details().referral_coin
-                referrer_wallet = referrer.wallet
-                referrer_wallet.refresh_from_db()
-                referrer_wallet.balance += referral_point
-                referrer_wallet.save()
-                # Create Referral Transaction
-                Transaction.objects.create(
-                    user=referrer, transaction_type="bonus", amount=referral_point, status="completed",
-                    narration=f"Referal bonus from {trans.user.get_full_name()}"
-                )
-                # Send notification to referrer
-                Thread(target=create_notification, args=[referrer, f"Received referral bonus"]).start()
+        with db_transaction.atomic():
+            # Only one of the webhook and the verify endpoint may complete the transaction
+            if not Transaction.objects.filter(id=trans.id, status="pending").update(status="completed"):
+                return True, "Payment updated"
+            trans.status = "completed"
+
+            if trans.transaction_type == "fund_wallet":
+                # Add coin equivalent of Payment Plan to Wallet balance, the status flip is undone without a wallet
+                if not wallet.credit(trans.user, trans.plan.coin, source="external", transaction=trans,
+                                     narration="Wallet funding"):
+                    db_transaction.set_rollback(True)
+                    log_request(f"Payment {trans.id} not completed, wallet not found")
+                    return False, "Wallet not found"
+                # Confirm if this is customer's first deposit, and credit referrer
+                first_fund_wallet = Transaction.objects.filter(
+                    transaction_type="fund_wallet", status="completed"
+                ).first()
+                referrer = trans.user.profile.referred_by
+                if first_fund_wallet == trans and referrer is not None:
+                    referral_point = get_site_details().referral_coin
+                    with db_transaction.atomic():
+                        # Create Referral Transaction
+                        bonus = Transaction.objects.create(
+                            user=referrer, transaction_type="bonus", amount=referral_point, status="completed",
+                            narration=f"Referal bonus from {trans.user.get_full_name()}"
+                        )
+                        if wallet.credit(referrer, referral_point, source="bonus", transaction=bonus,
+                                         narration="Referral bonus"):
+                            # Send notification to referrer
+                            db_transaction.on_commit(lambda: Thread(
+                                target=create_notification, args=[referrer, "Received referral bonus"]
+                            ).start())
+                        else:
+                            # Only the bonus is dropped, the payment itself completes
+                            db_transaction.set_rollback(True)
+                            log_request(f"Referral bonus for payment {trans.id} not posted, wallet not found")
 
             # Send Notification to user
 
@@ -396,21 +491,36 @@ def mask_number(number_to_mask, num_chars_to_mask, mask_char='*'):
 
 
 def translate_to_language(content, language="en"):
-    from location.translation import translate
-    response = content
-    if language == "fr":
-        # Get value for content
-        for item in translate:
-            if item["msgid"] == content:
-                response = item["fr"]
-    return response
-
-
-def translate_email(content, language="en"):
-    response = content
-    if language == "fr":
-        response = Translate.perform_translate_deepl("fr", content)
-    return response
+    return get_translation_catalog().get(content, language)
+
+
+def translate_email_template(template, language="en", **values):
+    """
+    Translate the static part of an email template and fill in the values afterwards.
+    Templates use str.format placeholders e.g. "Dear {first_name}".
+    """
+    if language != "fr":
+        return template.format(**values)
+    key = (template, language)
+    translated_template = email_template_translations.get(key)
+    if translated_template is None:
+        placeholders = set(email_placeholder_pattern.findall(template))
+        protected = "".join(
+            part if part.startswith("<") else email_placeholder_pattern.sub(r'<span translate="no">{\1}</span>', part)
+            for part in re.split(r"(<[^>]+>)", template)
+        )
+        result = Translate.translate_deepl_cached(language, [protected], tag_handling="html")[0]
+        translation = re.sub(r'<span translate="no">(\{\w+\})</span>', r"\1", result)
+        if result == protected or set(email_placeholder_pattern.findall(translation)) != placeholders:
+            # Translation failed or a placeholder got lost, send this email untranslated
+            return template.format(**values)
+        translated_template = translation
+        if len(email_template_translations) < 500:
+            email_template_translations[key] = translated_template
+    try:
+        return translated_template.format(**values)
+    except (KeyError, IndexError, ValueError):
+        return template.format(**values)
 
 
 def create_notification(user, text):
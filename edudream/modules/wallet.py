@@ -0,0 +1,81 @@
+import decimal
+from collections import defaultdict, namedtuple
+
+from django.db import transaction as db_transaction
+from django.db.models import F, Case, When, Value, DecimalField
+from django.utils import timezone
+
+from home.models import Wallet, LedgerEntry
+
+# Accounts backed by a field on the user's Wallet
+WALLET_ACCOUNTS = ("balance", "pending")
+
+Posting = namedtuple("Posting", ["user_id", "amount", "source", "destination", "transaction", "narration"])
+
+
+def post(user, amount, source, destination, transaction=None, narration=None, check_funds=False):
+    """
+    Move amount from source to destination in one UPDATE and journal it. With check_funds the update only
+    applies when the source wallet account holds at least amount. Returns False when nothing was posted.
+    """
+    amount = decimal.Decimal(amount)
+    updates = dict()
+    if source in WALLET_ACCOUNTS:
+        updates[source] = F(source) - amount
+    if destination in WALLET_ACCOUNTS:
+        updates[destination] = F(destination) + amount
+    wallets = Wallet.objects.filter(user=user)
+    if check_funds and source in WALLET_ACCOUNTS:
+        wallets = wallets.filter(**{f"{source}__gte": amount})
+    with db_transaction.atomic():
+        if updates and not wallets.update(updated_on=timezone.now().date(), **updates):
+            return False
+        LedgerEntry.objects.create(
+            user=user, transaction=transaction, source=source, destination=destination, amount=amount,
+            narration=narration
+        )
+    return True
+
+
+def credit(user, amount, source="external", account="balance", transaction=None, narration=None):
+    return post(user, amount, source, account, transaction, narration)
+
+
+def debit(user, amount, destination="escrow", account="balance", transaction=None, narration=None,
+          check_funds=True):
+    return post(user, amount, account, destination, transaction, narration, check_funds)
+
+
+def bulk_post(postings):
+    """
+    Apply many postings with one UPDATE across all affected wallets and one journal INSERT.
+    Postings are not funds-checked, use post() for that. Raises ValueError when a posting's wallet is missing,
+    nothing is posted then.
+    """
+    if not postings:
+        return 0
+    deltas = defaultdict(lambda: defaultdict(decimal.Decimal))
+    for item in postings:
+        if item.source in WALLET_ACCOUNTS:
+            deltas[item.source][item.user_id] -= decimal.Decimal(item.amount)
+        if item.destination in WALLET_ACCOUNTS:
+            deltas[item.destination][item.user_id] += decimal.Decimal(item.amount)
+    updates = dict()
+    for account, per_user in deltas.items():
+        updates[account] = F(account) + Case(
+            *[When(user_id=user_id, then=Value(delta)) for user_id, delta in per_user.items()],
+            default=Value(decimal.Decimal(0)), output_field=DecimalField(max_digits=20, decimal_places=2)
+        )
+    user_ids = {user_id for per_user in deltas.values() for user_id in per_user}
+    with db_transaction.atomic():
+        if updates:
+            updated = Wallet.objects.filter(user_id__in=user_ids).update(updated_on=timezone.now().date(), **updates)
+            if updated != len(user_ids):
+                raise ValueError(f"Wallet not found for {len(user_ids) - updated} user(s)")
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(
+                user_id=item.user_id, transaction=item.transaction, source=item.source, destination=item.destination,
+                amount=item.amount, narration=item.narration
+            ) for item in postings
+        ])
+    return len(postings)
@@ -4,6 +4,7 @@ import requests
 from django.conf import settings
 from sentry_sdk import capture_message
 
+from edudream.modules.http_client import http_request
 from edudream.modules.utils import generate_random_password
 
 # base_url = https://api.zoom.us/v2/users/me/meetings
@@ -16,7 +17,9 @@ class ZoomAPI:
     @classmethod
     def get_header(cls):
         from edudream.modules.utils import get_site_details, decrypt_text
-        return {"Authorization": f"Bearer {decrypt_text(get_site_details().zoom_token)}", "Content-Type": "application/json"}
+        # The token is rotated by the refresh cron, always read the current one
+        zoom_token = get_site_details(refresh=True).zoom_token
+        return {"Authorization": f"Bearer {decrypt_text(zoom_token)}", "Content-Type": "application/json"}
 
     @classmethod
     def log_request(cls, *args):
@@ -90,7 +93,12 @@ class ZoomAPI:
         }
         payload = json.dumps(meeting)
         cls.log_request(f"url: {url}\npayload: {payload}\n")
-        response = requests.request("POST", url, data=payload, headers=header)
+        try:
+            response = http_request("zoom", "POST", url, data=payload, headers=header)
+        except requests.RequestException as err:
+            # Timeouts and connection errors fail like a rejected request, not as a server error
+            cls.log_request(f"error: {err}")
+            return None
         cls.log_request(f"response: {response.text}")
         if response.status_code == 201:
             # response = response.json()
@@ -106,7 +114,11 @@ class ZoomAPI:
         header = cls.get_header()
         payload = {"action": "end"}
         cls.log_request(f"url: {url}\npayload: {payload}\n")
-        response = requests.request("PUT", url, data=payload, headers=header)
+        try:
+            response = http_request("zoom", "PUT", url, data=payload, headers=header)
+        except requests.RequestException as err:
+            cls.log_request(f"error: {err}")
+            return False
         cls.log_request(f"response: {response.text}")
         return True
 
@@ -135,7 +135,7 @@ MEDIA_URL = 'media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('edudream.modules.authentication.RoleJWTAuthentication',),
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -143,3 +143,43 @@ REST_FRAMEWORK = {
 SITE_ID = 1
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
+# Seconds other processes may serve SiteSetting from memory after it was changed
+SITE_SETTINGS_CACHE_SECONDS = 60
+
+# Escrow ledger entries newer than this are left for the next materialization run
+ESCROW_SETTLE_SECONDS = 300
+
+# DeepL translation cache
+TRANSLATION_CACHE_TTL_DAYS = 30
+TRANSLATION_CACHE_MAX_ENTRIES = 20000
+
+
+# Outbound HTTP (edudream.modules.http_client)
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_MAX_RETRIES = 2
+HTTP_POOL_MAXSIZE = 20
+HTTP_SLOW_REQUEST_MS = 5000
+
+# Email outbox worker
+EMAIL_OUTBOX_WORKERS = 8
+EMAIL_OUTBOX_BATCH_SIZE = 1000
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+# Maximum concurrent sends per provider host, "default" applies to hosts not listed
+EMAIL_OUTBOX_PROVIDER_CONCURRENCY = {"default": 4}
+
+# Cron jobs (edudream.modules.scheduler)
+# Lease on the job lock where the database has no advisory locks, a job must finish within it
+JOB_LOCK_LEASE_SECONDS = 30 * 60
+# JobRun rows older than this are deleted by the job-run-cleanup job
+JOB_RUN_RETENTION_DAYS = 30
+
+# Payout processing (edudream.modules.payouts)
+PAYOUT_WORKERS = 4
+PAYOUT_BATCH_SIZE = 100
+PAYOUT_MAX_ATTEMPTS = 5
+
+# Tutor search (edudream.modules.search), a backend class path or None to pick one for the database vendor
+TUTOR_SEARCH_BACKEND = None
+# The Python backend leaves facets out of listings with more matches than this
+TUTOR_SEARCH_FACET_ROWS = 2000
@@ -62,6 +62,21 @@ ZOOM_CLIENT_SECRET = env('ZOOM_CLIENT_SECRET', None)
 ZOOM_BASE_URL = env('ZOOM_BASE_URL', None)
 ZOOM_AUTH_URL = env('ZOOM_AUTH_URL', None)
 
+# Cron
+CRON_SECRET = env('CRON_SECRET', default=None)
+
+# Channels, the in-memory layer only reaches consumers in the same process
+REDIS_URL = env('REDIS_URL', default=None)
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [REDIS_URL]},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
 # Simple JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=3),
@@ -65,6 +65,18 @@ ZOOM_CLIENT_SECRET = env('ZOOM_CLIENT_SECRET', None)
 ZOOM_BASE_URL = env('ZOOM_BASE_URL', None)
 ZOOM_AUTH_URL = env('ZOOM_AUTH_URL', None)
 
+# Cron
+CRON_SECRET = env('CRON_SECRET', default=None)
+
+# Channels, required: HTTP workers push through Redis to the consumers in the ASGI processes
+REDIS_URL = env('REDIS_URL')
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': [REDIS_URL]},
+    },
+}
+
 # Simple JWT
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -1,14 +1,25 @@
-import json
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
 
-from channels.generic.websocket import WebsocketConsumer
+from edudream.modules.notifications import get_audiences
+from edudream.modules.realtime import get_user_group, get_audience_group
 
 
-class ClassroomConsumer(WebsocketConsumer):
-    def connect(self):
-        self.accept()
+class ClassroomConsumer(AsyncJsonWebsocketConsumer):
+    # Pushes chat messages and notifications to the connected user, see edudream.modules.realtime
+    async def connect(self):
+        user = self.scope.get("user")
+        if not user or not user.is_authenticated:
+            await self.close()
+            return
+        # The user's roles were loaded with it by the middleware, this does not query
+        self.group_names = [get_user_group(user.id)] + [get_audience_group(item) for item in get_audiences(user)]
+        for group_name in self.group_names:
+            await self.channel_layer.group_add(group_name, self.channel_name)
+        await self.accept()
 
-    def disconnect(self, close_code):
-        pass
+    async def disconnect(self, close_code):
+        for group_name in getattr(self, "group_names", []):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
 
-    def send_notification(self, message):
-        self.send(text_data=json.dumps(message))
+    async def push_event(self, event):
+        await self.send_json({"event": event["event"], "data": event["data"]})
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from edudream.modules.outbox import process_outbox, outbox_depth
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox with a bounded worker pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process a single batch and exit")
+        parser.add_argument("--stats", action="store_true", help="Print the queue depth and exit")
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--sleep", type=float, default=5, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for key, value in outbox_depth().items():
+                self.stdout.write(f"{key}: {value}")
+            return
+
+        while True:
+            close_old_connections()
+            processed = process_outbox(batch_size=options["batch_size"], workers=options["workers"])
+            if processed:
+                self.stdout.write(f"Processed {processed} email(s)")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["sleep"])
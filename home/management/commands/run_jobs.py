@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from edudream.modules.scheduler import JOBS, run_job, get_due_jobs, get_job_stats
+
+
+class Command(BaseCommand):
+    help = "Run cron jobs under a per-job lock, or keep running them on their interval with --loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument("jobs", nargs="*", help=f"Jobs to run: {', '.join(JOBS)}")
+        parser.add_argument(
+            "--loop", action="store_true", help="Run the jobs (all if none named) whenever they are due until stopped"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Roll back the jobs' database changes")
+        parser.add_argument("--stats", action="store_true", help="Print the last run of every job and exit")
+        parser.add_argument("--sleep", type=float, default=30, help="Seconds between checks for due jobs")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for name, item in get_job_stats().items():
+                self.stdout.write(f"{name}: {item}")
+            return
+
+        unknown = [name for name in options["jobs"] if name not in JOBS]
+        if unknown:
+            raise CommandError(f"Unknown job(s): {', '.join(unknown)}")
+        if not options["jobs"] and not options["loop"]:
+            raise CommandError("Name the jobs to run or pass --loop")
+
+        while True:
+            close_old_connections()
+            jobs = options["jobs"]
+            if options["loop"]:
+                jobs = [name for name in get_due_jobs() if name in (options["jobs"] or JOBS)]
+            for name in jobs:
+                try:
+                    run = run_job(name, dry_run=options["dry_run"])
+                except ValueError as err:
+                    raise CommandError(str(err))
+                self.stdout.write(
+                    f"{name}: {run.status}, {run.rows_processed or 0} row(s) in {run.duration_ms}ms"
+                    f"{' (dry run)' if run.dry_run else ''}"
+                )
+            if not options["loop"]:
+                break
+            time.sleep(options["sleep"])
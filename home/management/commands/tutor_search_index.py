@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from edudream.modules.search import rebuild_tutor_documents, refresh_tutor_documents
+
+
+class Command(BaseCommand):
+    help = "Rebuild the tutor search documents from the source tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Limit to these user ids")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        if options["users"]:
+            written = refresh_tutor_documents(options["users"])
+        else:
+            written = rebuild_tutor_documents(options["batch_size"])
+        self.stdout.write(f"Wrote {written} tutor search document(s)")
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from edudream.modules.stats import verify_user_stats, refresh_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the UserStats dashboard counters from the source tables and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true", help="Only report drift, do not fix it")
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Limit to these user ids")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = options["users"] or list(User.objects.order_by("id").values_list("id", flat=True))
+        batch_size = options["batch_size"]
+        drifted = set()
+        for index in range(0, len(user_ids), batch_size):
+            batch = user_ids[index:index + batch_size]
+            for user_id, field, stored, actual in verify_user_stats(batch):
+                drifted.add(user_id)
+                self.stdout.write(f"User {user_id}: {field} is {stored}, expected {actual}")
+            if not options["verify"]:
+                refresh_user_stats(batch)
+        action = "found" if options["verify"] else "fixed"
+        self.stdout.write(f"Checked {len(user_ids)} user(s), drift {action} for {len(drifted)}")
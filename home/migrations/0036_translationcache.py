@@ -0,0 +1,28 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0035_alter_profile_lat_alter_profile_lon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('target_language', models.CharField(max_length=10)),
+                ('content', models.TextField()),
+                ('translation', models.TextField()),
+                ('last_used_on', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'unique_together': {('content_hash', 'target_language')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0039_tutordetail_nationality_back_file_and_more'),
+        ('home', '0038_outboundemail_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitesetting',
+            name='escrow_ledger_position',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='EscrowEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('narration', models.CharField(blank=True, max_length=200, null=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('classroom', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='tutor.classroom')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='home.transaction')),
+            ],
+        ),
+    ]
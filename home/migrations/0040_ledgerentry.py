@@ -0,0 +1,29 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0039_escrow_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('balance', 'Wallet Balance'), ('pending', 'Wallet Pending Balance'), ('escrow', 'Escrow'), ('external', 'External'), ('bonus', 'Bonus')], max_length=20)),
+                ('destination', models.CharField(choices=[('balance', 'Wallet Balance'), ('pending', 'Wallet Pending Balance'), ('escrow', 'Escrow'), ('external', 'External'), ('bonus', 'Bonus')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('narration', models.CharField(blank=True, max_length=200, null=True)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='home.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
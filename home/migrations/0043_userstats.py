@@ -0,0 +1,34 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:35
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0042_job_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active_classes', models.IntegerField(default=0)),
+                ('completed_classes', models.IntegerField(default=0)),
+                ('cancelled_classes', models.IntegerField(default=0)),
+                ('total_tutor', models.IntegerField(default=0)),
+                ('total_subject', models.IntegerField(default=0)),
+                ('total_student', models.IntegerField(default=0)),
+                ('active_class_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('uncleared_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('withdrawal_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('withdrawal_count', models.IntegerField(default=0)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
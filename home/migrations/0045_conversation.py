@@ -0,0 +1,60 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_conversations(apps, schema_editor):
+    # Rows for every classroom contact, then the last message and unread count of every pair that has chatted
+    conversation = apps.get_model("home", "Conversation")
+    classroom = apps.get_model("tutor", "Classroom")
+    chat_message = apps.get_model("home", "ChatMessage")
+    rows = dict()
+    classrooms = classroom.objects.filter(status__in=["accepted", "completed", "cancelled"]).values_list(
+        "tutor_id", "student__user_id", "student__parent__user_id"
+    ).distinct()
+    for tutor_id, student_user_id, parent_user_id in classrooms:
+        for pair in ((student_user_id, tutor_id), (parent_user_id, tutor_id), (tutor_id, student_user_id)):
+            if all(pair):
+                rows.setdefault(pair, conversation(user_id=pair[0], counterpart_id=pair[1]))
+    messages = chat_message.objects.order_by("created_on", "id").values_list(
+        "id", "sender_id", "receiver_id", "created_on", "read"
+    )
+    for message_id, sender_id, receiver_id, created_on, read in messages.iterator():
+        for pair in ((sender_id, receiver_id), (receiver_id, sender_id)):
+            row = rows.setdefault(pair, conversation(user_id=pair[0], counterpart_id=pair[1]))
+            row.last_message_id, row.last_message_on = message_id, created_on
+        if not read:
+            rows[(receiver_id, sender_id)].unread_count += 1
+    conversation.objects.bulk_create(rows.values(), batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0044_tokenversion'),
+        ('tutor', '0041_payout_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_on', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.IntegerField(default=0)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('counterpart', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.chatmessage')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'last_message_on'], name='home_conver_user_id_99bf90_idx')],
+                'unique_together': {('user', 'counterpart')},
+            },
+        ),
+        migrations.RunPython(build_conversations, migrations.RunPython.noop),
+    ]
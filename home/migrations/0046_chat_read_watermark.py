@@ -0,0 +1,35 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:44
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Max, Value
+from django.db.models.functions import Coalesce
+
+
+def set_read_watermarks(apps, schema_editor):
+    # The newest received message already flagged as read
+    conversation = apps.get_model("home", "Conversation")
+    chat_message = apps.get_model("home", "ChatMessage")
+    last_read = chat_message.objects.filter(
+        sender_id=OuterRef("counterpart_id"), receiver_id=OuterRef("user_id"), read=True
+    ).values("receiver_id").annotate(last_read=Max("id")).values("last_read")
+    conversation.objects.update(last_read_id=Coalesce(Subquery(last_read), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0045_conversation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_read_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['sender', 'receiver', 'created_on'], name='home_chatme_sender__0dc86b_idx'),
+        ),
+        migrations.RunPython(set_read_watermarks, migrations.RunPython.noop),
+    ]
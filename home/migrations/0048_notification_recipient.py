@@ -0,0 +1,71 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:50
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Exists, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def move_read_state(apps, schema_editor):
+    # The shared read flag becomes a read row for every recipient, then the unread counters are filled in
+    recipient = apps.get_model("home", "NotificationRecipient")
+    notification_read = apps.get_model("home", "NotificationRead")
+    user_stats = apps.get_model("home", "UserStats")
+    read = recipient.objects.filter(notification__read=True).values_list("notification_id", "user_id")
+    batch = list()
+    for notification_id, user_id in read.iterator():
+        batch.append(notification_read(notification_id=notification_id, user_id=user_id))
+        if len(batch) == 500:
+            notification_read.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = list()
+    notification_read.objects.bulk_create(batch, ignore_conflicts=True)
+
+    is_read = notification_read.objects.filter(notification_id=OuterRef("notification_id"), user_id=OuterRef("user_id"))
+    unread = recipient.objects.filter(user_id=OuterRef("user_id")).exclude(Exists(is_read)).values("user_id").annotate(
+        total=Count("id")
+    ).values("total")
+    user_stats.objects.update(unread_notifications=Coalesce(Subquery(unread), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0047_notification_audience'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='unread_notifications',
+            field=models.IntegerField(default=0),
+        ),
+        # The table already exists as the auto-created through table of Notification.user
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='NotificationRecipient',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='home.notification')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'home_notification_user',
+                        'unique_together': {('notification', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='notification',
+                    name='user',
+                    field=models.ManyToManyField(through='home.NotificationRecipient', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='notificationrecipient',
+            index=models.Index(fields=['user', '-notification'], name='home_notifi_user_id_9d4aaf_idx'),
+        ),
+        migrations.RunPython(move_read_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:54
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+import unicodedata
+from collections import defaultdict
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFKD", str(text or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def build_documents(apps, schema_editor):
+    # Same documents as edudream.modules.search.refresh_tutor_documents, written against the historical models
+    document = apps.get_model("home", "TutorSearchDocument")
+    profile = apps.get_model("home", "Profile")
+    tutor_detail = apps.get_model("tutor", "TutorDetail")
+    tutor_subject = apps.get_model("tutor", "TutorSubject")
+    tutor_calendar = apps.get_model("tutor", "TutorCalendar")
+    user_language = apps.get_model("home", "UserLanguage")
+    class_review = apps.get_model("home", "ClassReview")
+    details = {item.user_id: item for item in tutor_detail.objects.all()}
+    subjects, languages = defaultdict(list), defaultdict(list)
+    for user_id, subject_id, name, grade in tutor_subject.objects.values_list(
+            "user_id", "subject_id", "subject__name", "subject__grade"):
+        subjects[user_id].append((subject_id, name, grade))
+    for user_id, language_id, name in user_language.objects.values_list("user_id", "language_id", "language__name"):
+        languages[user_id].append((language_id, name))
+    reviews = dict(class_review.objects.values_list("classroom__tutor_id").annotate(models.Count("id")))
+    slots = dict(tutor_calendar.objects.filter(status="available").values_list("user_id").annotate(models.Count("id")))
+    documents = list()
+    for item in profile.objects.filter(account_type="tutor").select_related("user").iterator():
+        user, detail = item.user, details.get(item.user_id)
+        university_name = (detail.university_name or "") if detail else ""
+        diploma_type = (detail.diploma_type or "") if detail else ""
+        words = [user.first_name, user.last_name, university_name, diploma_type]
+        words += [name for _, name, _ in subjects[user.id]] + [name for _, name in languages[user.id]]
+        documents.append(document(
+            user_id=user.id, profile_id=item.id, active=item.active, name=f"{user.first_name} {user.last_name}".strip(),
+            search_text=normalize_text(" ".join(words)),
+            subject_ids=sorted({subject_id for subject_id, _, _ in subjects[user.id]}),
+            grades=sorted({grade for _, _, grade in subjects[user.id]}),
+            language_ids=sorted({language_id for language_id, _ in languages[user.id]}), country_id=item.country_id,
+            university_name=university_name, diploma_type=diploma_type, review_count=reviews.get(user.id, 0),
+            available_slots=slots.get(user.id, 0)
+        ))
+    document.objects.bulk_create(documents, batch_size=500)
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes for PostgresSearchBackend, matching the expressions its queries use. Other databases use the
+    # Python backend and need none.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX home_tutorsearch_fts_idx ON home_tutorsearchdocument "
+        "USING gin (to_tsvector('simple'::regconfig, COALESCE(search_text, '')))"
+    )
+    schema_editor.execute(
+        "CREATE INDEX home_tutorsearch_subjects_idx ON home_tutorsearchdocument USING gin (subject_ids)"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in ("home_tutorsearch_fts_idx", "home_tutorsearch_subjects_idx"):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('location', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('home', '0048_notification_recipient'),
+        ('tutor', '0041_payout_processing'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TutorSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('active', models.BooleanField(default=False)),
+                ('name', models.CharField(blank=True, default='', max_length=400)),
+                ('search_text', models.TextField(blank=True, default='')),
+                ('subject_ids', models.JSONField(default=list)),
+                ('grades', models.JSONField(default=list)),
+                ('language_ids', models.JSONField(default=list)),
+                ('university_name', models.CharField(blank=True, default='', max_length=300)),
+                ('diploma_type', models.CharField(blank=True, default='', max_length=100)),
+                ('review_count', models.IntegerField(default=0)),
+                ('available_slots', models.IntegerField(default=0)),
+                ('updated_on', models.DateTimeField(auto_now=True)),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='location.country')),
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='home.profile')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+        migrations.RunPython(build_documents, migrations.RunPython.noop),
+    ]
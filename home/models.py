@@ -1,9 +1,11 @@
 from django.contrib.sites.models import Site
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 from edudream.modules.choices import TRANSACTION_TYPE_CHOICES, TRANSACTION_STATUS_CHOICES, ACCOUNT_TYPE_CHOICES, \
-    PROFICIENCY_TYPE_CHOICES, GRADE_CHOICES, SEND_NOTIFICATION_TYPE_CHOICES
+    PROFICIENCY_TYPE_CHOICES, GRADE_CHOICES, SEND_NOTIFICATION_TYPE_CHOICES, EMAIL_STATUS_CHOICES, \
+    LEDGER_ACCOUNT_CHOICES, JOB_RUN_STATUS_CHOICES
 from location.models import City, State, Country
 from tutor.models import Classroom
 
@@ -107,17 +109,48 @@ class Card(models.Model):
 
 
 class Notification(models.Model):
-    user = models.ManyToManyField(User)
+    user = models.ManyToManyField(User, through="NotificationRecipient")
     message = models.CharField(max_length=500)
     read = models.BooleanField(default=False)
     created_on = models.DateTimeField(auto_now_add=True)
     admin_initiated = models.BooleanField(default=False)
     users_type = models.CharField(max_length=50, null=True, default="all")
+    # Broadcasts are stored once with an audience and no users. Read state is kept per user in NotificationRead,
+    # "read" is no longer updated.
+    audience = models.CharField(
+        max_length=50, choices=SEND_NOTIFICATION_TYPE_CHOICES, blank=True, null=True, db_index=True
+    )
 
     def __str__(self):
         return f"{self.id}"
 
 
+class NotificationRecipient(models.Model):
+    # The table Django created for Notification.user, declared to index it for listing a user's notifications
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = "home_notification_user"
+        unique_together = ("notification", "user")
+        indexes = [models.Index(fields=["user", "-notification"])]
+
+    def __str__(self):
+        return f"{self.user}: {self.notification_id}"
+
+
+class NotificationRead(models.Model):
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name="reads")
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    read_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("user", "notification")
+
+    def __str__(self):
+        return f"{self.user}: {self.notification_id}"
+
+
 class Subject(models.Model):
     name = models.CharField(max_length=200)
     grade = models.CharField(max_length=50, choices=GRADE_CHOICES, default="mid_school")
@@ -171,6 +204,27 @@ class ChatMessage(models.Model):
 
     class Meta:
         ordering = ['created_on']
+        indexes = [models.Index(fields=["sender", "receiver", "created_on"])]
+
+
+class Conversation(models.Model):
+    # One row per user and chat counterpart, kept current by edudream.modules.chat
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversations")
+    counterpart = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    last_message = models.ForeignKey(ChatMessage, on_delete=models.SET_NULL, blank=True, null=True, related_name="+")
+    last_message_on = models.DateTimeField(blank=True, null=True)
+    unread_count = models.IntegerField(default=0)
+    # Id of the newest message the user has seen, messages up to it count as read
+    last_read_id = models.BigIntegerField(default=0)
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("user", "counterpart")
+        indexes = [models.Index(fields=["user", "last_message_on"])]
+
+    def __str__(self):
+        return f"{self.user}: {self.counterpart}"
 
 
 class SiteSetting(models.Model):
@@ -185,7 +239,9 @@ class SiteSetting(models.Model):
     intro_call_duration = models.IntegerField(blank=True, null=True, default=15)
     enquiry_email = models.CharField(max_length=200, blank=True, null=True)
     frontend_url = models.CharField(max_length=200, blank=True, null=True)
+    # Materialized from EscrowEntry rows up to escrow_ledger_position, see get_escrow_balance()
     escrow_balance = models.DecimalField(decimal_places=2, max_digits=20, default=0)
+    escrow_ledger_position = models.BigIntegerField(default=0)
     zoom_token = models.TextField(blank=True, null=True)
 
     def __str__(self):
@@ -215,4 +271,154 @@ class Testimonial(models.Model):
         return f"{self.name}"
 
 
+class TranslationCache(models.Model):
+    content_hash = models.CharField(max_length=64)
+    target_language = models.CharField(max_length=10)
+    content = models.TextField()
+    translation = models.TextField()
+    last_used_on = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_on = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.target_language}: {self.content_hash}"
+
+    class Meta:
+        unique_together = ("content_hash", "target_language")
+
+
+class OutboundEmail(models.Model):
+    email = models.CharField(max_length=200)
+    subject = models.CharField(max_length=500)
+    content = models.TextField()
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    provider = models.CharField(max_length=200, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=EMAIL_STATUS_CHOICES, default="pending")
+    attempts = models.IntegerField(default=0)
+    next_attempt_on = models.DateTimeField(default=timezone.now)
+    locked_on = models.DateTimeField(blank=True, null=True)
+    sent_on = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.email}: {self.subject} - {self.status}"
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_on"])]
+
+
+class EscrowEntry(models.Model):
+    # Insert-only: credits are positive, debits negative
+    amount = models.DecimalField(decimal_places=2, max_digits=20)
+    narration = models.CharField(max_length=200, blank=True, null=True)
+    classroom = models.ForeignKey(Classroom, on_delete=models.SET_NULL, blank=True, null=True)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.amount}: {self.narration}"
+
+
+class LedgerEntry(models.Model):
+    # Double-entry wallet journal: amount moves from source to destination. "balance" and "pending" are the
+    # user's wallet fields, the other accounts are system accounts.
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, blank=True, null=True)
+    source = models.CharField(max_length=20, choices=LEDGER_ACCOUNT_CHOICES)
+    destination = models.CharField(max_length=20, choices=LEDGER_ACCOUNT_CHOICES)
+    amount = models.DecimalField(decimal_places=2, max_digits=20)
+    narration = models.CharField(max_length=200, blank=True, null=True)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user}: {self.source} -> {self.destination} {self.amount}"
+
+
+class JobWatermark(models.Model):
+    # How far an incremental job has processed, so each run only handles what changed since the last one
+    name = models.CharField(max_length=100, unique=True)
+    position = models.DateTimeField()
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
+
+
+class JobLock(models.Model):
+    # Lease lock for databases without advisory locks
+    name = models.CharField(max_length=100, unique=True)
+    locked_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.locked_until}"
+
+
+class JobRun(models.Model):
+    job = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=JOB_RUN_STATUS_CHOICES, default="running")
+    dry_run = models.BooleanField(default=False)
+    rows_processed = models.IntegerField(blank=True, null=True)
+    duration_ms = models.IntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    started_on = models.DateTimeField(default=timezone.now)
+    finished_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["job", "started_on"])]
+
+    def __str__(self):
+        return f"{self.job}: {self.status}"
+
+
+class UserStats(models.Model):
+    # Denormalized dashboard counters, kept current by edudream.modules.stats. Rebuild with "manage.py user_stats".
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="stats")
+    active_classes = models.IntegerField(default=0)
+    completed_classes = models.IntegerField(default=0)
+    cancelled_classes = models.IntegerField(default=0)
+    total_tutor = models.IntegerField(default=0)
+    total_subject = models.IntegerField(default=0)
+    total_student = models.IntegerField(default=0)
+    active_class_amount = models.DecimalField(default=0, decimal_places=2, max_digits=20)
+    uncleared_amount = models.DecimalField(default=0, decimal_places=2, max_digits=20)
+    withdrawal_amount = models.DecimalField(default=0, decimal_places=2, max_digits=20)
+    withdrawal_count = models.IntegerField(default=0)
+    # Unread direct notifications, broadcasts are counted when read
+    unread_notifications = models.IntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user}"
 
+
+class TokenVersion(models.Model):
+    # Bumped when a user's role changes, access tokens carrying an older role_version claim fall back to the database
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="token_version")
+    version = models.PositiveIntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user}: {self.version}"
+
+
+class TutorSearchDocument(models.Model):
+    # Denormalized tutor listing, kept current by edudream.modules.search. Rebuild with "manage.py tutor_search_index".
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="search_document")
+    profile = models.OneToOneField(Profile, on_delete=models.CASCADE, related_name="search_document")
+    active = models.BooleanField(default=False)
+    name = models.CharField(max_length=400, blank=True, default="")
+    # Lowercased and accent-free name, subjects, languages, university and diploma
+    search_text = models.TextField(blank=True, default="")
+    subject_ids = models.JSONField(default=list)
+    grades = models.JSONField(default=list)
+    language_ids = models.JSONField(default=list)
+    country = models.ForeignKey(Country, on_delete=models.SET_NULL, blank=True, null=True)
+    university_name = models.CharField(max_length=300, blank=True, default="")
+    diploma_type = models.CharField(max_length=100, blank=True, default="")
+    review_count = models.IntegerField(default=0)
+    available_slots = models.IntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}"
@@ -10,20 +10,25 @@ from django.db.models import Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import serializers
+from edudream.modules.authentication import get_profile, get_student
 from edudream.modules.choices import ACCOUNT_TYPE_CHOICES, CONSULTATION_ACCOUNT_TYPE, CONSULTATION_TYPE_CHOICES
 from edudream.modules.email_template import tutor_register_email, parent_register_email, feedback_email, \
     consultation_email, send_otp_token_to_email, send_verification_email, send_welcome_email
 from edudream.modules.exceptions import InvalidRequestException
+from edudream.modules.stats import get_user_stats
 from edudream.modules.utils import generate_random_otp, log_request, encrypt_text, get_next_minute, \
     decrypt_text, create_notification, translate_to_language, get_site_details, get_current_datetime_from_lat_lon
 from home.models import Profile, Wallet, Transaction, ChatMessage, PaymentPlan, ClassReview, Language, UserLanguage, \
-    Subject, Notification, Testimonial
+    Subject, Notification, Testimonial, Conversation
 from location.models import Country, State, City
 from parent.serializers import ParentStudentSerializerOut
 from student.models import Student
 from tutor.models import TutorDetail, Classroom, Dispute
 from tutor.serializers import TutorDetailSerializerOut, ClassRoomSerializerOut
 
+# Most recent ended / awaiting approval classes returned with the profile, the classroom endpoints list the rest
+DASHBOARD_CLASS_LIST_LIMIT = 5
+
 
 class UserLanguageSerializerOut(serializers.ModelSerializer):
     class Meta:
@@ -115,56 +120,47 @@ class UserSerializerOut(serializers.ModelSerializer):
         return None
 
     def get_stat(self, obj):
+        # Counters come from the user's UserStats row, the ended and awaiting lists are capped at
+        # DASHBOARD_CLASS_LIST_LIMIT
+        now = timezone.now()
         if Student.objects.filter(user=obj).exists():
-            student = Student.objects.get(user=obj)
-            classroom = Classroom.objects.filter(student__user=obj)
-            tutors = [classes.tutor_id for classes in classroom]
-            tutor_list = list(dict.fromkeys(tutors))
-            now = timezone.now()
-            ended_class = classroom.filter(end_date__lte=now, student_complete_check=False, status="accepted")
-            ap = classroom.filter(end_date__lte=now, tutor_complete_check=False, status="accepted")
-            return {
-                "total_tutor": len(tutor_list),
-                "total_subject": Subject.objects.filter(classroom__student=student).distinct().count(),
-                "active_classes": classroom.filter(status="accepted").count(),
-                "completed_classes": classroom.filter(status="completed").count(),
-                "ended_classes": ClassRoomSerializerOut(ended_class, many=True, context={"request": self.context.get("request")}).data,
-                "awaiting_approval": ClassRoomSerializerOut(ap, many=True, context={"request": self.context.get("request")}).data,
-            }
-        elif Profile.objects.filter(user=obj, account_type="parent").exists():
-            classroom = Classroom.objects.filter(student__parent__user=obj)
-            tutors = [classes.tutor_id for classes in classroom]
-            tutor_list = list(dict.fromkeys(tutors))
-            students = Student.objects.filter(parent__user=obj)
-            now = timezone.now()
-            ended_class = classroom.filter(end_date__lte=now, student_complete_check=False, status="accepted")
-            ap = classroom.filter(end_date__lte=now, tutor_complete_check=False, status="accepted")
-            return {
-                "total_tutor": len(tutor_list),
-                "total_subject": Subject.objects.filter(classroom__student__in=students).distinct().count(),
-                "total_student": students.count(),
-                "active_classes": classroom.filter(status="accepted").count(),
-                "completed_classes": classroom.filter(status="completed").count(),
-                "ended_classes": ClassRoomSerializerOut(ended_class, many=True, context={"request": self.context.get("request")}).data,
-                "awaiting_approval": ClassRoomSerializerOut(ap, many=True, context={"request": self.context.get("request")}).data,
-            }
-        elif Profile.objects.filter(user=obj, account_type="tutor").exists():
-            classroom = Classroom.objects.filter(tutor=obj)
-            now = timezone.now()
-            ended_class = classroom.filter(end_date__lte=now, tutor_complete_check=False, status="accepted")
-            ap = classroom.filter(end_date__lte=now, student_complete_check=False, status="accepted")
-            return {
-                "total_subject": Subject.objects.filter(classroom__tutor__in=[obj]).distinct().count(),
-                "active_classes": classroom.filter(status="accepted").count(),
-                "completed_classes": classroom.filter(status="completed").count(),
-                "cancelled_classes": classroom.filter(status="cancelled").count(),
-                "ended_classes": ClassRoomSerializerOut(ended_class, many=True, context={"request": self.context.get("request")}).data,
-                "awaiting_approval": ClassRoomSerializerOut(ap, many=True, context={"request": self.context.get("request")}).data,
-            }
-
+            account_type = "student"
         else:
+            account_type = Profile.objects.filter(user=obj).values_list("account_type", flat=True).first()
+        if account_type not in ("student", "parent", "tutor"):
             return None
 
+        stats = get_user_stats(obj.id)
+        result = {
+            "total_subject": stats.total_subject,
+            "active_classes": stats.active_classes,
+            "completed_classes": stats.completed_classes,
+        }
+        if account_type == "tutor":
+            classroom = Classroom.objects.filter(tutor=obj)
+            ended_query = Q(end_date__lte=now, tutor_complete_check=False, status="accepted")
+            awaiting_query = Q(end_date__lte=now, student_complete_check=False, status="accepted")
+            result["cancelled_classes"] = stats.cancelled_classes
+        else:
+            if account_type == "student":
+                classroom = Classroom.objects.filter(student__user=obj)
+            else:
+                classroom = Classroom.objects.filter(student__parent__user=obj)
+                result["total_student"] = stats.total_student
+            ended_query = Q(end_date__lte=now, student_complete_check=False, status="accepted")
+            awaiting_query = Q(end_date__lte=now, tutor_complete_check=False, status="accepted")
+            result["total_tutor"] = stats.total_tutor
+
+        context = {"request": self.context.get("request")}
+        listing = classroom.for_listing().order_by("-end_date")
+        result["ended_classes"] = ClassRoomSerializerOut(
+            listing.filter(ended_query)[:DASHBOARD_CLASS_LIST_LIMIT], many=True, context=context
+        ).data
+        result["awaiting_approval"] = ClassRoomSerializerOut(
+            listing.filter(awaiting_query)[:DASHBOARD_CLASS_LIST_LIMIT], many=True, context=context
+        ).data
+        return result
+
     def get_languages(self, obj):
         return UserLanguageSerializerOut(UserLanguage.objects.filter(user=obj), many=True).data
 
@@ -694,6 +690,14 @@ class TransactionSerializerOut(serializers.ModelSerializer):
 
 class ChatMessageSerializerOut(serializers.ModelSerializer):
     attachment = serializers.SerializerMethodField()
+    read = serializers.SerializerMethodField()
+
+    def get_read(self, obj):
+        # A message is read once the receiver's watermark reaches it
+        watermarks = self.context.get("read_watermarks")
+        if watermarks is None:
+            return obj.read
+        return obj.id <= watermarks.get(obj.receiver_id, 0)
 
     def get_attachment(self, obj):
         file = None
@@ -707,6 +711,28 @@ class ChatMessageSerializerOut(serializers.ModelSerializer):
         exclude = []
 
 
+class ConversationSerializerOut(serializers.ModelSerializer):
+    user_id = serializers.IntegerField(source="counterpart_id")
+    name = serializers.CharField(source="counterpart.get_full_name")
+    image = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    date = serializers.DateTimeField(source="last_message_on")
+
+    def get_image(self, obj):
+        # Students keep their picture on the student record, tutors and parents on the profile
+        owner = get_student(obj.counterpart) or get_profile(obj.counterpart)
+        if owner and owner.profile_picture:
+            return self.context.get("request").build_absolute_uri(owner.profile_picture.url)
+        return None
+
+    def get_last_message(self, obj):
+        return str(obj.last_message.message) if obj.last_message else ""
+
+    class Meta:
+        model = Conversation
+        fields = ["user_id", "name", "image", "last_message", "date", "unread_count"]
+
+
 class ChatMessageSerializerIn(serializers.Serializer):
     sender = serializers.HiddenField(default=serializers.CurrentUserDefault())
     receiver_id = serializers.IntegerField()
@@ -798,11 +824,24 @@ class SubjectSerializerOut(serializers.ModelSerializer):
 
 
 class NotificationSerializerOut(serializers.ModelSerializer):
+    read = serializers.SerializerMethodField()
+
+    def get_read(self, obj):
+        # Annotated by with_read_state when listed for a user
+        return getattr(obj, "user_read", obj.read)
+
     class Meta:
         model = Notification
         exclude = []
 
 
+class UserNotificationSerializerOut(NotificationSerializerOut):
+    # The recipient list is left out, it is one query per notification and lists other users
+    class Meta:
+        model = Notification
+        exclude = ["user"]
+
+
 class UploadProfilePictureSerializerIn(serializers.Serializer):
     auth_user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     image = serializers.ImageField()
@@ -0,0 +1,256 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, post_init, m2m_changed
+from django.dispatch import receiver
+
+from edudream.modules.authentication import bump_token_version
+from edudream.modules.chat import CHAT_CLASS_STATUSES, get_classroom_contacts, add_conversations, record_message
+from edudream.modules.notifications import refresh_unread_notifications
+from edudream.modules.realtime import push_to_users, push_to_groups, get_audience_group, get_message_payload, \
+    get_notification_payload
+from edudream.modules.search import refresh_tutor_documents
+from edudream.modules.stats import get_classroom_state, get_participants, add_classroom_change, new_deltas, \
+    apply_stats_deltas, refresh_user_stats, add_classroom_members, refresh_member_stats
+from edudream.modules.utils import clear_site_details_cache
+from home.models import SiteSetting, UserStats, Profile, ChatMessage, Notification, NotificationRecipient, \
+    TutorSearchDocument, UserLanguage, ClassReview, Subject
+from student.models import Student
+from tutor.models import Classroom, PayoutRequest, TutorDetail, TutorSubject, TutorCalendar
+
+
+@receiver(post_save, sender=SiteSetting)
+@receiver(post_delete, sender=SiteSetting)
+def site_setting_changed(sender, **kwargs):
+    clear_site_details_cache()
+
+
+@receiver(post_save, sender=User)
+def user_stats_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Classroom)
+def classroom_post_init(sender, instance, **kwargs):
+    instance._stats_state = get_classroom_state(instance)
+
+
+def get_classroom_users(*pairs):
+    # Tutor, student and parent user ids of (tutor_id, student_id) pairs
+    participants = get_participants([student_id for _, student_id in pairs if student_id])
+    user_ids = set()
+    for tutor_id, student_id in pairs:
+        user_ids.add(tutor_id)
+        user_ids.update(participants.get(student_id, ()))
+    user_ids.discard(None)
+    return user_ids
+
+
+@receiver(post_save, sender=Classroom)
+def classroom_stats_changed(sender, instance, created, raw=False, **kwargs):
+    old, new = instance._stats_state, get_classroom_state(instance)
+    instance._stats_state = new
+    if raw:
+        return
+    if not created and old == new:
+        return
+    empty = (None, None, None)
+    deltas = new_deltas()
+    participants = get_participants({old[4], new[4]} - {None})
+    new_participants = participants.get(new[4], ())
+    if created:
+        add_classroom_change(deltas, new[3], new_participants, empty, new[:3])
+        # Only the distinct tutor and subject counters need a lookup, and only an exists() per user
+        add_classroom_members(deltas, instance.id, new[3], new[4], new_participants, new[5])
+        apply_stats_deltas(deltas)
+    elif old[3:] != new[3:]:
+        # Reassigned: move the status counters between the users, then recount their distinct tutors and subjects
+        add_classroom_change(deltas, old[3], participants.get(old[4], ()), old[:3], empty)
+        add_classroom_change(deltas, new[3], new_participants, empty, new[:3])
+        apply_stats_deltas(deltas)
+        refresh_member_stats(get_classroom_users((old[3], old[4]), (new[3], new[4])))
+    else:
+        add_classroom_change(deltas, new[3], new_participants, old[:3], new[:3])
+        apply_stats_deltas(deltas)
+
+
+@receiver(post_delete, sender=Classroom)
+def classroom_stats_deleted(sender, instance, **kwargs):
+    user_ids = get_classroom_users((instance.tutor_id, instance.student_id))
+    # After commit, so users deleted in the same transaction are not given a stats row again
+    transaction.on_commit(lambda: refresh_user_stats(User.objects.filter(id__in=user_ids).values_list("id", flat=True)))
+
+
+@receiver(post_init, sender=PayoutRequest)
+def payout_post_init(sender, instance, **kwargs):
+    instance._stats_state = (instance.__dict__.get("status"), instance.__dict__.get("amount"))
+
+
+@receiver(post_save, sender=PayoutRequest)
+def payout_stats_changed(sender, instance, created, raw=False, **kwargs):
+    old = (None, 0) if created else instance._stats_state
+    new = instance._stats_state = (instance.status, instance.amount)
+    if raw or old == new:
+        return
+    deltas = new_deltas()
+    for (payout_status, amount), sign in ((old, -1), (new, 1)):
+        if payout_status == "processed":
+            deltas[instance.user_id]["withdrawal_amount"] += sign * amount
+            deltas[instance.user_id]["withdrawal_count"] += sign
+    apply_stats_deltas(deltas)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def student_stats_changed(sender, instance, created=True, raw=False, **kwargs):
+    if not created or raw:
+        return
+    sign = 1 if kwargs["signal"] is post_save else -1
+    parent_user_id = instance.parent.user_id
+    UserStats.objects.filter(user_id=parent_user_id).update(total_student=F("total_student") + sign)
+
+
+@receiver(post_init, sender=Profile)
+def profile_post_init(sender, instance, **kwargs):
+    instance._role_state = (instance.__dict__.get("account_type"), instance.__dict__.get("email_verified"))
+
+
+@receiver(post_save, sender=Profile)
+def profile_role_changed(sender, instance, created, raw=False, **kwargs):
+    old = instance._role_state
+    new = instance._role_state = (instance.account_type, instance.email_verified)
+    if raw or (old == new and not created):
+        return
+    user_ids = [instance.user_id]
+    if old[1] != new[1]:
+        # Students are verified through their parent
+        user_ids += Student.objects.filter(parent=instance).values_list("user_id", flat=True)
+    bump_token_version(user_ids)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=TutorDetail)
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=TutorDetail)
+def role_relation_changed(sender, instance, signal, created=True, raw=False, **kwargs):
+    if not created or raw:
+        return
+    if signal is post_delete:
+        # After commit, deleting the user cascades here and its TokenVersion row must not be created again
+        transaction.on_commit(lambda user_id=instance.user_id: bump_token_version([user_id]))
+    else:
+        bump_token_version([instance.user_id])
+
+
+@receiver(post_save, sender=ChatMessage)
+def chat_message_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_message(instance)
+        # The sender's other devices get it too
+        push_to_users([instance.receiver_id, instance.sender_id], "chat_message", get_message_payload(instance))
+
+
+@receiver(post_save, sender=Notification)
+def notification_broadcast_created(sender, instance, created, raw=False, **kwargs):
+    if created and instance.audience and not raw:
+        push_to_groups([get_audience_group(instance.audience)], "notification", get_notification_payload(instance))
+
+
+@receiver(m2m_changed, sender=NotificationRecipient)
+def notification_users_changed(sender, instance, action, pk_set, reverse=False, **kwargs):
+    if reverse or not pk_set:
+        return
+    if action == "post_add":
+        deltas = new_deltas()
+        for user_id in pk_set:
+            deltas[user_id]["unread_notifications"] += 1
+        apply_stats_deltas(deltas)
+        push_to_users(pk_set, "notification", get_notification_payload(instance))
+    elif action == "post_remove":
+        refresh_unread_notifications(pk_set)
+
+
+@receiver(post_init, sender=Classroom)
+def classroom_chat_post_init(sender, instance, **kwargs):
+    instance._chat_status = instance.__dict__.get("status")
+
+
+@receiver(post_save, sender=Classroom)
+def classroom_chat_opened(sender, instance, created, raw=False, **kwargs):
+    old, instance._chat_status = instance._chat_status, instance.status
+    if raw or instance.status not in CHAT_CLASS_STATUSES or (old in CHAT_CLASS_STATUSES and not created):
+        return
+    student_user_id, parent_user_id = get_participants([instance.student_id]).get(instance.student_id, (None, None))
+    add_conversations(get_classroom_contacts([(instance.tutor_id, student_user_id, parent_user_id)]))
+
+
+# Users whose search document waits for the current transaction to commit, per thread
+pending_documents = threading.local()
+
+
+def refresh_pending_tutor_documents():
+    user_ids, pending_documents.user_ids = getattr(pending_documents, "user_ids", set()), set()
+    if user_ids:
+        refresh_tutor_documents(user_ids)
+
+
+def refresh_tutor_documents_on_commit(user_ids):
+    """
+    After commit, so a user deleted in the same transaction does not get a document again. The first callback
+    to run refreshes every user collected in the transaction once, the rest find nothing left. Ids left behind by
+    a rollback are refreshed with the next commit, which only rereads the source tables.
+    """
+    if not hasattr(pending_documents, "user_ids"):
+        pending_documents.user_ids = set()
+    pending_documents.user_ids.update(user_ids)
+    transaction.on_commit(refresh_pending_tutor_documents)
+
+
+@receiver(post_save, sender=Profile)
+def tutor_profile_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.account_type == "tutor" or TutorSearchDocument.objects.filter(user_id=instance.user_id).exists():
+        refresh_tutor_documents_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=User)
+def tutor_user_changed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # New users get their document with their tutor profile, saves that leave the name alone (last_login) are skipped
+    if created or raw or (update_fields and not {"first_name", "last_name"} & set(update_fields)):
+        return
+    if TutorSearchDocument.objects.filter(user=instance).exists():
+        refresh_tutor_documents_on_commit([instance.id])
+
+
+@receiver(post_save, sender=TutorDetail)
+@receiver(post_save, sender=TutorSubject)
+@receiver(post_save, sender=TutorCalendar)
+@receiver(post_save, sender=UserLanguage)
+@receiver(post_delete, sender=TutorDetail)
+@receiver(post_delete, sender=TutorSubject)
+@receiver(post_delete, sender=TutorCalendar)
+@receiver(post_delete, sender=UserLanguage)
+def tutor_document_source_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_tutor_documents_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=ClassReview)
+@receiver(post_delete, sender=ClassReview)
+def tutor_review_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_tutor_documents_on_commit(
+            Classroom.objects.filter(id=instance.classroom_id).values_list("tutor_id", flat=True)
+        )
+
+
+@receiver(post_save, sender=Subject)
+def tutor_subject_renamed(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        refresh_tutor_documents_on_commit(
+            TutorSubject.objects.filter(subject=instance).values_list("user_id", flat=True)
+        )
@@ -1,14 +1,42 @@
+import io
+from unittest import mock
+
+import requests
+import urllib3
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 
-from edudream.modules.utils import log_request, encrypt_text
-from home.models import Profile, Wallet
+from edudream.modules.authentication import RoleJWTAuthentication, RoleAccessToken, get_account_type
+from edudream.modules.permissions import IsParent, IsStudent, IsTutor
+from edudream.modules.utils import log_request, encrypt_text, get_site_details, clear_site_details_cache, \
+    adjust_escrow_balance, get_escrow_balance, materialize_escrow_balance, create_notification, complete_payment
+from edudream.modules import wallet
+from edudream.modules.chat import mark_conversation_read
+from edudream.modules import http_client
+from edudream.modules.cron import class_fee_to_tutor_pending_balance_job, process_pending_balance_to_main_job, \
+    update_ended_classroom_jobs
+from edudream.modules.outbox import queue_email, queue_bulk_email, process_outbox, outbox_depth
+from edudream.modules.realtime import get_user_group
+from edudream.modules.scheduler import run_job, job_lock, get_due_jobs
+from edudream.modules.search import search_tutors
+from edudream.modules.stats import verify_user_stats
+from home.models import Profile, Wallet, OutboundEmail, SiteSetting, LedgerEntry, EscrowEntry, JobRun, UserStats, \
+    ChatMessage, Conversation, Notification, Subject, TutorSearchDocument, TokenVersion, PaymentPlan, Transaction
+from home.consumers import ClassroomConsumer
+from home.serializers import UserSerializerOut
 from location.models import Country
 from student.models import Student
-from tutor.models import PayoutRequest, TutorBankAccount, Classroom
+from superadmin.serializers import NotificationSerializerIn
+from tutor.models import PayoutRequest, TutorBankAccount, Classroom, TutorDetail, TutorSubject, TutorCalendar
 
 
 class TestHomeTestCase(TestCase):
@@ -39,11 +67,14 @@ class TestHomeTestCase(TestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    @override_settings(CRON_SECRET="secret")
     def test_payout_cron(self):
         data = {}
         url = reverse("home:payout")
-        response = self.client.get(url, data)
+        response = self.client.get(url, data, headers={"X-Cron-Secret": "secret"})
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(url, data)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
     def test_classroom_view(self):
         data = {"tutor_id": 2}
@@ -52,5 +83,504 @@ class TestHomeTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+class TestEmailOutboxTestCase(TestCase):
+    def setUp(self):
+        self.sent = queue_email("<p>Sent</p>", "sent@email.com", "Hello")
+        self.retried = queue_email("<p>Retry</p>", "retry@email.com", "Hello")
+        self.rejected = queue_email("<p>Rejected</p>", "rejected@email.com", "Hello")
+
+    @staticmethod
+    def fake_deliver(content, emails, subject):
+        status_codes = {"<p>Sent</p>": 202, "<p>Retry</p>": 503, "<p>Rejected</p>": 400}
+        return [mock.Mock(status_code=status_codes[content], text="")]
+
+    def test_outbox_worker(self):
+        self.assertEqual(outbox_depth()["due"], 3)
+        with mock.patch("edudream.modules.outbox.deliver_bulk_email", side_effect=self.fake_deliver):
+            self.assertEqual(process_outbox(), 3)
+            # The provider error is backed off, so nothing is due straight away
+            self.assertEqual(process_outbox(), 0)
+        self.assertEqual(OutboundEmail.objects.get(id=self.sent.id).status, "sent")
+        retried = OutboundEmail.objects.get(id=self.retried.id)
+        self.assertEqual((retried.status, retried.attempts), ("pending", 1))
+        self.assertEqual(OutboundEmail.objects.get(id=self.rejected.id).status, "failed")
+        self.assertEqual(outbox_depth()["pending"], 1)
+
+    def test_identical_emails_share_one_request(self):
+        queue_bulk_email("<p>Sent</p>", ["a@email.com", "b@email.com", "a@email.com"], "Hello")
+        with mock.patch("edudream.modules.outbox.deliver_bulk_email", side_effect=self.fake_deliver) as deliver:
+            self.assertEqual(process_outbox(), 5)
+        self.assertEqual(deliver.call_count, 3)
+        self.assertIn(["sent@email.com", "a@email.com", "b@email.com"], [call[0][1] for call in deliver.call_args_list])
+        self.assertEqual(OutboundEmail.objects.filter(status="sent").count(), 3)
+
+    def test_rejected_group_split(self):
+        OutboundEmail.objects.all().delete()
+        queue_bulk_email("<p>Sent</p>", ["a@email.com", "bad@email.com", "c@email.com"], "Hello")
+
+        def deliver(content, emails, subject):
+            return [mock.Mock(status_code=400 if "bad@email.com" in emails else 202, text="")]
+
+        with mock.patch("edudream.modules.outbox.deliver_bulk_email", side_effect=deliver):
+            self.assertEqual(process_outbox(), 3)
+        statuses = dict(OutboundEmail.objects.values_list("email", "status"))
+        self.assertEqual(statuses, {"a@email.com": "sent", "bad@email.com": "failed", "c@email.com": "sent"})
+
+
+@mock.patch("urllib3.util.retry.time.sleep")
+class TestHttpClientTestCase(TestCase):
+    def setUp(self):
+        http_client.sessions.clear()
+        http_client.metrics.clear()
+
+    @staticmethod
+    def fake_response(status_code):
+        return urllib3.HTTPResponse(body=io.BytesIO(b"{}"), status=status_code, preload_content=False)
+
+    def test_idempotent_request_retried(self, sleep):
+        responses = [self.fake_response(503), self.fake_response(200)]
+        with mock.patch("urllib3.connectionpool.HTTPConnectionPool._make_request", side_effect=responses) as request:
+            response = http_client.http_request("zoom", "GET", "http://zoom.test/meetings")
+        self.assertEqual((response.status_code, request.call_count), (200, 2))
+        timeout = request.call_args.kwargs["timeout"]
+        self.assertEqual((timeout.connect_timeout, timeout.read_timeout), (5, 30))
+        self.assertEqual(http_client.get_http_metrics()["zoom"]["errors"], 0)
+        # One keep-alive session per host
+        self.assertIs(http_client.get_session("http://zoom.test/a"), http_client.get_session("http://zoom.test/b"))
+
+    def test_post_not_retried_on_server_error(self, sleep):
+        with mock.patch("urllib3.connectionpool.HTTPConnectionPool._make_request",
+                        return_value=self.fake_response(503)) as request:
+            response = http_client.http_request("zoom", "POST", "http://zoom.test/meetings", data="{}")
+        self.assertEqual((response.status_code, request.call_count), (503, 1))
+        self.assertEqual(http_client.get_http_metrics()["zoom"]["errors"], 1)
+
+    def test_timeout_raises_after_retries(self, sleep):
+        timeout = urllib3.exceptions.ReadTimeoutError(None, "/meetings", "Read timed out")
+        with mock.patch("urllib3.connectionpool.HTTPConnectionPool._make_request", side_effect=timeout) as request:
+            with self.assertRaises(requests.RequestException):
+                http_client.http_request("zoom", "GET", "http://zoom.test/meetings")
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(http_client.get_http_metrics()["zoom"]["errors"], 1)
+        # The second retry backs off with jitter around backoff_factor * 2
+        self.assertTrue(0.5 <= sleep.call_args.args[0] <= 1.5)
+
+
+class TestSiteSettingCacheTestCase(TestCase):
+    def setUp(self):
+        clear_site_details_cache()
+
+    def test_site_details_are_cached_until_saved(self):
+        site = get_site_details()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_site_details().coin_threshold, site.coin_threshold)
+        setting = SiteSetting.objects.get(id=site.id)
+        setting.coin_threshold = 10
+        setting.save()
+        self.assertEqual(get_site_details().coin_threshold, 10)
+
+    @override_settings(ESCROW_SETTLE_SECONDS=0)
+    def test_escrow_ledger(self):
+        site = get_site_details()
+        adjust_escrow_balance(50, "Class accepted")
+        adjust_escrow_balance(-20, "Class cancelled")
+        self.assertEqual(get_escrow_balance(), 30)
+        self.assertEqual(SiteSetting.objects.get(id=site.id).escrow_balance, 0)
+        self.assertEqual(materialize_escrow_balance(), 2)
+        self.assertEqual(materialize_escrow_balance(), 0)
+        self.assertEqual(SiteSetting.objects.get(id=site.id).escrow_balance, 30)
+        adjust_escrow_balance(5)
+        self.assertEqual(get_escrow_balance(), 35)
+
+        # An entry still inside the settle window holds back newer ids, even those with an older created_on
+        EscrowEntry.objects.filter(amount=5).update(created_on=timezone.now() + timezone.timedelta(minutes=5))
+        adjust_escrow_balance(7)
+        self.assertEqual(materialize_escrow_balance(), 0)
+        EscrowEntry.objects.filter(amount=5).update(created_on=timezone.now())
+        self.assertEqual(materialize_escrow_balance(), 2)
+        self.assertEqual(SiteSetting.objects.get(id=site.id).escrow_balance, 42)
+
+
+class TestWalletServiceTestCase(TestCase):
+    def setUp(self):
+        self.parent = User.objects.create(username="parent@email.com")
+        self.tutor = User.objects.create(username="tutor@email.com")
+        Wallet.objects.create(user=self.parent, balance=100)
+        Wallet.objects.create(user=self.tutor)
+
+    def test_conditional_debit(self):
+        self.assertTrue(wallet.debit(self.parent, 60, destination="escrow"))
+        self.assertFalse(wallet.debit(self.parent, 60, destination="escrow"))
+        self.assertEqual(Wallet.objects.get(user=self.parent).balance, 40)
+        self.assertEqual(LedgerEntry.objects.filter(user=self.parent, source="balance", destination="escrow").count(), 1)
+
+    def test_bulk_post(self):
+        postings = [
+            wallet.Posting(self.tutor.id, 30, "escrow", "pending", None, "Class fee"),
+            wallet.Posting(self.tutor.id, 20, "escrow", "pending", None, "Class fee"),
+            wallet.Posting(self.parent.id, 10, "balance", "pending", None, "Test"),
+        ]
+        with self.assertNumQueries(4):
+            self.assertEqual(wallet.bulk_post(postings), 3)
+        self.assertEqual(Wallet.objects.get(user=self.tutor).pending, 50)
+        parent_wallet = Wallet.objects.get(user=self.parent)
+        self.assertEqual((parent_wallet.balance, parent_wallet.pending), (90, 10))
+        self.assertEqual(LedgerEntry.objects.count(), 3)
+
+        Wallet.objects.filter(user=self.tutor).delete()
+        with self.assertRaises(ValueError):
+            wallet.bulk_post(postings)
+        self.assertEqual(Wallet.objects.get(user=self.parent).balance, 90)
+        self.assertEqual(LedgerEntry.objects.count(), 3)
+
+
+    @mock.patch("edudream.modules.utils.StripeAPI.retrieve_payment_intent", return_value={"status": "succeeded"})
+    def test_payment_completed_with_credit(self, retrieve_payment_intent):
+        Profile.objects.create(user=self.parent, account_type="parent", referral_code="PARENT")
+        plan = PaymentPlan.objects.create(name="Plan", amount=10, coin=25)
+        trans = Transaction.objects.create(user=self.parent, plan=plan, amount=10, reference="pi_1")
+        Wallet.objects.filter(user=self.parent).delete()
+        # Without a wallet nothing is completed, so a later verify can still credit the coins
+        self.assertEqual(complete_payment("pi_1"), (False, "Wallet not found"))
+        self.assertEqual(Transaction.objects.get(id=trans.id).status, "pending")
+
+        Wallet.objects.create(user=self.parent)
+        self.assertEqual(complete_payment("pi_1"), (True, "Payment updated"))
+        self.assertEqual(Transaction.objects.get(id=trans.id).status, "completed")
+        self.assertEqual(Wallet.objects.get(user=self.parent).balance, 25)
+
+
+class TestClassroomSettlementTestCase(TestCase):
+    def setUp(self):
+        self.tutor = User.objects.create(username="tutor@email.com")
+        Wallet.objects.create(user=self.tutor)
+        for amount in (30, 20):
+            Classroom.objects.create(name="Class", tutor=self.tutor, amount=amount, status="completed")
+
+    @mock.patch("edudream.modules.cron.send_fund_main_balance_email")
+    @mock.patch("edudream.modules.cron.send_fund_pending_balance_email")
+    def test_settlement_is_idempotent(self, pending_email, main_email):
+        with self.captureOnCommitCallbacks(execute=True):
+            class_fee_to_tutor_pending_balance_job()
+            class_fee_to_tutor_pending_balance_job()
+        self.assertEqual(Wallet.objects.get(user=self.tutor).pending, 50)
+        self.assertEqual(EscrowEntry.objects.count(), 2)
+        self.assertEqual(pending_email.call_count, 2)
+
+        Classroom.objects.update(tutor_payment_expected=timezone.now())
+        with self.captureOnCommitCallbacks(execute=True):
+            process_pending_balance_to_main_job()
+            process_pending_balance_to_main_job()
+        tutor_wallet = Wallet.objects.get(user=self.tutor)
+        self.assertEqual((tutor_wallet.balance, tutor_wallet.pending), (50, 0))
+        self.assertEqual(Classroom.objects.filter(tutor_paid=True).count(), 2)
+        self.assertEqual(main_email.call_count, 2)
+
+
+class TestJobRunnerTestCase(TestCase):
+    def setUp(self):
+        tutor = User.objects.create(username="tutor@email.com")
+        Wallet.objects.create(user=tutor)
+        Classroom.objects.create(name="Class", tutor=tutor, amount=30, status="completed")
+
+    def test_run_records_job(self):
+        run = run_job("pending-balance")
+        self.assertEqual((run.status, run.rows_processed), ("success", 1))
+        self.assertNotIn("pending-balance", get_due_jobs())
+
+    def test_dry_run_rolls_back(self):
+        run = run_job("pending-balance", dry_run=True)
+        self.assertEqual((run.status, run.rows_processed, run.dry_run), ("success", 1, True))
+        self.assertFalse(Classroom.objects.filter(pending_balance_paid=True).exists())
+        self.assertEqual(Wallet.objects.get(user__username="tutor@email.com").pending, 0)
+        with self.assertRaises(ValueError):
+            run_job("payout", dry_run=True)
+        with self.assertRaises(ValueError):
+            run_job("ended-classroom", dry_run=True)
+
+    @override_settings(CRON_SECRET="secret")
+    def test_cron_view_queues_job(self):
+        run_job("pending-balance")
+        self.assertNotIn("pending-balance", get_due_jobs())
+        with override_settings(CRON_SECRET=None):
+            self.assertEqual(self.client.get(reverse("home:pending-balance")).status_code, status.HTTP_401_UNAUTHORIZED)
+        for _ in range(2):
+            self.client.get(reverse("home:pending-balance"), headers={"X-Cron-Secret": "secret"})
+        # Nothing ran in the request, the run_jobs process picks the queued job up
+        self.assertEqual(JobRun.objects.filter(job="pending-balance", status="queued").count(), 1)
+        self.assertIn("pending-balance", get_due_jobs())
+        run_job("pending-balance")
+        self.assertNotIn("pending-balance", get_due_jobs())
+
+    def test_old_runs_pruned(self):
+        JobRun.objects.create(job="payout", status="success", started_on=timezone.now() - timezone.timedelta(days=60))
+        run = run_job("job-run-cleanup")
+        self.assertEqual((run.status, run.rows_processed), ("success", 1))
+        self.assertEqual(list(JobRun.objects.values_list("job", flat=True)), ["job-run-cleanup"])
+
+    def test_overlapping_run_skipped(self):
+        with job_lock("pending-balance") as acquired:
+            self.assertTrue(acquired)
+            run = run_job("pending-balance")
+        self.assertEqual(run.status, "skipped")
+        self.assertFalse(Classroom.objects.filter(pending_balance_paid=True).exists())
+        self.assertEqual(run_job("pending-balance").status, "success")
+        self.assertEqual(JobRun.objects.filter(job="pending-balance").count(), 2)
+
+
+class TestDashboardStatTestCase(TestCase):
+    def setUp(self):
+        self.tutor = User.objects.create(username="tutor@email.com")
+        Profile.objects.create(user=self.tutor, account_type="tutor", referral_code="TUTOR")
+        parent_user = User.objects.create(username="parent@email.com")
+        parent = Profile.objects.create(user=parent_user, account_type="parent", referral_code="PARENT")
+        student = Student.objects.create(user=User.objects.create(username="student@email.com"), parent=parent)
+        ended = timezone.now() - timezone.timedelta(hours=1)
+        for class_status in ["accepted"] * 8 + ["completed", "cancelled"]:
+            Classroom.objects.create(
+                name="Class", tutor=self.tutor, student=student, status=class_status, end_date=ended
+            )
+
+    def test_tutor_stat(self):
+        serializer = UserSerializerOut(context={"request": RequestFactory().get("/")})
+        with self.assertNumQueries(5):
+            stat = serializer.get_stat(self.tutor)
+        self.assertEqual(
+            (stat["active_classes"], stat["completed_classes"], stat["cancelled_classes"], stat["total_subject"]),
+            (8, 1, 1, 0)
+        )
+        self.assertEqual(len(stat["ended_classes"]), 5)
+        self.assertEqual(len(stat["awaiting_approval"]), 5)
+
+    @mock.patch("edudream.modules.cron.auto_classroom_complete_email")
+    @mock.patch("edudream.modules.cron.send_fund_pending_balance_email")
+    def test_counters_follow_changes(self, pending_email, complete_email):
+        Wallet.objects.create(user=self.tutor)
+        classroom = Classroom.objects.filter(status="cancelled").first()
+        classroom.status = "accepted"
+        classroom.amount = 40
+        classroom.save()
+        Classroom.objects.filter(status="accepted").update(tutor_complete_check=True)
+        update_ended_classroom_jobs()
+        class_fee_to_tutor_pending_balance_job()
+        tutor_stats = UserStats.objects.get(user=self.tutor)
+        self.assertEqual((tutor_stats.active_classes, tutor_stats.completed_classes), (0, 10))
+        user_ids = list(User.objects.values_list("id", flat=True))
+        self.assertEqual(verify_user_stats(user_ids), [])
+
+    def test_distinct_counters_on_create(self):
+        student = Student.objects.get()
+        other_tutor = User.objects.create(username="other@email.com")
+        maths, physics = Subject.objects.create(name="Maths"), Subject.objects.create(name="Physics")
+        with mock.patch("home.signals.refresh_user_stats") as refresh_user_stats:
+            for tutor, subject in ((self.tutor, maths), (other_tutor, maths), (other_tutor, physics)):
+                Classroom.objects.create(name="Class", tutor=tutor, student=student, subjects=subject)
+        refresh_user_stats.assert_not_called()
+        parent_stats = UserStats.objects.get(user=student.parent.user)
+        self.assertEqual((parent_stats.total_tutor, parent_stats.total_subject), (2, 2))
+
+        classroom = Classroom.objects.filter(subjects=physics).get()
+        classroom.tutor = self.tutor
+        classroom.save()
+        user_ids = list(User.objects.values_list("id", flat=True))
+        self.assertEqual(verify_user_stats(user_ids), [])
+
+
+class TestRoleAuthenticationTestCase(TestCase):
+    def setUp(self):
+        parent_user = User.objects.create(username="parent@email.com")
+        parent = Profile.objects.create(user=parent_user, account_type="parent", email_verified=True)
+        self.student_user = User.objects.create(username="student@email.com")
+        Student.objects.create(user=self.student_user, parent=parent)
+
+    def test_roles_resolved_with_user(self):
+        token = str(AccessToken.for_user(self.student_user))
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        with self.assertNumQueries(1):
+            user, _ = RoleJWTAuthentication().authenticate(request)
+        request.user = user
+        with self.assertNumQueries(0):
+            self.assertTrue(IsStudent().has_permission(request, None))
+            self.assertFalse(IsParent().has_permission(request, None))
+            self.assertFalse(IsTutor().has_permission(request, None))
+            self.assertEqual(get_account_type(user), "student")
+
+    def test_role_claims_trusted_until_roles_change(self):
+        token = str(RoleAccessToken.for_user(self.student_user))
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        with self.assertNumQueries(1):
+            request.user, _ = RoleJWTAuthentication().authenticate(request)
+        with self.assertNumQueries(0):
+            self.assertTrue(IsStudent().has_permission(request, None))
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.filter(user=self.student_user).delete()
+        request.user, _ = RoleJWTAuthentication().authenticate(request)
+        self.assertFalse(IsStudent().has_permission(request, None))
+
+    def test_role_users_deleted(self):
+        tutor_user = User.objects.create(username="tutor@email.com")
+        TutorDetail.objects.create(user=tutor_user, bio="Bio")
+        user_ids = [self.student_user.id, tutor_user.id]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.student_user.delete()
+            tutor_user.delete()
+        connection.check_constraints()
+        self.assertFalse(TokenVersion.objects.filter(user_id__in=user_ids).exists())
+
+
+class TestChatListTestCase(TestCase):
+    def setUp(self):
+        self.parent = User.objects.create(username="parent@email.com")
+        profile = Profile.objects.create(user=self.parent, account_type="parent", referral_code="PARENT")
+        student = Student.objects.create(user=User.objects.create(username="student@email.com"), parent=profile)
+        for index in range(3):
+            tutor = User.objects.create(username=f"tutor{index}@email.com", first_name=f"Tutor{index}")
+            Profile.objects.create(user=tutor, account_type="tutor", referral_code=f"TUTOR{index}")
+            Classroom.objects.create(name="Class", tutor=tutor, student=student, status="accepted")
+            ChatMessage.objects.create(sender=tutor, receiver=self.parent, message=f"Hello {index}")
+        self.tutor = tutor
+
+    def test_chat_list(self):
+        ChatMessage.objects.create(sender=self.parent, receiver=self.tutor, message="Hi")
+        header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.parent)}"}
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("home:chat-list"), headers=header)
+        data = response.json()["data"]["results"]
+        self.assertEqual(len(data), 3)
+        self.assertEqual((data[0]["user_id"], data[0]["last_message"], data[0]["unread_count"]), (self.tutor.id, "Hi", 1))
+
+    def test_chat_history_read_watermark(self):
+        ChatMessage.objects.create(sender=self.parent, receiver=self.tutor, message="Hi")
+        header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.parent)}"}
+        response = self.client.get(reverse("home:chat"), {"receiver_id": self.tutor.id}, headers=header)
+        messages = response.json()["data"]["results"]
+        self.assertEqual([(item["message"], item["read"]) for item in messages], [("Hi", False), ("Hello 2", True)])
+        self.assertEqual(Conversation.objects.get(user=self.parent, counterpart=self.tutor).unread_count, 0)
+        self.assertEqual(Conversation.objects.get(user=self.tutor, counterpart=self.parent).unread_count, 1)
+        # Read state lives on the watermark, the messages themselves are not rewritten
+        self.assertFalse(ChatMessage.objects.filter(read=True).exists())
+
+    def test_search_does_not_move_watermark(self):
+        ChatMessage.objects.create(sender=self.tutor, receiver=self.parent, message="Homework")
+        header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.parent)}"}
+        self.client.get(reverse("home:chat"), {"receiver_id": self.tutor.id, "search": "Homework"}, headers=header)
+        self.assertEqual(Conversation.objects.get(user=self.parent, counterpart=self.tutor).unread_count, 2)
+
+        message = ChatMessage.objects.filter(receiver=self.parent, message="Hello 2").get()
+        mark_conversation_read(self.parent.id, self.tutor.id, message.id)
+        self.assertEqual(Conversation.objects.get(user=self.parent, counterpart=self.tutor).unread_count, 1)
+
+
+class TestRealtimeTestCase(TestCase):
+    def setUp(self):
+        self.sender = User.objects.create(username="sender@email.com")
+        self.receiver = User.objects.create(username="receiver@email.com")
+
+    def test_message_pushed_on_commit(self):
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(get_user_group(self.receiver.id), channel)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            message = ChatMessage.objects.create(sender=self.sender, receiver=self.receiver, message="Hello")
+        self.assertEqual(len(callbacks), 1)
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual((event["event"], event["data"]["id"]), ("chat_message", message.id))
+
+    def test_anonymous_connection_rejected(self):
+        async def connect():
+            communicator = WebsocketCommunicator(ClassroomConsumer.as_asgi(), "/webclassroom/")
+            connected, _ = await communicator.connect()
+            await communicator.disconnect()
+            return connected
+
+        self.assertFalse(async_to_sync(connect)())
+
+
+class TestNotificationTestCase(TestCase):
+    def setUp(self):
+        self.parent = User.objects.create(username="parent@email.com")
+        Profile.objects.create(user=self.parent, account_type="parent", referral_code="PARENT")
+        self.tutor = User.objects.create(username="tutor@email.com")
+        Profile.objects.create(user=self.tutor, account_type="tutor", referral_code="TUTOR")
+
+    def test_broadcast_merged_at_read(self):
+        serializer = NotificationSerializerIn(data={"message": "Hello parents", "send_type": "parent"})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertFalse(Notification.user.through.objects.exists())
+        create_notification(self.parent, "Direct")
+
+        url = reverse("home:notification")
+        header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.parent)}"}
+        results = self.client.get(url, headers=header).json()["data"]["results"]
+        self.assertEqual([(item["message"], item["read"]) for item in results], [("Direct", False), ("Hello parents", False)])
+        results = self.client.get(url, {"readall": "true"}, headers=header).json()["data"]["results"]
+        self.assertEqual([item["read"] for item in results], [True, True])
+
+        header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.tutor)}"}
+        self.assertEqual(self.client.get(url, headers=header).json()["data"]["results"], [])
+
+    def test_read_state_per_recipient(self):
+        serializer = NotificationSerializerIn(data={"message": "Hello", "users": [self.parent.id, self.tutor.id]})
+        serializer.is_valid(raise_exception=True)
+        notification_id = serializer.save()["id"]
+        url = reverse("home:notification-unread-count")
+        parent_header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.parent)}"}
+        tutor_header = {"Authorization": f"Bearer {RoleAccessToken.for_user(self.tutor)}"}
+        self.assertEqual(self.client.get(url, headers=parent_header).json()["data"]["unread_count"], 1)
+
+        self.client.get(reverse("home:notification-detail", args=[notification_id]), headers=parent_header)
+        self.assertEqual(self.client.get(url, headers=parent_header).json()["data"]["unread_count"], 0)
+        self.assertEqual(self.client.get(url, headers=tutor_header).json()["data"]["unread_count"], 1)
+        self.assertEqual(verify_user_stats([self.parent.id, self.tutor.id]), [])
+
+
+class TestTutorSearchTestCase(TestCase):
+    def setUp(self):
+        self.maths = Subject.objects.create(name="Mathématiques", grade="high_school")
+        physics = Subject.objects.create(name="Physics", grade="mid_school")
+        self.tutors = dict()
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, subjects in (("Ada", [self.maths, physics]), ("Mathew", [physics]), ("Bob", [self.maths])):
+                user = User.objects.create(username=f"{name}@email.com", first_name=name, last_name="Tutor")
+                self.tutors[name] = Profile.objects.create(
+                    user=user, account_type="tutor", active=True, referral_code=name
+                )
+                Wallet.objects.create(user=user)
+                TutorDetail.objects.create(user=user, bio="Bio", diploma_type="bachelor")
+                for subject in subjects:
+                    TutorSubject.objects.create(user=user, subject=subject)
+
+    def test_ranked_search_with_facets(self):
+        self.assertEqual(TutorSearchDocument.objects.count(), 3)
+        # Whole word "math" is in no document, "mathematiques" and "mathew" match by prefix
+        profile_ids, facets = search_tutors("math", {})
+        self.assertEqual(set(profile_ids), {profile.id for profile in self.tutors.values()})
+        self.assertEqual(facets["subject"], {self.maths.id: 2, self.maths.id + 1: 2})
+
+        profile_ids, facets = search_tutors("mathematiques ada", {})
+        self.assertEqual(profile_ids, [self.tutors["Ada"].id])
+        profile_ids, facets = search_tutors("mathematiques", {"grade": "high_school"})
+        self.assertEqual(profile_ids, [self.tutors["Bob"].id, self.tutors["Ada"].id])
+        self.assertEqual(facets["grade"], {"high_school": 2, "mid_school": 1})
+
+        response = self.client.get(reverse("home:tutors"), {"search": "mathew"}).json()["data"]
+        self.assertEqual([item["id"] for item in response["results"]], [self.tutors["Mathew"].id])
+        self.assertEqual(response["facets"]["diploma_type"], {"bachelor": 1})
+
+        # A listing without search words is paged in SQL, facets are left out above the row limit
+        with override_settings(TUTOR_SEARCH_FACET_ROWS=2):
+            response = self.client.get(reverse("home:tutors")).json()["data"]
+        self.assertEqual((response["count"], response["facets"]), (3, {}))
 
+        with mock.patch("home.signals.refresh_tutor_documents") as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                for day in ("mon", "tue"):
+                    TutorCalendar.objects.create(user=self.tutors["Ada"].user, day_of_the_week=day)
+                self.tutors["Ada"].user.save(update_fields=["last_login"])
+        refresh.assert_called_once_with({self.tutors["Ada"].user_id})
 
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tutors["Bob"].account_type = "parent"
+            self.tutors["Bob"].save()
+        self.assertEqual(search_tutors("mathematiques", {})[0], [self.tutors["Ada"].id])
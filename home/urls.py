@@ -28,6 +28,7 @@ urlpatterns = [
     path('subjects', views.SubjectListAPIView.as_view(), name="subjects"),
     path('notification', views.NotificationAPIView.as_view(), name="notification"),
     path('notification/<int:pk>', views.NotificationAPIView.as_view(), name="notification-detail"),
+    path('notification/unread-count', views.NotificationUnreadCountAPIView.as_view(), name="notification-unread-count"),
     path('upload-avatar', views.UploadProfilePictureAPIView.as_view(), name="upload-avatar"),
     path('feedback', views.FeedBackAndConsultationAPIView.as_view(), name="feedback"),
     path('testimonials', views.TestimonialListAPIView.as_view(), name="testimonial"),
@@ -44,6 +45,8 @@ urlpatterns = [
     path('pending-balance', views.UpdateTutorPendingBalanceCronAPIView.as_view(), name="pending-balance"),
     path('main-balance', views.UpdateTutorMainBalanceCronAPIView.as_view(), name="main-balance"),
     path('ended-classroom', views.UpdateEndedClassroomCronAPIView.as_view(), name="ended-classroom"),
+    path('escrow-balance', views.EscrowBalanceCronAPIView.as_view(), name="escrow-balance"),
+    path('translation-cache', views.TranslationCacheCleanupCronAPIView.as_view(), name="translation-cache"),
     # path('payout', views.PayoutProcessingCronAPIView.as_view(), name="payout"),
 
     # WEBHOOK
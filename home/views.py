@@ -2,7 +2,7 @@ import ast
 import json
 import random
 
-from django.db.models import Q
+from django.db.models import Q, F
 from django.http import HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
@@ -11,23 +11,29 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.generics import ListAPIView
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework.filters import SearchFilter
 
-from edudream.modules.cron import zoom_login_refresh, payout_cron_job, class_reminder_job, \
-    class_fee_to_tutor_pending_balance_job, process_pending_balance_to_main_job, update_ended_classroom_jobs
+from edudream.modules.authentication import RoleAccessToken
+from edudream.modules.chat import mark_conversation_read, get_read_watermarks
 from edudream.modules.exceptions import raise_serializer_error_msg
-from edudream.modules.paginations import CustomPagination
-from edudream.modules.permissions import IsTutor, IsParent, IsStudent
+from edudream.modules.notifications import get_user_notifications, with_read_state, mark_notifications_read, \
+    get_unread_count
+from edudream.modules.paginations import CustomPagination, ChatCursorPagination, NotificationCursorPagination
+from edudream.modules.permissions import IsTutor, IsParent, IsStudent, HasCronSecret
+from edudream.modules.scheduler import queue_job
+from edudream.modules.search import search_tutors
+from edudream.modules.stats import get_user_stats
 from edudream.modules.utils import complete_payment, get_site_details, translate_to_language, \
     get_current_datetime_from_lat_lon
-from home.models import Profile, Transaction, ChatMessage, PaymentPlan, Language, Subject, Notification, Testimonial
+from home.models import Profile, Transaction, ChatMessage, PaymentPlan, Language, Subject, Testimonial, \
+    Conversation
 from home.serializers import SignUpSerializerIn, LoginSerializerIn, UserSerializerOut, ProfileSerializerIn, \
     ChangePasswordSerializerIn, TransactionSerializerOut, ChatMessageSerializerIn, ChatMessageSerializerOut, \
     PaymentPlanSerializerOut, ClassReviewSerializerIn, TutorListSerializerOut, LanguageSerializerOut, \
-    SubjectSerializerOut, NotificationSerializerOut, UploadProfilePictureSerializerIn, \
+    SubjectSerializerOut, UserNotificationSerializerOut, UploadProfilePictureSerializerIn, \
     FeedbackAndConsultationSerializerIn, TestimonialSerializerOut, RequestOTPSerializerIn, ForgotPasswordSerializerIn, \
-    EmailVerificationSerializerIn, RequestVerificationLinkSerializerIn, UpdateEndedClassroomSerializerIn
+    EmailVerificationSerializerIn, RequestVerificationLinkSerializerIn, UpdateEndedClassroomSerializerIn, \
+    ConversationSerializerOut
 from location.models import Country
 from tutor.models import Classroom, TutorBankAccount
 from tutor.serializers import ClassRoomSerializerOut
@@ -66,7 +72,7 @@ class LoginAPIView(APIView):
         return Response({
             "detail": translate_to_language("Login Successful", request.data.get("lang", "en")),
             "data": UserSerializerOut(user, context={"request": request}).data,
-            "access_token": f"{AccessToken.for_user(user)}",
+            "access_token": f"{RoleAccessToken.for_user(user)}",
             "timezone_data": {
                 "timezone": tzone, "current_time": ctime, "utc_offset": utc_offset
             }
@@ -167,7 +173,7 @@ class PaymentHistoryAPIView(APIView, CustomPagination):
 
 # @extend_schema_view(get=extend_schema(parameters=[
 #     OpenApiParameter(name='receiver_id', type=str), OpenApiParameter(name='search', type=str)]))
-class ChatMessageAPIView(APIView, CustomPagination):
+class ChatMessageAPIView(APIView, ChatCursorPagination):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(request=ChatMessageSerializerIn, responses={status.HTTP_201_CREATED})
@@ -178,21 +184,29 @@ class ChatMessageAPIView(APIView, CustomPagination):
         return Response({"detail": response})
 
     @extend_schema(
-        parameters=[OpenApiParameter(name="receiver_id", type=str), OpenApiParameter(name="search", type=str)]
+        description="Messages newest first, paged by cursor: data holds next, previous and results, and there is "
+                    "no count or page parameter. Follow next for older messages. Before this change the history "
+                    "was oldest first with page-number pages (count, page). Clients should read the list in "
+                    "reverse and request pages through next. Only the first page without search marks the "
+                    "conversation read.",
+        parameters=[OpenApiParameter(name="receiver_id", type=str), OpenApiParameter(name="search", type=str),
+                    OpenApiParameter(name="cursor", type=str), OpenApiParameter(name="page_size", type=int)]
     )
     def get(self, request):
         receiver_id = request.GET.get("receiver_id")
         search = request.GET.get("search")
         lang = request.GET.get("lang", "en")
         sender = request.user
-        # Fetch messages
-        query = Q(sender_id__in=[sender.id, receiver_id], receiver_id__in=[receiver_id, sender.id])
+        # Fetch messages, newest first, older pages through the cursor
+        query = Q(sender_id=sender.id, receiver_id=receiver_id) | Q(sender_id=receiver_id, receiver_id=sender.id)
         if search:
             query &= Q(message__icontains=search)
-        messages = ChatMessage.objects.filter(query).distinct().order_by("created_on")
-        messages.update(read=True)
-        queryset = self.paginate_queryset(messages, request)
-        serializer = ChatMessageSerializerOut(queryset, many=True, context={"request": request}).data
+        queryset = self.paginate_queryset(ChatMessage.objects.filter(query), request)
+        # Only the unfiltered newest page moves the read watermark, a search or older page skips messages
+        if queryset and not search and not request.GET.get(self.cursor_query_param):
+            mark_conversation_read(sender.id, receiver_id, max(message.id for message in queryset))
+        context = {"request": request, "read_watermarks": get_read_watermarks(sender.id, receiver_id)}
+        serializer = ChatMessageSerializerOut(queryset, many=True, context=context).data
         response = self.get_paginated_response(serializer).data
         return Response({"detail": translate_to_language("Chat retrieved"), "data": response})
 
@@ -237,6 +251,7 @@ class TutorListAPIView(APIView, CustomPagination):
 
     @extend_schema(
         parameters=[OpenApiParameter(name="search", type=str), OpenApiParameter(name="country", type=str),
+                    OpenApiParameter(name="subject", type=int),
                     OpenApiParameter(name="grade", type=str), OpenApiParameter(name="diploma_type", type=str),
                     OpenApiParameter(name="university_name", type=str)]
     )
@@ -249,8 +264,6 @@ class TutorListAPIView(APIView, CustomPagination):
         university_name = request.GET.get("university_name")  # university_name
         lang = request.GET.get("lang", "en")
 
-        query = Q(account_type="tutor", active=True)
-
         if pk:
             try:
                 user_p = Profile.objects.get(account_type="tutor", active=True, user_id=pk)
@@ -258,27 +271,18 @@ class TutorListAPIView(APIView, CustomPagination):
                 return Response({"detail": translate_to_language("Tutor not found")})
             return Response(TutorListSerializerOut(user_p, context={"request": request}).data)
 
-        if search:
-            # school_subject_name = [item for item in Subject.objects.filter(name__iexact=search)]
-            query &= Q(user__first_name__icontains=search) | Q(user__last_name__icontains=search)
-                     # Q(user__tutorsubject__subject__in=school_subject_name)
-        if subject:
-            query &= Q(user__tutorsubject__subject_id=subject)
-
-        if country:
-            query &= Q(country_id=country)
-        if grade:
-            school_grade_subject = [item for item in Subject.objects.filter(grade__iexact=grade)]
-            # query &= Q(user__tutordetail__subjects__in=school_grade_subject)
-            query &= Q(user__tutorsubject__subject__in=school_grade_subject)
-        if diploma_type:
-            query &= Q(user__tutordetail__diploma_type__iexact=diploma_type)
-        if university_name:
-            query &= Q(user__tutordetail__university_name__icontains=university_name)
-
-        queryset = self.paginate_queryset(Profile.objects.filter(query).order_by("-id").distinct(), request)
+        # Ranked profile ids and facet counts come from the search documents, only the page's profiles are loaded
+        filters = {
+            "subject": subject, "country": country, "grade": grade, "diploma_type": diploma_type,
+            "university_name": university_name
+        }
+        profile_ids, facets = search_tutors(search, filters)
+        page = self.paginate_queryset(profile_ids, request)
+        profiles = Profile.objects.filter(id__in=page).select_related("user").in_bulk()
+        queryset = [profiles[profile_id] for profile_id in page if profile_id in profiles]
         serializer = TutorListSerializerOut(queryset, many=True, context={"request": request}).data
         response = self.get_paginated_response(serializer).data
+        response["facets"] = facets
         return Response({"detail": translate_to_language("Tutor retrieved"), "data": response})
 
 
@@ -297,26 +301,31 @@ class SubjectListAPIView(ListAPIView):
     search_fields = ["name", "grade"]
 
 
-class NotificationAPIView(APIView, CustomPagination):
+class NotificationAPIView(APIView, NotificationCursorPagination):
     permission_classes = [IsAuthenticated]
 
     @extend_schema(parameters=[OpenApiParameter(name="readall", type=str)])
     def get(self, request, pk=None):
         readall = request.GET.get("readall")
         lang = request.GET.get("lang", "en")
-        query = Notification.objects.filter(user__in=[request.user])
-        if pk:
-            query = Notification.objects.filter(id=pk, user__in=[request.user])
-            query.update(read=True)
-        if readall:
-            query.update(read=True)
+        notifications = get_user_notifications(request.user)
+        if pk or readall:
+            mark_notifications_read(request.user, notifications.filter(id=pk) if pk else notifications)
 
-        queryset = self.paginate_queryset(Notification.objects.filter(user__in=[request.user]).order_by("-id"), request)
-        serializer = NotificationSerializerOut(queryset, many=True).data
+        queryset = self.paginate_queryset(with_read_state(notifications, request.user), request)
+        serializer = UserNotificationSerializerOut(queryset, many=True).data
         response = self.get_paginated_response(serializer).data
         return Response({"detail": translate_to_language("Success"), "data": response})
 
 
+class NotificationUnreadCountAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        unread_count = get_unread_count(request.user, get_user_stats(request.user.id))
+        return Response({"detail": translate_to_language("Success"), "data": {"unread_count": unread_count}})
+
+
 class UploadProfilePictureAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -353,7 +362,7 @@ class TutorClassroomListAPIView(ListAPIView):
 
     def get_queryset(self):
         tutor_id = self.request.GET.get("tutor_id")
-        return Classroom.objects.filter(tutor_id=tutor_id)
+        return Classroom.objects.for_listing().filter(tutor_id=tutor_id).order_by("-id")
 
 
 class RequestOTPView(APIView):
@@ -379,94 +388,18 @@ class ForgotPasswordView(APIView):
         return Response({"detail": response})
 
 
-class ChatListAPIView(APIView):
+class ChatListAPIView(APIView, CustomPagination):
     permission_classes = [IsAuthenticated & (IsStudent | IsTutor | IsParent)]
 
     def get(self, request):
-        # Get all users logged in user can chat with
-        result = list()
-        if IsParent:
-            all_classroom = Classroom.objects.filter(status__in=["accepted", "completed", "cancelled"],
-                                                     student__parent__user=request.user)
-            for tut in all_classroom:
-                message = None
-                date_created = None
-                if ChatMessage.objects.filter(sender_id__in=[request.user.id, tut.tutor_id],
-                                              receiver_id__in=[request.user.id, tut.tutor_id]).exists():
-                    chat = ChatMessage.objects.filter(sender_id__in=[request.user.id, tut.tutor_id],
-                                                      receiver_id__in=[request.user.id, tut.tutor_id]).last()
-                    message = str(chat.message)
-                    date_created = chat.created_on
-                image = None
-                if tut.tutor.profile.profile_picture:
-                    image = request.build_absolute_uri(tut.tutor.profile.profile_picture.url)
-                user_data = {
-                    "user_id": tut.tutor_id,
-                    "name": tut.tutor.get_full_name(),
-                    "image": image,
-                    "last_message": message or "",
-                    "date": date_created
-                }
-                user_id_exists = any(d["user_id"] == user_data["user_id"] for d in result)
-
-                if not user_id_exists:
-                    result.append(user_data)
-
-        if IsStudent:
-            all_classroom = Classroom.objects.filter(status__in=["accepted", "completed", "cancelled"],
-                                                     student__user=request.user)
-            for tut in all_classroom:
-                message = None
-                date_created = None
-                if ChatMessage.objects.filter(sender_id__in=[request.user.id, tut.tutor_id],
-                                              receiver_id__in=[request.user.id, tut.tutor_id]).exists():
-                    chat = ChatMessage.objects.filter(sender_id__in=[request.user.id, tut.tutor_id],
-                                                      receiver_id__in=[request.user.id, tut.tutor_id]).last()
-                    message = str(chat.message)
-                    date_created = chat.created_on
-                image = None
-                if tut.tutor.profile.profile_picture:
-                    image = request.build_absolute_uri(tut.tutor.profile.profile_picture.url)
-                user_data = {
-                    "user_id": tut.tutor_id,
-                    "name": tut.tutor.get_full_name(),
-                    "image": image,
-                    "last_message": message or "",
-                    "date": date_created
-                }
-                user_id_exists = any(d["user_id"] == user_data["user_id"] for d in result)
-
-                if not user_id_exists:
-                    result.append(user_data)
-
-        if IsTutor:
-            all_classroom = Classroom.objects.filter(status__in=["accepted", "completed", "cancelled"],
-                                                     tutor=request.user)
-            for stu in all_classroom:
-                message = None
-                date_created = None
-                if ChatMessage.objects.filter(sender_id__in=[request.user.id, stu.student.user_id],
-                                              receiver_id__in=[request.user.id, stu.student.user_id]).exists():
-                    chat = ChatMessage.objects.filter(sender_id__in=[request.user.id, stu.student.user_id],
-                                                      receiver_id__in=[request.user.id, stu.student.user_id]).last()
-                    date_created = chat.created_on
-                    message = str(chat.message)
-                image = None
-                if stu.student.profile_picture:
-                    image = request.build_absolute_uri(stu.student.profile_picture.url)
-                user_data = {
-                    "user_id": stu.student.user_id,
-                    "name": stu.student.user.get_full_name(),
-                    "image": image,
-                    "last_message": message or "",
-                    "date": date_created
-                }
-                user_id_exists = any(d["user_id"] == user_data["user_id"] for d in result)
-
-                if not user_id_exists:
-                    result.append(user_data)
-
-        return Response({"detail": "Success", "data": result})
+        # Users the logged in user can chat with, most recent conversation first
+        conversations = Conversation.objects.filter(user=request.user).select_related(
+            "last_message", "counterpart__profile", "counterpart__student"
+        ).order_by(F("last_message_on").desc(nulls_last=True), "-id")
+        queryset = self.paginate_queryset(conversations, request)
+        serializer = ConversationSerializerOut(queryset, many=True, context={"request": request}).data
+        response = self.get_paginated_response(serializer).data
+        return Response({"detail": "Success", "data": response})
 
 
 class UpdateEndedClassroomAPIView(APIView):
@@ -483,56 +416,67 @@ class UpdateEndedClassroomAPIView(APIView):
 
 # CRON API VIEWS
 class RefreshZoomTokenCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        from edudream.modules.utils import get_site_details, encrypt_text
-        d_site = get_site_details()
-        response = zoom_login_refresh()
-        access_token = response["access_token"]
-        d_site.zoom_token = encrypt_text(access_token)
-        d_site.save()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("zoom-refresh")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class PayoutProcessingCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        payout_cron_job()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("payout")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class ClassEventReminderCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        class_reminder_job()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("reminder")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class UpdateTutorPendingBalanceCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        class_fee_to_tutor_pending_balance_job()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("pending-balance")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class UpdateTutorMainBalanceCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        process_pending_balance_to_main_job()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("main-balance")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class UpdateEndedClassroomCronAPIView(APIView):
-    permission_classes = []
+    permission_classes = [HasCronSecret]
+
+    def get(self, request):
+        queue_job("ended-classroom")
+        return JsonResponse({"detail": "Cron Queued"})
+
+
+class EscrowBalanceCronAPIView(APIView):
+    permission_classes = [HasCronSecret]
+
+    def get(self, request):
+        queue_job("escrow-balance")
+        return JsonResponse({"detail": "Cron Queued"})
+
+
+class TranslationCacheCleanupCronAPIView(APIView):
+    permission_classes = [HasCronSecret]
 
     def get(self, request):
-        update_ended_classroom_jobs()
-        return JsonResponse({"detail": "Cron Ran Successfully"})
+        queue_job("translation-cache")
+        return JsonResponse({"detail": "Cron Queued"})
 
 
 class WebhookAPIView(APIView):
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class LocationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'location'
+
+    def ready(self):
+        # Compile the translation catalog once per process instead of on first request
+        from edudream.modules.translator import get_translation_catalog
+        get_translation_catalog()
@@ -1,3 +1,68 @@
+from unittest import mock
+
 from django.test import TestCase
 
-# Create your tests here.
+from edudream.modules.translator import TranslationCatalog, Translate
+from edudream.modules.utils import translate_to_language, translate_email_template
+
+
+class TestTranslationCatalogTestCase(TestCase):
+    def setUp(self):
+        self.catalog = TranslationCatalog([
+            {"msgid": "Success", "fr": "Succès"},
+            {"msgid": "Tutor not found", "fr": "Tuteur introuvable"},
+            {"msgid": "Tutor not found", "fr": "Tuteur non trouvé"},
+        ])
+
+    def test_lookup_and_fallback(self):
+        self.assertEqual(self.catalog.get("Success", "fr"), "Succès")
+        self.assertEqual(self.catalog.get("Success", "fr-CA"), "Succès")
+        self.assertEqual(self.catalog.get("Success", "en"), "Success")
+        self.assertEqual(self.catalog.get("Success", "es"), "Success")
+        # Last duplicate wins, as with the previous list scan
+        self.assertEqual(self.catalog.get("Tutor not found", "fr"), "Tuteur non trouvé")
+
+    def test_miss_is_reported(self):
+        self.assertEqual(self.catalog.get("Unknown string", "fr"), "Unknown string")
+        self.catalog.get("Unknown string", "fr")
+        self.assertEqual(self.catalog.missing(), [(("Unknown string", "fr"), 2)])
+
+    def test_translate_to_language(self):
+        self.assertEqual(translate_to_language("Success", "en"), "Success")
+        self.assertNotEqual(translate_to_language("Success", "fr"), "Success")
+
+
+class TestTranslationCacheTestCase(TestCase):
+    def test_repeated_texts_are_translated_once(self):
+        with mock.patch.object(Translate, "request_deepl_translation", side_effect=lambda lang, texts, tag_handling=None: [f"fr:{text}" for text in texts]) as deepl:
+            first = Translate.translate_deepl_cached("fr", ["Hello", "Bye", "Hello"])
+            second = Translate.translate_deepl_cached("fr", ["Bye", "Hello"])
+        self.assertEqual(first, ["fr:Hello", "fr:Bye", "fr:Hello"])
+        self.assertEqual(second, ["fr:Bye", "fr:Hello"])
+        deepl.assert_called_once_with("fr", ["Hello", "Bye"], None)
+
+    def test_failed_translation_is_not_cached(self):
+        with mock.patch.object(Translate, "request_deepl_translation", return_value=None) as deepl:
+            self.assertEqual(Translate.translate_deepl_cached("fr", ["Hello"]), ["Hello"])
+            Translate.translate_deepl_cached("fr", ["Hello"])
+        self.assertEqual(deepl.call_count, 2)
+
+
+class TestEmailTemplateTranslationTestCase(TestCase):
+    def fake_deepl(self, lang, texts, tag_handling=None):
+        return [text.replace("Dear", "Cher").replace("Class Name", "Nom de la classe") for text in texts]
+
+    def test_static_text_is_translated_once(self):
+        template = "Dear {first_name}, <br>Class Name: <strong>{class_name}</strong>"
+        with mock.patch.object(Translate, "request_deepl_translation", side_effect=self.fake_deepl) as deepl:
+            first = translate_email_template(template, "fr", first_name="Ada", class_name="Maths")
+            second = translate_email_template(template, "fr", first_name="Bola", class_name="{Physics}")
+        self.assertEqual(first, "Cher Ada, <br>Nom de la classe: <strong>Maths</strong>")
+        self.assertEqual(second, "Cher Bola, <br>Nom de la classe: <strong>{Physics}</strong>")
+        self.assertEqual(deepl.call_count, 1)
+        self.assertIn('<span translate="no">{first_name}</span>', deepl.call_args[0][1][0])
+
+    def test_english_is_not_translated(self):
+        with mock.patch.object(Translate, "request_deepl_translation") as deepl:
+            self.assertEqual(translate_email_template("Dear {name}", "en", name="Ada"), "Dear Ada")
+        deepl.assert_not_called()
@@ -79,7 +79,7 @@ class ParentStudentClassRoomAPIView(APIView, CustomPagination):
     def get(self, request, pk=None):
         lang = request.GET.get("lang", "en")
         if pk:
-            item = get_object_or_404(Classroom, id=pk, student__parent__user=request.user)
+            item = get_object_or_404(Classroom.objects.for_listing(), id=pk, student__parent__user=request.user)
             response = ClassRoomSerializerOut(item, context={"request": request}).data
         else:
             class_status = request.GET.get("status")
@@ -101,9 +101,10 @@ class ParentStudentClassRoomAPIView(APIView, CustomPagination):
                 # query &= Q(start_date__range=[date_from, date_to])
                 query &= Q(start_date__gte=date_from, start_date__lte=date_to)
 
-            queryset = self.paginate_queryset(Classroom.objects.filter(query).order_by("-id"), request)
+            classrooms = Classroom.objects.for_listing().filter(query)
             if class_status == "accepted":
-                queryset = self.paginate_queryset(Classroom.objects.filter(query).exclude(student_complete_check=True).order_by("-id"), request)
+                classrooms = classrooms.exclude(student_complete_check=True)
+            queryset = self.paginate_queryset(classrooms.order_by("-id"), request)
             serializer = ClassRoomSerializerOut(queryset, many=True, context={"request": request}).data
             response = self.get_paginated_response(serializer).data
         return Response({"detail": translate_to_language("Success"), "data": response})
@@ -3,7 +3,6 @@ from threading import Thread
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import check_password, make_password
-from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.utils import timezone
 from rest_framework import serializers
@@ -12,8 +11,9 @@ from edudream.modules.choices import SEND_NOTIFICATION_TYPE_CHOICES, APPROVE_OR_
     ADD_SUBTRACT_ACTION_CHOICES
 from edudream.modules.email_template import tutor_status_email
 from edudream.modules.exceptions import InvalidRequestException
+from edudream.modules import wallet
 from edudream.modules.stripe_api import StripeAPI
-from edudream.modules.utils import decrypt_text, get_site_details
+from edudream.modules.utils import decrypt_text, adjust_escrow_balance, get_escrow_balance
 from home.models import Notification, Transaction, SiteSetting
 from home.serializers import TutorListSerializerOut, NotificationSerializerOut
 from tutor.serializers import PayoutSerializerOut, DisputeSerializerOut
@@ -66,28 +66,15 @@ class NotificationSerializerIn(serializers.Serializer):
         message = validated_data.get("message")
         send_type = validated_data.get("send_type")
 
-        if not send_type and users:
+        if not send_type and not users:
             raise InvalidRequestException({"detail": "Either list of user or send type is required"})
 
-        if send_type == "all":
-            users_list = [user.id for user in User.objects.all()]
-        elif send_type == "parent":
-            users_list = [parent.id for parent in User.objects.filter(profile__account_type="parent")]
-        elif send_type == "tutor":
-            users_list = [tutor.id for tutor in User.objects.filter(profile__account_type="tutor")]
-        elif send_type == "student":
-            users_list = [student.id for student in User.objects.filter(student__isnull=False)]
-        else:
-            users_list = users
-
+        # Broadcasts are stored once, users receive them through their audience when they read notifications
         notification, created = Notification.objects.get_or_create(
-            message=message, users_type=send_type, admin_initiated=True
+            message=message, users_type=send_type, audience=send_type or None, admin_initiated=True
         )
-
-        if users_list:
-            notification.user.clear()
-            for user_id in users_list:
-                notification.user.add(user_id)
+        if not send_type:
+            notification.user.set(users)
 
         return NotificationSerializerOut(notification).data
 
@@ -163,6 +150,11 @@ class DisputeStatusUpdateSerializerIn(serializers.Serializer):
 
 
 class SiteSettingSerializerOut(serializers.ModelSerializer):
+    escrow_balance = serializers.SerializerMethodField()
+
+    def get_escrow_balance(self, obj):
+        return get_escrow_balance()
+
     class Meta:
         model = SiteSetting
         exclude = ["site", "google_calendar_id", "google_redirect_url", "zoom_token"]
@@ -185,7 +177,11 @@ class UpdateSiteSettingsSerializerIn(serializers.Serializer):
         instance.class_grace_period = validated_data.get("class_grace_period", instance.class_grace_period)
         instance.intro_call_duration = validated_data.get("intro_call_duration", instance.intro_call_duration)
         instance.enquiry_email = validated_data.get("enquiry_email", instance.enquiry_email)
-        instance.save()
+        # Leave escrow_balance and zoom_token alone, they are updated concurrently elsewhere
+        instance.save(update_fields=[
+            "site_name", "coin_threshold", "referral_coin", "payout_coin_to_amount", "class_grace_period",
+            "intro_call_duration", "enquiry_email"
+        ])
         return SiteSettingSerializerOut(instance, context={"request": self.context.get("request")}).data
 
 
@@ -197,24 +193,21 @@ class WalletBalanceUpdateSerializerIn(serializers.Serializer):
         action = validated_data.get("action")
         amount = decimal.Decimal(validated_data.get("amount"))
 
-        site_detail = get_site_details()
         if action == "add":
-            # Subtract from escrow balance and credit user wallet
-            site_detail.escrow_balance -= amount
-            instance.balance += amount
             # Create transaction
-            Transaction.objects.create(
+            refund = Transaction.objects.create(
                 user=instance.user, transaction_type="refund", amount=amount, status="completed",
                 narration="Dispute resolution from admin"
             )
+            # Subtract from escrow balance and credit user wallet
+            adjust_escrow_balance(-amount, "Dispute resolution from admin", transaction=refund)
+            wallet.credit(instance.user, amount, source="escrow", transaction=refund, narration="Dispute resolution from admin")
             # Create Notification
         else:
             # Subtract from user wallet and credit escrow balance
-            instance.balance -= amount
-            site_detail.escrow_balance += amount
+            wallet.debit(instance.user, amount, destination="escrow", narration="Wallet debit from admin", check_funds=False)
+            adjust_escrow_balance(amount, "Wallet debit from admin")
             # Create Notification
-        instance.save()
-        site_detail.save()
         return "Wallet balance updated"
 
 
@@ -8,9 +8,12 @@ from rest_framework.generics import ListAPIView, CreateAPIView, RetrieveUpdateDe
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import AccessToken
 
+from edudream.modules.authentication import RoleAccessToken
 from edudream.modules.exceptions import raise_serializer_error_msg
+from edudream.modules.http_client import get_http_metrics
+from edudream.modules.outbox import outbox_depth
+from edudream.modules.scheduler import get_job_stats
 from edudream.modules.paginations import AdminPagination
 from home.models import Profile, ClassReview, PaymentPlan, Language, Notification, SiteSetting, Subject, Wallet
 from home.serializers import ProfileSerializerOut, TutorListSerializerOut, ClassReviewSerializerOut, \
@@ -43,6 +46,9 @@ class DashboardAPIView(APIView):
         data["recent_parents"] = ProfileSerializerOut(
             parents.filter(user__tutordetail__isnull=True).order_by("-id")[:10], many=True, context={"request": request}).data
         data["recent_students"] = ParentStudentSerializerOut(students.order_by("-id")[:10], many=True, context={"request": request}).data
+        data["email_queue"] = outbox_depth()
+        data["integrations"] = get_http_metrics()
+        data["jobs"] = get_job_stats()
         return Response({"detail": "Success", "data": data})
 
 
@@ -110,7 +116,7 @@ class AdminLoginAPIView(APIView):
         serializer = AdminLoginSerializerIn(data=request.data, context={"request": request})
         serializer.is_valid() or raise_serializer_error_msg(errors=serializer.errors, language=request.data.get("lang", "en"))
         user = serializer.save()
-        return Response({"detail": "Login Successful",  "access_token": f"{AccessToken.for_user(user)}"})
+        return Response({"detail": "Login Successful",  "access_token": f"{RoleAccessToken.for_user(user)}"})
 
 
 class ParentListAPIView(APIView, AdminPagination):
@@ -157,7 +163,7 @@ class ClassRoomListAPIView(APIView, AdminPagination):
         # amount_to = request.GET.get("amount_to")
 
         if pk:
-            queryset = get_object_or_404(Classroom, id=pk)
+            queryset = get_object_or_404(Classroom.objects.for_listing(), id=pk)
             serializer = ClassRoomSerializerOut(queryset, context={"request": request}).data
             return Response({"detail": "Success", "data": serializer})
 
@@ -176,7 +182,9 @@ class ClassRoomListAPIView(APIView, AdminPagination):
         # if amount_to and amount_from:
         #     query &= Q()
 
-        queryset = self.paginate_queryset(Classroom.objects.filter(query).order_by("-id").distinct(), request)
+        queryset = self.paginate_queryset(
+            Classroom.objects.for_listing().filter(query).order_by("-id").distinct(), request
+        )
         serializer = ClassRoomSerializerOut(queryset, many=True, context={"request": request}).data
         response = self.get_paginated_response(serializer).data
         return Response({"detail": "Success", "data": response})
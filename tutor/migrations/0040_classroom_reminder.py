@@ -0,0 +1,49 @@
+# Generated by Django 4.2.6 on 2026-10-18 11:24
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_upcoming_classrooms(apps, schema_editor):
+    # Past classes are left alone. Reminders already due were handled by the old job, so each class starts at its
+    # next future reminder instead of being sent a stale one, e.g. a class in progress only gets the "ended" reminder
+    classroom = apps.get_model("tutor", "Classroom")
+    now = timezone.now()
+    classrooms = classroom.objects.filter(status__in=["new", "accepted"], end_date__gte=now).exclude(start_date=None)
+    updated = list()
+    for class_room in classrooms.iterator():
+        if class_room.status == "new":
+            # Unattended classes are still declined on the first run
+            class_room.next_reminder_at = max(class_room.start_date, now)
+        else:
+            reminders = [
+                (reminder, class_room.start_date - timezone.timedelta(minutes=minutes))
+                for reminder, minutes in (("start_60", 60), ("start_15", 15), ("start_0", 0))
+            ] + [("ended", class_room.end_date)]
+            sent = [reminder for reminder, remind_at in reminders if remind_at <= now]
+            class_room.last_reminder = sent[-1] if sent else None
+            # The "ended" reminder is never in the past here, the query only keeps classes that have not ended
+            class_room.next_reminder_at = reminders[len(sent)][1]
+        updated.append(class_room)
+    classroom.objects.bulk_update(updated, ["last_reminder", "next_reminder_at"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0039_tutordetail_nationality_back_file_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classroom',
+            name='last_reminder',
+            field=models.CharField(blank=True, choices=[('start_60', '60 Minutes To Start'), ('start_15', '15 Minutes To Start'), ('start_0', 'Starting'), ('ended', 'Ended'), ('unattended', 'Unattended')], max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='classroom',
+            name='next_reminder_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(schedule_upcoming_classrooms, migrations.RunPython.noop),
+    ]
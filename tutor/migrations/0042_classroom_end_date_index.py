@@ -0,0 +1,18 @@
+# Generated by Django 4.2.6 on 2026-10-18 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tutor', '0041_payout_processing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='classroom',
+            name='end_date',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -1,9 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 from edudream.modules.choices import DISPUTE_TYPE_CHOICES, DISPUTE_STATUS_CHOICES, CLASS_STATUS_CHOICES, \
     AVAILABILITY_STATUS_CHOICES, DAY_OF_THE_WEEK_CHOICES, PAYOUT_STATUS_CHOICES, CLASS_TYPE_CHOICES, \
-    TUTOR_STATUS_CHOICES
+    TUTOR_STATUS_CHOICES, CLASS_REMINDER_CHOICES
 from location.models import Country
 from student.models import Student
 
@@ -42,6 +43,12 @@ class TutorDetail(models.Model):
         return f"{self.user.username}"
 
 
+class ClassroomQuerySet(models.QuerySet):
+    def for_listing(self):
+        # Everything ClassRoomSerializerOut reads, so a page of classrooms costs one query
+        return self.select_related("student__user", "student__parent", "tutor__profile", "subjects")
+
+
 class Classroom(models.Model):
     name = models.CharField(max_length=200)
     description = models.CharField(max_length=300, blank=True, null=True)
@@ -49,7 +56,7 @@ class Classroom(models.Model):
     # parent = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="parent")
     student = models.ForeignKey(Student, related_name="class_student", on_delete=models.SET_NULL, blank=True, null=True)
     start_date = models.DateTimeField(blank=True, null=True)
-    end_date = models.DateTimeField(blank=True, null=True)
+    end_date = models.DateTimeField(blank=True, null=True, db_index=True)
     expected_duration = models.IntegerField(blank=True, null=True)
     amount = models.DecimalField(default=0, decimal_places=2, max_digits=20)
     status = models.CharField(max_length=50, choices=CLASS_STATUS_CHOICES, default="new")
@@ -63,12 +70,44 @@ class Classroom(models.Model):
     pending_balance_paid = models.BooleanField(default=False)
     tutor_payment_expected = models.DateTimeField(blank=True, null=True)
     tutor_paid = models.BooleanField(default=False)
+    last_reminder = models.CharField(max_length=20, choices=CLASS_REMINDER_CHOICES, blank=True, null=True)
+    next_reminder_at = models.DateTimeField(blank=True, null=True, db_index=True)
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
+    objects = ClassroomQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.tutor.username}: {self.name} - {self.amount}"
 
+    def get_reminders(self):
+        # Reminders still to be sent, in the order they fall due
+        reminders = list()
+        if self.status == "new" and self.start_date:
+            reminders.append(("unattended", self.start_date))
+        if self.status == "accepted":
+            if self.start_date:
+                for reminder, minutes in (("start_60", 60), ("start_15", 15), ("start_0", 0)):
+                    reminders.append((reminder, self.start_date - timezone.timedelta(minutes=minutes)))
+            if self.end_date:
+                reminders.append(("ended", self.end_date))
+        names = [reminder for reminder, _ in reminders]
+        if self.last_reminder in names:
+            reminders = reminders[names.index(self.last_reminder) + 1:]
+        return reminders
+
+    def schedule_reminder(self):
+        reminders = self.get_reminders()
+        self.next_reminder_at = reminders[0][1] if reminders else None
+
+    def pop_due_reminder(self, now):
+        # Only the latest due reminder is sent, a "60 minutes" reminder is pointless once the class has started
+        due = [reminder for reminder, remind_at in self.get_reminders() if remind_at <= now]
+        if due:
+            self.last_reminder = due[-1]
+        self.schedule_reminder()
+        return self.last_reminder if due else None
+
 
 class ClassDocument(models.Model):
     tutor = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -141,6 +180,9 @@ class PayoutRequest(models.Model):
     amount = models.DecimalField(default=0, decimal_places=2, max_digits=20)
     reference = models.CharField(max_length=300, blank=True, null=True)
     status = models.CharField(max_length=100, choices=PAYOUT_STATUS_CHOICES, default="pending")
+    attempts = models.IntegerField(default=0)
+    locked_on = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True, null=True)
     created_on = models.DateTimeField(auto_now_add=True)
     updated_on = models.DateTimeField(auto_now=True)
 
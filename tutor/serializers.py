@@ -2,7 +2,7 @@ import datetime
 import decimal
 from threading import Thread
 
-from django.db.models import Sum
+from django.db import transaction as db_transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from rest_framework import serializers
@@ -14,9 +14,11 @@ from edudream.modules.email_template import tutor_class_creation_email, parent_c
     student_class_cancel_email, parent_low_threshold_email, payout_request_email, parent_intro_call_email, \
     tutor_intro_call_email
 from edudream.modules.exceptions import InvalidRequestException
+from edudream.modules import wallet
+from edudream.modules.stats import get_user_stats
 from edudream.modules.stripe_api import StripeAPI
 from edudream.modules.utils import get_site_details, encrypt_text, decrypt_text, mask_number, log_request, \
-    create_notification, translate_to_language, get_current_datetime_from_lat_lon
+    create_notification, translate_to_language, get_current_datetime_from_lat_lon, adjust_escrow_balance
 from home.models import Subject, Transaction, Profile, ChatMessage
 from location.models import Country
 from student.models import Student
@@ -33,24 +35,12 @@ class TutorDetailSerializerOut(serializers.ModelSerializer):
     future_payments = serializers.SerializerMethodField()
 
     def get_future_payments(self, obj):
-        uncleared = Classroom.objects.filter(
-            tutor=obj.user, status="completed", pending_balance_paid=False
-        ).aggregate(Sum("amount"))["amount__sum"] or 0
-        active = Classroom.objects.filter(
-            tutor=obj.user, status="accepted"
-        ).aggregate(Sum("amount"))["amount__sum"] or 0
-        return {"uncleared": uncleared, "active_orders": active}
+        stats = get_user_stats(obj.user_id)
+        return {"uncleared": stats.uncleared_amount, "active_orders": stats.active_class_amount}
 
     def get_total_withdrawals(self, obj):
-        data = dict()
-        if PayoutRequest.objects.filter(user=obj.user).exists():
-            payout = PayoutRequest.objects.filter(user=obj.user, status="processed")
-            data["amount"] = payout.aggregate(Sum("amount"))["amount__sum"] or 0
-            data["count"] = payout.count()
-        else:
-            data["amount"] = 0
-            data["count"] = 0
-        return data
+        stats = get_user_stats(obj.user_id)
+        return {"amount": stats.withdrawal_amount, "count": stats.withdrawal_count}
 
     def get_proficiency_test_file(self, obj):
         request = self.context.get("request")
@@ -287,6 +277,9 @@ class ApproveDeclineClassroomSerializerIn(serializers.Serializer):
         d_site = get_site_details()
 
         if action == "accept":
+            # Checked before the meeting is created, the debit below stays the check that counts
+            if parent_wallet.balance < amount:
+                raise InvalidRequestException({"detail": translate_to_language("Insufficient balance, please top-up wallet", lang)})
             # Generate meeting link
             # meeting_id = str(uuid.uuid4())
             tutor_email = instance.tutor.email
@@ -299,30 +292,30 @@ class ApproveDeclineClassroomSerializerIn(serializers.Serializer):
                            {"name": str(tutor_name), "email": str(tutor_email)}], narration=instance.description,
                 title=instance.name
             )
+            if response is None:
+                raise InvalidRequestException({"detail": translate_to_language("Unable to create meeting, please try again later", lang)})
             zoom_meeting_id = response["id"]
             link = response["join_url"]
             instance.status = "accepted"
             instance.meeting_link = link
             instance.meeting_id = zoom_meeting_id
-            # Debit parent wallet
-            parent_wallet.refresh_from_db()
-            parent_wallet.balance -= amount
-            parent_wallet.save()
+            with db_transaction.atomic():
+                # Create transaction
+                course_payment = Transaction.objects.create(
+                    user=parent, transaction_type="course_payment", amount=amount, narration=instance.description,
+                    status="completed"
+                )
+                # Debit parent wallet into escrow, only if the balance still covers the class
+                if not wallet.debit(parent, amount, destination="escrow", transaction=course_payment, narration="Class accepted"):
+                    raise InvalidRequestException({"detail": translate_to_language("Insufficient balance, please top-up wallet", lang)})
+                # Add amount to Escrow Balance
+                adjust_escrow_balance(amount, "Class accepted", instance, course_payment)
             # Check parent new wallet balance and compare coin threshold
             parent_wallet.refresh_from_db()
             if parent_wallet.balance < d_site.coin_threshold:
                 # Send low coin threshold email to parent
                 Thread(target=parent_low_threshold_email, args=[parent, parent_wallet.balance, lang]).start()
 
-            # Add amount to Escrow Balance
-            d_site.refresh_from_db()
-            d_site.escrow_balance += amount
-            d_site.save()
-            # Create transaction
-            Transaction.objects.create(
-                user=parent, transaction_type="course_payment", amount=amount, narration=instance.description,
-                status="completed"
-            )
             # Send meeting link to student
             Thread(target=student_class_approved_email, args=[instance, lang]).start()
             # Send notification to parent
@@ -338,24 +331,20 @@ class ApproveDeclineClassroomSerializerIn(serializers.Serializer):
                 raise InvalidRequestException({"detail": translate_to_language("You can only cancel class request you recently accepted", lang)})
             # Cancel class
             instance.status = "cancelled"
-            # Subtract amount from Escrow Balance
-            d_site.refresh_from_db()
-            d_site.escrow_balance -= amount
-            d_site.save()
-            # Refund parent coin
-            parent_wallet.refresh_from_db()
-            parent_wallet.balance += amount
-            parent_wallet.save()
+            with db_transaction.atomic():
+                # Create refund transaction
+                refund = Transaction.objects.create(
+                    user=parent, transaction_type="refund", amount=amount, narration=f"Refund, {instance.description}",
+                    status="completed"
+                )
+                # Subtract amount from Escrow Balance and refund parent coin
+                adjust_escrow_balance(-amount, "Class cancelled", instance, refund)
+                wallet.credit(parent, amount, source="escrow", transaction=refund, narration="Class cancelled")
             # Set Tutor Availability
             instance.tutorcalendar_set.all().update(status="available")
             for tutor_calendar in instance.tutorcalendar_set.all():
                 tutor_calendar.classroom.clear()
             # TutorCalendar.objects.filter(classroom=instance).update(status="available")
-            # Create refund transaction
-            Transaction.objects.create(
-                user=parent, transaction_type="refund", amount=amount, narration=f"Refund, {instance.description}",
-                status="completed"
-            )
             # Notify parent and student
             Thread(target=parent_class_cancel_email, args=[parent, amount, lang]).start()
             Thread(target=student_class_cancel_email, args=[student, lang]).start()
@@ -470,20 +459,23 @@ class TutorCalendarSerializerIn(serializers.Serializer):
         # Delete all user's availability
         # if TutorCalendar.objects.filter(status="not_available").exists():
         #     raise InvalidRequestException({"detail": "There are existing/open classes. Please close or complete them"})
-        TutorCalendar.objects.filter(user=user).delete()
-
-        # Create availability
-        try:
-            for item in data_list:
-                week_day = item.get("week_day")
-                start_period = item.get("start_time")
-                end_period = item.get("end_time")
-                avail_status = item.get("status")
-                TutorCalendar.objects.create(
-                    user=user, day_of_the_week=week_day, time_from=start_period, time_to=end_period, status=avail_status
-                )
-        except Exception as err:
-            log_request(f"Error while adding calendar: {err}")
+        # One transaction, so the tutor's search document is rebuilt once after all the slots are written
+        with db_transaction.atomic():
+            TutorCalendar.objects.filter(user=user).delete()
+
+            # Create availability
+            try:
+                for item in data_list:
+                    week_day = item.get("week_day")
+                    start_period = item.get("start_time")
+                    end_period = item.get("end_time")
+                    avail_status = item.get("status")
+                    TutorCalendar.objects.create(
+                        user=user, day_of_the_week=week_day, time_from=start_period, time_to=end_period,
+                        status=avail_status
+                    )
+            except Exception as err:
+                log_request(f"Error while adding calendar: {err}")
 
         # Check if time within a day already exists
         # if TutorCalendar.objects.filter(user=user, day_of_the_week=week_day).exclude(
@@ -600,7 +592,6 @@ class RequestPayoutSerializerIn(serializers.Serializer):
 
         bank_acct = get_object_or_404(TutorBankAccount, user=user, id=bank_acct_id)
         # Check if user balance is enough for withdrawal request
-        user_wallet.refresh_from_db()
         coin = user_wallet.balance
         payout_ratio = get_site_details().payout_coin_to_amount
         amount = decimal.Decimal(coin) * payout_ratio
@@ -611,10 +602,8 @@ class RequestPayoutSerializerIn(serializers.Serializer):
                 "data": {"name": str(user.get_full_name()).upper(), "wallet_balance": user_wallet.balance,
                          "coin_to_withdraw": coin, "amount_equivalent": amount}
             }
-        # Create Payout Request
         if amount < 1:
             raise InvalidRequestException({"detail": translate_to_language("Amount too low. Minimum payout amount is One Euro", lang)})
-        payout = PayoutRequest.objects.create(user=user, bank_account=bank_acct, coin=coin, amount=amount)
 
         # Subtract payout coin from balance
         balance = StripeAPI.get_account_balance()
@@ -628,20 +617,26 @@ class RequestPayoutSerializerIn(serializers.Serializer):
 
         narration = f"EduDream Payout of EUR{amount} to {user.get_full_name()}"
 
+        # Create Transaction and subtract coin before moving money, a concurrent request cannot withdraw it twice
+        trans = Transaction.objects.create(user=user, transaction_type="withdrawal", amount=amount, narration=narration)
+        if not wallet.debit(user, coin, destination="external", transaction=trans, narration="Payout request"):
+            trans.status = "failed"
+            trans.save()
+            raise InvalidRequestException({"detail": translate_to_language("Insufficient balance", lang)})
+
         # Process Transfer
-        response = StripeAPI.transfer_to_connect_account(amount=amount, acct=stripe_connect_account_id, desc=narration)
-        transfer_trx_ref = response.get("id")
-        user_wallet.refresh_from_db()
-        # Subtract Coin
-        user_wallet.balance -= coin
-        user_wallet.save()
-
-        # Create Transaction
-        trans = Transaction.objects.create(
-            user=user, transaction_type="withdrawal", amount=amount, narration=narration, reference=transfer_trx_ref
-        )
-        payout.transaction = trans
-        payout.save()
+        try:
+            response = StripeAPI.transfer_to_connect_account(amount=amount, acct=stripe_connect_account_id, desc=narration)
+        except Exception:
+            # Return the coin, nothing left the platform
+            wallet.credit(user, coin, source="external", transaction=trans, narration="Payout request reversed")
+            trans.status = "failed"
+            trans.save()
+            raise
+        trans.reference = response.get("id")
+        trans.save()
+        # Create Payout Request
+        payout = PayoutRequest.objects.create(user=user, bank_account=bank_acct, coin=coin, amount=amount, transaction=trans)
 
         # Send Email to user
         Thread(target=payout_request_email, args=[user, lang]).start()
@@ -763,6 +758,8 @@ class IntroCallSerializerIn(serializers.Serializer):
                        {"name": str(tutor_name), "email": str(tutor_email)}], narration=f"Intro call {tutor_name}",
             title=f"Intro call with {tutor_name}"
         )
+        if response is None:
+            raise InvalidRequestException({"detail": translate_to_language("Unable to create meeting, please try again later", lang)})
         link = response["join_url"]
         # Send invitation link to tutor, parent and/or student and create in-app notification
         if link is not None:
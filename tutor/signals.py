@@ -0,0 +1,9 @@
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from tutor.models import Classroom
+
+
+@receiver(pre_save, sender=Classroom)
+def classroom_pre_save(sender, instance, **kwargs):
+    instance.schedule_reminder()
@@ -1,13 +1,22 @@
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from unittest import mock
+
+import stripe
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 
-from home.models import Profile, Wallet
+from home.models import Profile, Wallet, Subject, UserStats, Transaction, LedgerEntry
 from location.models import Country
 from student.models import Student
-from tutor.models import TutorDetail, TutorBankAccount, TutorCalendar
+from edudream.modules.cron import class_reminder_job
+from edudream.modules.payouts import process_payouts
+from tutor.models import TutorDetail, TutorBankAccount, TutorCalendar, Classroom, PayoutRequest
 
 
 class TestStudentTestCase(TestCase):
@@ -62,3 +71,138 @@ class TestStudentTestCase(TestCase):
         response = self.client.post(url, data, headers=header_data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+
+class TestClassReminderTestCase(TestCase):
+    def setUp(self):
+        self.tutor = User.objects.create(username="tutor@email.com", email="tutor@email.com")
+        parent_user = User.objects.create(username="parent@email.com", email="parent@email.com")
+        student_user = User.objects.create(username="student@email.com", email="student@email.com")
+        parent = Profile.objects.create(user=parent_user, account_type="parent")
+        self.student = Student.objects.create(user=student_user, parent=parent)
+
+    def create_classroom(self, start_in, status="accepted"):
+        start_date = timezone.now() + timezone.timedelta(minutes=start_in)
+        return Classroom.objects.create(
+            name="Class", tutor=self.tutor, student=self.student, status=status, start_date=start_date,
+            end_date=start_date + timezone.timedelta(minutes=60)
+        )
+
+    def run_job(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            class_reminder_job()
+
+    @mock.patch("edudream.modules.cron.send_class_reminder_email")
+    def test_due_reminder_sent_once(self, reminder_email):
+        classroom = self.create_classroom(10)
+        self.assertEqual(classroom.next_reminder_at, classroom.start_date - timezone.timedelta(minutes=60))
+        self.run_job()
+        self.run_job()
+        # The 60 minute reminder is skipped once the 15 minute one is due
+        reminder_email.assert_called_once_with(self.student.user, mock.ANY, 15, "fr")
+        classroom.refresh_from_db()
+        self.assertEqual((classroom.last_reminder, classroom.next_reminder_at), ("start_15", classroom.start_date))
+
+    @mock.patch("edudream.modules.cron.student_class_declined_email")
+    def test_unattended_class_declined(self, declined_email):
+        classroom = self.create_classroom(-1, status="new")
+        self.create_classroom(120, status="new")
+        self.run_job()
+        classroom.refresh_from_db()
+        self.assertEqual((classroom.status, classroom.next_reminder_at), ("declined", None))
+        self.assertEqual(declined_email.call_count, 1)
+
+    def test_ended_classes_released_incrementally(self):
+        ended = self.create_classroom(-65, status="completed")
+        old = self.create_classroom(-60 * 48, status="completed")
+        calendar = TutorCalendar.objects.create(user=self.tutor, status="not_available")
+        old_calendar = TutorCalendar.objects.create(user=self.tutor, status="not_available")
+        calendar.classroom.add(ended)
+        old_calendar.classroom.add(old)
+        self.run_job()
+        calendar.refresh_from_db()
+        old_calendar.refresh_from_db()
+        self.assertEqual((calendar.status, calendar.classroom.count()), ("available", 0))
+        # The first run reaches back to the oldest class still holding a calendar
+        self.assertEqual((old_calendar.status, old_calendar.classroom.count()), ("available", 0))
+        # Classes that ended before the watermark are not scanned again
+        old_calendar.classroom.add(old)
+        self.run_job()
+        self.assertEqual(old_calendar.classroom.count(), 1)
+
+
+class TestPayoutProcessingTestCase(TestCase):
+    def setUp(self):
+        for index in range(3):
+            user = User.objects.create(username=f"tutor{index}@email.com")
+            Profile.objects.create(
+                user=user, account_type="tutor", stripe_connect_account_id=f"acct_{index}", referral_code=f"REF{index}"
+            )
+            Wallet.objects.create(user=user)
+            bank_account = TutorBankAccount.objects.create(user=user, bank_name="Bank", stripe_external_account_id=f"ba_{index}")
+            trans = Transaction.objects.create(user=user, transaction_type="withdrawal", amount=10)
+            PayoutRequest.objects.create(user=user, bank_account=bank_account, transaction=trans, coin=10, amount=10)
+
+    @mock.patch("edudream.modules.payouts.send_payout_processed_email")
+    @mock.patch("edudream.modules.payouts.StripeAPI.payout_to_external_account")
+    def test_outcome_recorded_per_payout(self, payout_to_external_account, processed_email):
+        def payout(amount, acct, stripe_acct, idempotency_key):
+            if acct == "ba_1":
+                raise stripe.error.InvalidRequestError("No such external account", "destination", http_status=400)
+            if acct == "ba_2":
+                raise stripe.error.APIConnectionError("Network error")
+            return {"id": f"po_{idempotency_key}", "failure_message": None}
+
+        payout_to_external_account.side_effect = payout
+        self.assertEqual(process_payouts(workers=2), 1)
+        statuses = dict(PayoutRequest.objects.values_list("bank_account__stripe_external_account_id", "status"))
+        self.assertEqual(statuses, {"ba_0": "processed", "ba_1": "failed", "ba_2": "pending"})
+        processed = PayoutRequest.objects.get(status="processed")
+        self.assertEqual(processed.reference, f"po_payout-{processed.id}")
+        self.assertEqual(UserStats.objects.get(user=processed.user).withdrawal_count, 1)
+        self.assertEqual(processed_email.call_count, 1)
+
+        # Only the retryable payout is sent again, with the same idempotency key
+        payout_to_external_account.reset_mock()
+        process_payouts()
+        payout_to_external_account.assert_called_once()
+        retried = PayoutRequest.objects.get(bank_account__stripe_external_account_id="ba_2")
+        self.assertEqual(payout_to_external_account.call_args.kwargs["idempotency_key"], f"payout-{retried.id}")
+        self.assertEqual((retried.status, retried.attempts), ("pending", 2))
+
+    @mock.patch("edudream.modules.payouts.StripeAPI.payout_to_external_account")
+    def test_failed_payout_left_for_review(self, payout_to_external_account):
+        # The transfer to the connected account already happened, a failed payout must not return the coins
+        payout_to_external_account.side_effect = stripe.error.APIError("Server error", http_status=500)
+        self.assertEqual(process_payouts(), 0)
+        self.assertEqual(PayoutRequest.objects.filter(status="failed", attempts=1).count(), 3)
+        self.assertEqual(Transaction.objects.filter(status="pending").count(), 3)
+        self.assertEqual(list(Wallet.objects.values_list("balance", flat=True).distinct()), [0])
+        self.assertFalse(LedgerEntry.objects.exists())
+
+
+class TestClassroomListingTestCase(TestCase):
+    def setUp(self):
+        self.subject = Subject.objects.create(name="Maths")
+        self.tutor = User.objects.create(username="tutor@email.com")
+        Profile.objects.create(user=self.tutor, account_type="tutor", referral_code="TUTOR")
+
+    def create_classrooms(self, count):
+        for index in range(count):
+            parent_user = User.objects.create(username=f"parent{index}-{count}@email.com")
+            parent = Profile.objects.create(user=parent_user, account_type="parent", referral_code=f"P{index}-{count}")
+            student_user = User.objects.create(username=f"student{index}-{count}@email.com")
+            student = Student.objects.create(user=student_user, parent=parent)
+            Classroom.objects.create(name="Class", tutor=self.tutor, student=student, subjects=self.subject)
+
+    def count_listing_queries(self, expected_rows):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("home:classroom"), {"tutor_id": self.tutor.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), expected_rows)
+        return len(queries)
+
+    def test_query_count_independent_of_rows(self):
+        self.create_classrooms(2)
+        queries = self.count_listing_queries(2)
+        self.create_classrooms(6)
+        self.assertEqual(self.count_listing_queries(8), queries)
@@ -7,6 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from edudream.modules.authentication import get_account_type
 from edudream.modules.exceptions import raise_serializer_error_msg, InvalidRequestException
 from edudream.modules.paginations import CustomPagination
 from edudream.modules.permissions import IsTutor, IsStudent, IsParent
@@ -14,7 +15,6 @@ from edudream.modules.stripe_api import StripeAPI
 from edudream.modules.utils import translate_to_language, log_request
 from edudream.settings.base import BASE_DIR
 from home.models import Profile
-from student.models import Student
 from tutor.models import Classroom, Dispute, TutorCalendar, PayoutRequest, TutorSubject, TutorSubjectDocument, \
     TutorBankAccount
 from tutor.serializers import ApproveDeclineClassroomSerializerIn, ClassRoomSerializerOut, DisputeSerializerIn, \
@@ -44,7 +44,7 @@ class TutorClassRoomAPIView(APIView, CustomPagination):
     def get(self, request, pk=None):
         lang = request.GET.get("lang", "en")
         if pk:
-            item = get_object_or_404(Classroom, id=pk, tutor=request.user)
+            item = get_object_or_404(Classroom.objects.for_listing(), id=pk, tutor=request.user)
             response = ClassRoomSerializerOut(item, context={"request": request}).data
         else:
             class_status = request.GET.get("status")
@@ -56,9 +56,10 @@ class TutorClassRoomAPIView(APIView, CustomPagination):
             if date_from and date_to:
                 # query &= Q(start_date__range=[date_from, date_to])
                 query &= Q(start_date__gte=date_from, start_date__lte=date_to)
-            queryset = self.paginate_queryset(Classroom.objects.filter(query).order_by("-id"), request)
+            classrooms = Classroom.objects.for_listing().filter(query)
             if class_status == "accepted":
-                queryset = self.paginate_queryset(Classroom.objects.filter(query).exclude(tutor_complete_check=True).order_by("-id"), request)
+                classrooms = classrooms.exclude(tutor_complete_check=True)
+            queryset = self.paginate_queryset(classrooms.order_by("-id"), request)
             serializer = ClassRoomSerializerOut(queryset, many=True, context={"request": request}).data
             response = self.get_paginated_response(serializer).data
         return Response({"detail": translate_to_language("Success", lang), "data": response})
@@ -71,17 +72,18 @@ class UpdateClassroomStatusAPIView(APIView):
     def put(self, request, pk):
         action = request.data.get("action")
         lang = request.GET.get("lang", "en")
-        if Profile.objects.filter(user=request.user, account_type="parent").exists():
+        account_type = get_account_type(request.user)
+        if account_type == "parent":
             if action == "cancel":
                 return Response({"detail": translate_to_language("You are not permitted to perform this action", lang)},
                                 status=status.HTTP_400_BAD_REQUEST)
             instance = get_object_or_404(Classroom, id=pk, student__parent__user=request.user)
-        elif Student.objects.filter(user=request.user).exists():
+        elif account_type == "student":
             if action == "cancel":
                 return Response({"detail": translate_to_language("You are not permitted to perform this action", lang)},
                                 status=status.HTTP_400_BAD_REQUEST)
             instance = get_object_or_404(Classroom, id=pk, student__user=request.user)
-        elif Profile.objects.filter(user=request.user, account_type="tutor").exists():
+        elif account_type == "tutor":
             instance = get_object_or_404(Classroom, id=pk, tutor=request.user)
         else:
             return Response({"detail": translate_to_language("Classroom not found", lang)}, status=status.HTTP_400_BAD_REQUEST)
@@ -330,7 +332,7 @@ class TutorActiveClassroomAPIView(APIView):
         query = Q(tutor_id=tutor_id) & Q(status__in=allowed_status)
         if date_from and date_to:
             query &= Q(start_date__gte=date_from, start_date__lte=date_to)
-        queryset = Classroom.objects.filter(query).order_by("-id")
+        queryset = Classroom.objects.for_listing().filter(query).order_by("-id")
         serializer = ClassRoomSerializerOut(queryset, many=True, context={"request": request}).data
         return Response(serializer)
 